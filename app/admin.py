@@ -1,10 +1,11 @@
 from django.db.models import Q, Count
 from django.contrib import admin
-from .resource import DriverResource
-from import_export.admin import ExportMixin
+from fato.exportacao import ExportacaoAdminMixin
 from simple_history.admin import SimpleHistoryAdmin
 from django.contrib.admin import BooleanFieldListFilter
-from .models import Driver, Company, Praca, Subpraca, Contract, Signer, Modal, DriverCompany, BankAccount, Bank
+from .models import (
+    Driver, Company, Praca, Subpraca, Contract, Signer, Modal, DriverCompany, BankAccount, Bank, ImportacaoPessoas,
+)
 from django.db import IntegrityError, transaction
 from django.contrib import messages
 from django import forms
@@ -58,8 +59,41 @@ class CompanyInline(admin.TabularInline):
     fk_name = 'driver'  # Relaciona com o modelo Driver
     fields = ('company',)
 
-class DriverAdmin(ExportMixin, SimpleHistoryAdmin):
-    resource_class = DriverResource  # Adiciona a funcionalidade de exportação
+def sem_empresa(valor):
+    return "Sem Empresa" if valor is None else valor
+
+
+def nao_se_aplica(valor):
+    return "N/A" if valor is None else valor
+
+
+def endereco_da_empresa(logradouro, numero, complemento):
+    return "N/A" if logradouro is None else f"{logradouro}, {numero}, {complemento}"
+
+
+def empresa_ativa(ativa):
+    return "N/A" if ativa is None else ("Sim" if ativa else "Não")
+
+
+class DriverAdmin(ExportacaoAdminMixin, SimpleHistoryAdmin):
+    # Exportação em streaming (fato.exportacao): uma linha por empresa do motorista, direto do JOIN
+    colunas_exportacao = [
+        ('Nome do Motorista', 'nome'),
+        ('CPF', 'cpf'),
+        ('E-mail', 'email'),
+        ('Celular', 'celular'),
+        ('Nacionalidade', 'nacionalidade'),
+        ('RG', 'rg'),
+        ('Órgão Emissor', 'orgao_emissor'),
+        ('Data de Nascimento', 'data_nascimento_prestador'),
+        ('Empresa Associada', 'empresas__razao_social', sem_empresa),
+        ('CNPJ da Empresa', 'empresas__cnpj', nao_se_aplica),
+        ('Endereço da Empresa', ('empresas__logradouro', 'empresas__numero', 'empresas__complemento'), endereco_da_empresa),
+        ('Bairro', 'empresas__bairro', nao_se_aplica),
+        ('Cidade', 'empresas__cidade', nao_se_aplica),
+        ('Estado', 'empresas__estado', nao_se_aplica),
+        ('Empresa Ativa', 'empresas__is_active', empresa_ativa),
+    ]
     list_display = ['uuid', 'nome', 'get_cpf_formatted', 'get_razao_social', 'get_CNPJ', 'email', 'is_active', 'get_agencia', 'get_conta', 'get_digito', 'get_tipo']
     search_fields = ['id', 'uuid', 'cpf', 'nome', 'empresas__cnpj', 'empresas__razao_social']
     inlines = [CompanyInline, BankAccountInline]  # Removemos BankAccountInline, pois é um relacionamento OneToOne
@@ -324,6 +358,16 @@ from .models import BankAccount
 
 
 
+@admin.register(ImportacaoPessoas)
+class ImportacaoPessoasAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nome_arquivo', 'status', 'linhas_total', 'linhas_importadas', 'linhas_com_erro',
+                    'criado_em', 'finalizado_em')
+    list_filter = ('status', 'criado_em')
+    search_fields = ('nome_arquivo',)
+    ordering = ('-criado_em',)
+    readonly_fields = [field.name for field in ImportacaoPessoas._meta.fields]  # Todos os campos readonly
+
+
 @admin.register(BankAccount)
 class BankAccountAdmin(admin.ModelAdmin):
     list_display = ("agencia", "conta", "digito", "tipo")
@@ -0,0 +1,124 @@
+#app/importacao.py
+"""
+Importação em massa de motoristas e empresas (página importar-pessoas/).
+
+Como nas importações de fato (ver fato.jobs), a view só salva o arquivo e cria uma
+ImportacaoPessoas; o pool de threads de fato.jobs lê as linhas e grava o progresso e
+os erros na própria ImportacaoPessoas, que a página consulta. Importações pendentes
+(ex.: servidor reiniciado) são retomadas por `manage.py processar_importacoes`. O
+arquivo enviado é apagado quando a importação termina, com ou sem erro.
+"""
+import logging
+
+import pandas as pd
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from fato.jobs import submeter
+
+from .models import Company, Driver, DriverCompany, ImportacaoPessoas, Modal
+
+logger = logging.getLogger(__name__)
+
+LOTE_PROGRESSO = 100  # Linhas entre as atualizações do progresso
+ERROS_GUARDADOS = 200  # Mensagens de erro guardadas na importação (o total fica em linhas_com_erro)
+
+
+def enfileirar(importacao):
+    """Coloca a importação na fila assim que a transação atual for confirmada."""
+    transaction.on_commit(lambda: submeter(executar_importacao_pessoas, importacao.pk))
+
+
+def importar_linha(row):
+    """Cria (ou obtém) o motorista, a empresa e o vínculo de uma linha do CSV, numa transação."""
+    with transaction.atomic():
+        # Criar ou obter o motorista
+        driver, _created = Driver.objects.get_or_create(
+            cpf=row['cpf'],
+            defaults={
+                'nome': row['nome_motorista'],
+                'nacionalidade': row['nacionalidade'],
+                'rg': row['rg'],
+                'email': row['email_motorista'],
+                'celular': row['celular_motorista'],
+                'data_nascimento_prestador': row['data_nascimento_prestador'],
+                'ticket': row['ticket'],
+                'origem': row['origem'],
+                'motivo_contato': row['motivo_contato'],
+                'dt_franquia': row['dt_franquia'],
+            }
+        )
+
+        # Criar ou obter a empresa
+        company, _created = Company.objects.get_or_create(
+            cnpj=row['empresa_cnpj'],
+            defaults={
+                'razao_social': row['razao_social_empresa'],
+            }
+        )
+
+        # Associar o motorista à empresa
+        DriverCompany.objects.get_or_create(driver=driver, company=company)
+
+        # Adicionar o modal ao motorista (caso tenha)
+        if 'modal' in row and pd.notnull(row['modal']):
+            modal, _created = Modal.objects.get_or_create(nome=row['modal'])
+            driver.modal = modal
+            driver.save()
+
+
+def executar_importacao_pessoas(importacao_id):
+    """
+    Importa o CSV da importação linha a linha. Linhas com valores inválidos ou que
+    esbarram em cadastros existentes são contadas e descritas em `erros` sem
+    interromper o resto.
+    """
+    # Marca como "processando" de forma atômica para que dois workers não peguem a mesma
+    reservado = ImportacaoPessoas.objects.filter(pk=importacao_id, status='pendente').update(
+        status='processando', iniciado_em=timezone.now()
+    )
+    if not reservado:
+        return
+
+    importacao = ImportacaoPessoas.objects.get(pk=importacao_id)
+    contadores = {'linhas_lidas': 0, 'linhas_importadas': 0, 'linhas_com_erro': 0}
+    erros = []
+
+    try:
+        with importacao.arquivo.open('rb') as csv_file:
+            data = pd.read_csv(csv_file)
+        ImportacaoPessoas.objects.filter(pk=importacao_id).update(linhas_total=len(data))
+
+        for index, row in data.iterrows():
+            try:
+                importar_linha(row)
+                contadores['linhas_importadas'] += 1
+            except (IntegrityError, ValidationError, TypeError, ValueError) as e:
+                contadores['linhas_com_erro'] += 1
+                if len(erros) < ERROS_GUARDADOS:
+                    erros.append(f"linha {index + 2}: {e}")
+                logger.warning(f"{importacao.nome_arquivo}, linha {index + 2}: {e}")
+            contadores['linhas_lidas'] += 1
+            if contadores['linhas_lidas'] % LOTE_PROGRESSO == 0:
+                ImportacaoPessoas.objects.filter(pk=importacao_id).update(erros=erros, **contadores)
+    except Exception as e:
+        logger.exception(f"Erro na importação em massa de {importacao.nome_arquivo}")
+        finalizar(importacao, 'erro', f"Erro ao importar {importacao.nome_arquivo}: {e}", erros, contadores)
+        return
+
+    logger.info(
+        f"Importação em massa de {importacao.nome_arquivo} concluída: {contadores['linhas_lidas']} linhas, "
+        f"{contadores['linhas_com_erro']} com erro."
+    )
+    mensagem = f"{contadores['linhas_com_erro']} linhas com erro." if contadores['linhas_com_erro'] else ''
+    finalizar(importacao, 'concluido', mensagem, erros, contadores)
+
+
+def finalizar(importacao, status, mensagem, erros, contadores):
+    """Grava o resultado e apaga o arquivo enviado."""
+    if importacao.arquivo:
+        importacao.arquivo.delete(save=False)
+    ImportacaoPessoas.objects.filter(pk=importacao.pk).update(
+        status=status, mensagem=mensagem, erros=erros, arquivo='', finalizado_em=timezone.now(), **contadores,
+    )
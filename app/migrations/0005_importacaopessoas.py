@@ -0,0 +1,36 @@
+# Generated by Django 5.1.5 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_driver_atualizado_em_driver_timestamp_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoPessoas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arquivo', models.FileField(blank=True, upload_to='importes/pessoas/')),
+                ('nome_arquivo', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluido', 'Concluído'), ('erro', 'Erro')], db_index=True, default='pendente', max_length=20)),
+                ('linhas_total', models.IntegerField(default=0)),
+                ('linhas_lidas', models.IntegerField(default=0)),
+                ('linhas_importadas', models.IntegerField(default=0)),
+                ('linhas_com_erro', models.IntegerField(default=0)),
+                ('erros', models.JSONField(blank=True, default=list)),
+                ('mensagem', models.TextField(blank=True, default='')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('finalizado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Importação de pessoas',
+                'verbose_name_plural': 'Importações de pessoas',
+                'ordering': ('-criado_em',),
+            },
+        ),
+    ]
@@ -315,3 +315,53 @@ class Subpraca(models.Model):
         return f"{self.nome}"
 
 
+
+
+class ImportacaoPessoas(models.Model):
+    """
+    Importação em massa de motoristas e empresas em segundo plano (ver app.importacao).
+    O arquivo fica em `arquivo` até o fim do processamento e depois é apagado.
+    """
+    STATUS = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+
+    arquivo = models.FileField(upload_to='importes/pessoas/', blank=True)
+    nome_arquivo = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS, default='pendente', db_index=True)
+    linhas_total = models.IntegerField(default=0)
+    linhas_lidas = models.IntegerField(default=0)
+    linhas_importadas = models.IntegerField(default=0)
+    linhas_com_erro = models.IntegerField(default=0)
+    erros = models.JSONField(default=list, blank=True)  # "linha N: motivo" das primeiras linhas rejeitadas
+    mensagem = models.TextField(blank=True, default='')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    finalizado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Importação de pessoas'
+        verbose_name_plural = 'Importações de pessoas'
+        ordering = ('-criado_em',)
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.get_status_display()})"
+
+    def como_dict(self):
+        """Representação usada pelo endpoint de progresso."""
+        return {
+            'id': self.id,
+            'arquivo': self.nome_arquivo,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'linhas_total': self.linhas_total,
+            'linhas_lidas': self.linhas_lidas,
+            'linhas_importadas': self.linhas_importadas,
+            'linhas_com_erro': self.linhas_com_erro,
+            'erros': self.erros,
+            'mensagem': self.mensagem,
+            'finalizado': self.status in ('concluido', 'erro'),
+        }
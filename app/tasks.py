@@ -6,7 +6,8 @@ from apscheduler.triggers.cron import CronTrigger
 from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR  # Importe os eventos necessários
 from django.db.models import Min
 from app.models import Driver
-from fato.models import Entregador, Performance
+from fato.coortes import atualizar_coortes_dos_entregadores
+from fato.models import Entregador, PerformanceDiaria
 from app.services import process_contracts  # Importa a função do service.py
 
 # Configuração de logs
@@ -18,8 +19,8 @@ def atualizar_dt_franquia():
     logger.info("Iniciando atualização do campo dt_franquia.")
     drivers = Driver.objects.filter(uuid__isnull=False, dt_franquia__isnull=True)
 
-    # Criando um dicionário com a primeira data disponível por UUID
-    datas_franquia = Performance.objects.filter(
+    # Primeira data disponível por UUID, pela tabela diária (coberta pela chave entregador/data)
+    datas_franquia = PerformanceDiaria.objects.filter(
         id_da_pessoa_entregadora__in=drivers.values_list('uuid', flat=True)
     ).values('id_da_pessoa_entregadora').annotate(primeira_data=Min('data_do_periodo'))
 
@@ -37,6 +38,8 @@ def atualizar_dt_franquia():
     if drivers_to_update:
         Driver.objects.bulk_update(drivers_to_update, ['dt_franquia'])
         logger.info(f"Atualizados {len(drivers_to_update)} drivers com dt_franquia.")
+        # bulk_update não dispara sinais: as coortes dos novos ingressos são refeitas aqui
+        atualizar_coortes_dos_entregadores([driver.uuid for driver in drivers_to_update])
     else:
         logger.info("Nenhum driver foi atualizado.")
 
@@ -0,0 +1,92 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .importacao import executar_importacao_pessoas
+from .models import Company, Driver, ImportacaoPessoas
+
+CABECALHO = (
+    'cpf,nome_motorista,nacionalidade,rg,email_motorista,celular_motorista,data_nascimento_prestador,ticket,origem,'
+    'motivo_contato,dt_franquia,empresa_cnpj,razao_social_empresa\n'
+)
+LINHA = (
+    '529.982.247-25,Maria,BRASILEIRA,12.345.678-9,maria@exemplo.com,11987654321,1990-01-01,123,anuncio,'
+    'novo_cadastro,2025-01-06,11222333000181,Empresa\n'
+)
+
+
+class ImportacaoPessoasTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = tempfile.mkdtemp()
+        cls.ajustes = override_settings(MEDIA_ROOT=cls.media)
+        cls.ajustes.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ajustes.disable()
+        shutil.rmtree(cls.media, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        Company.objects.create(
+            cnpj='11.222.333/0001-81', fundado_em=date(2020, 1, 1), porte='ME', razao_social='Empresa',
+            logradouro='Rua', cep='01000-000', bairro='Centro', cidade='São Paulo', estado='SP', status='ATIVA',
+        )
+
+    def arquivos_no_storage(self):
+        return sum(len(arquivos) for _pasta, _pastas, arquivos in os.walk(self.media))
+
+    def test_envio_cria_a_importacao_e_a_pagina_acompanha_o_progresso(self):
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        # A mesma pessoa duas vezes: a segunda linha esbarra no CPF já cadastrado
+        arquivo = SimpleUploadedFile('pessoas.csv', (CABECALHO + LINHA + LINHA).encode())
+        with self.captureOnCommitCallbacks() as callbacks:
+            resposta = self.client.post(reverse('importar_massa'), {'csv_file': arquivo})
+        self.assertRedirects(resposta, reverse('importar_massa'))
+        self.assertEqual(len(callbacks), 1)
+
+        importacao = ImportacaoPessoas.objects.get()
+        self.assertEqual((importacao.status, importacao.nome_arquivo), ('pendente', 'pessoas.csv'))
+        self.assertEqual(self.arquivos_no_storage(), 1)
+
+        executar_importacao_pessoas(importacao.pk)
+        progresso = self.client.get(reverse('progresso_importar_massa', args=[importacao.pk])).json()
+        self.assertEqual((progresso['status'], progresso['linhas_total'], progresso['linhas_importadas'],
+                          progresso['linhas_com_erro']), ('concluido', 2, 1, 1))
+        self.assertTrue(progresso['erros'][0].startswith('linha 3:'))
+        self.assertEqual(Driver.objects.get().empresas.get().razao_social, 'EMPRESA')
+        self.assertEqual(self.arquivos_no_storage(), 0)
+
+        resposta = self.client.get(reverse('importar_massa'))
+        self.assertEqual(list(resposta.context['importacoes']), [importacao])
+
+    def test_arquivo_sem_as_colunas_termina_com_erro_e_e_apagado(self):
+        importacao = ImportacaoPessoas.objects.create(
+            arquivo=ContentFile(b'nome\nMaria\n', name='pessoas.csv'), nome_arquivo='pessoas.csv',
+        )
+        with self.assertLogs('app.importacao', 'ERROR'):
+            call_command('processar_importacoes', stdout=io.StringIO())
+
+        importacao.refresh_from_db()
+        self.assertEqual(importacao.status, 'erro')
+        self.assertIn("'cpf'", importacao.mensagem)
+        self.assertFalse(importacao.arquivo)
+        self.assertEqual(self.arquivos_no_storage(), 0)
+
+    def test_paginas_exigem_staff(self):
+        importacao = ImportacaoPessoas.objects.create(nome_arquivo='pessoas.csv')
+
+        self.assertEqual(self.client.get(reverse('importar_massa')).status_code, 302)
+        self.assertEqual(self.client.get(reverse('progresso_importar_massa', args=[importacao.pk])).status_code, 302)
@@ -2,68 +2,40 @@
 from django.http import JsonResponse
 from threading import Thread
 from app.services import process_contracts
-import pandas as pd
-from django.shortcuts import render
-from django.http import HttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.shortcuts import get_object_or_404, redirect, render
 from .forms import CSVUploadForm
-from .models import Driver, Company, DriverCompany, Modal
-from django.db import IntegrityError
-from django.core.exceptions import ValidationError
-
-def import_em_massa(request):
-    if request.method == 'POST' and request.FILES['csv_file']:
-        # Ler o arquivo CSV
-        csv_file = request.FILES['csv_file']
-        data = pd.read_csv(csv_file)
-
-        # Percorrer cada linha do CSV
-        for index, row in data.iterrows():
-            try:
-                # Criar ou obter o motorista
-                driver, created = Driver.objects.get_or_create(
-                    cpf=row['cpf'],
-                    defaults={
-                        'nome': row['nome_motorista'],
-                        'nacionalidade': row['nacionalidade'],
-                        'rg': row['rg'],
-                        'email': row['email_motorista'],
-                        'celular': row['celular_motorista'],
-                        'data_nascimento_prestador': row['data_nascimento_prestador'],
-                        'ticket': row['ticket'],
-                        'origem': row['origem'],
-                        'motivo_contato': row['motivo_contato'],
-                        'dt_franquia': row['dt_franquia'],
-                    }
-                )
-
-                # Criar ou obter a empresa
-                company, created = Company.objects.get_or_create(
-                    cnpj=row['empresa_cnpj'],
-                    defaults={
-                        'razao_social': row['razao_social_empresa'],
-                    }
-                )
-
-                # Associar o motorista à empresa
-                DriverCompany.objects.get_or_create(driver=driver, company=company)
-
-                # Adicionar o modal ao motorista (caso tenha)
-                if 'modal' in row and pd.notnull(row['modal']):
-                    modal, created = Modal.objects.get_or_create(nome=row['modal'])
-                    driver.modal = modal
-                    driver.save()
-
-            except IntegrityError as e:
-                print(f"Erro de integridade: {e}")
-            except ValidationError as e:
-                print(f"Erro de validação: {e}")
-
-        return HttpResponse("Importação concluída com sucesso!")
-
-    return render(request, 'import_csv.html', {'form': CSVUploadForm()})
+from .importacao import enfileirar
+from .models import ImportacaoPessoas
 
+IMPORTACOES_NA_SESSAO = 20  # Quantas importações recentes a página acompanha
 
 
+@staff_member_required
+def import_em_massa(request):
+    if request.method == 'POST':
+        form = CSVUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Salva o arquivo e processa em segundo plano para não prender o worker da requisição
+            csv_file = form.cleaned_data['csv_file']
+            importacao = ImportacaoPessoas.objects.create(arquivo=csv_file, nome_arquivo=csv_file.name)
+            enfileirar(importacao)
+
+            # Guarda as importações recentes na sessão para a página acompanhar o progresso
+            recentes = [importacao.id] + request.session.get('importacoes_pessoas', [])
+            request.session['importacoes_pessoas'] = recentes[:IMPORTACOES_NA_SESSAO]
+            return redirect('importar_massa')
+    else:
+        form = CSVUploadForm()
+
+    importacoes = ImportacaoPessoas.objects.filter(id__in=request.session.get('importacoes_pessoas', []))
+    return render(request, 'import_csv.html', {'form': form, 'importacoes': importacoes})
+
+
+@staff_member_required
+def progresso_import_em_massa(request, pk):
+    """Endpoint JSON consultado pela página de importação de pessoas enquanto o arquivo é processado."""
+    return JsonResponse(get_object_or_404(ImportacaoPessoas, pk=pk).como_dict())
 
 
 # Função para iniciar o processamento de contratos
@@ -147,5 +147,25 @@ STATICFILES_DIRS = [
 # Diretório onde os arquivos coletados irão para produção
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')  # Usado pelo collectstatic (produção)
 DATA_UPLOAD_MAX_MEMORY_SIZE = (10485760 * 2)  # 10MB, por exemplo
+FILE_UPLOAD_MAX_MEMORY_SIZE = 1024 * 1024  # Uploads maiores vão para arquivo temporário em disco (lidos por mmap)
 MEDIA_URL = '/media/'  # URL para acessar os arquivos
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+# Threads que processam as importações em segundo plano; os arquivos de um envio múltiplo rodam em paralelo
+IMPORTACAO_WORKERS = min(8, os.cpu_count() or 2)
+IMPORTACAO_CARGA_DIRETA = False  # Insere via COPY/executemany (fato.carga) em vez do bulk_create
+# Cópia em Parquet de cada importação (fato.colunar). Precisa do pyarrow, dependência opcional que fica fora
+# do requirement.txt (pip install pyarrow); sem ele as importações seguem normalmente, só sem a cópia.
+IMPORTACAO_ARQUIVO_COLUNAR = True
+
+# Relatórios em cache (fato.cache). O locmem vale por processo; para compartilhar entre os
+# workers e os comandos, trocar por FileBasedCache ou DatabaseCache (createcachetable).
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'relatorios': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'relatorios',
+        'TIMEOUT': 6 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+RELATORIOS_CACHE = 'relatorios'
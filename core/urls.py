@@ -3,8 +3,8 @@
 from django.contrib import admin
 from django.urls import path
 from app.views import clicksign_contracts_view
-from fato.views import importar_csv
-from app.views import import_em_massa
+from fato.views import exportar_fatos, exportar_relatorio_horas, exportar_scorecard, importar_csv, progresso_importacao
+from app.views import import_em_massa, progresso_import_em_massa
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -13,6 +13,11 @@ urlpatterns = [
     path('admin/', admin.site.urls),  # Corrected line,
     path('processar-contratos/', clicksign_contracts_view, name='processar-contratos'), # Inicia o processamento
     path('importar/', importar_csv, name='importar_csv'),
+    path('importar/progresso/<int:pk>/', progresso_importacao, name='progresso_importacao'),
+    path('exportar/relatorio-horas/', exportar_relatorio_horas, name='exportar_relatorio_horas'),
+    path('exportar/scorecard/', exportar_scorecard, name='exportar_scorecard'),
+    path('exportar/<str:tipo>/', exportar_fatos, name='exportar_fatos'),
     path('importar-pessoas/', import_em_massa, name='importar_massa'),
+    path('importar-pessoas/progresso/<int:pk>/', progresso_import_em_massa, name='progresso_importar_massa'),
 
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
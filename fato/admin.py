@@ -1,28 +1,92 @@
 #fato/admin.py
 
-from django.contrib import admin
-from .models import Financeiro, Performance, Origem, Entregador, Periodo
+from datetime import date, timedelta
+
+from django.contrib import admin, messages
+from django.template.response import TemplateResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from .coortes import AGRUPAMENTOS, matriz_de_retencao
+from .importacao import resumo_dos_erros
+from .exportacao import ExportacaoAdminMixin
+from .jobs import agendar_exclusao
+from .models import Financeiro, Performance, PerformanceDiaria, AtividadeCoorte, SaldoRepasse, Divergencia, Origem, Entregador, Periodo, Processamento, Exclusao
 
 
 @admin.register(Origem)
 class OrigemAdmin(admin.ModelAdmin):
-    list_display = ('id', 'nome','tipo', 'filial', 'linhas_importadas', 'linhas_com_erro', 'timestamp')
+    def get_rejeicoes(self, obj):
+        if not obj.arquivo_rejeicoes:
+            return "-"
+        return format_html('<a href="{}">{}</a>', obj.arquivo_rejeicoes.url, resumo_dos_erros(obj.erros_por_tipo))
+
+    get_rejeicoes.short_description = "Rejeições"
+
+    list_display = ('id', 'nome','tipo', 'filial', 'linhas_importadas', 'linhas_com_erro', 'get_rejeicoes', 'timestamp')
     search_fields = ('nome', 'filial')
     list_filter = ('filial', 'timestamp')
     ordering = ('-timestamp',)
     readonly_fields = [field.name for field in Origem._meta.fields]  # Todos os campos readonly
+    actions = ['excluir_em_segundo_plano']
+
+    @admin.action(description="Excluir origens selecionadas (em segundo plano)", permissions=['exclusao'])
+    def excluir_em_segundo_plano(self, request, queryset):
+        for origem in queryset:
+            agendar_exclusao(origem)
+        url = reverse('admin:fato_exclusao_changelist')
+        self.message_user(request, format_html(
+            '{} origens na fila de exclusão. <a href="{}">Acompanhar o progresso</a>.', queryset.count(), url
+        ), messages.SUCCESS)
+
+    def has_exclusao_permission(self, request):
+        return super().has_delete_permission(request)
+
+    def has_delete_permission(self, request, obj=None):
+        # A exclusão padrão carrega todas as linhas de fato em memória (CASCADE); usar a ação em lotes
+        return False
+
+
+@admin.register(Exclusao)
+class ExclusaoAdmin(admin.ModelAdmin):
+    def get_progresso(self, obj):
+        return f"{obj.linhas_excluidas} de {obj.linhas_total} ({obj.percentual}%)"
+
+    get_progresso.short_description = "Progresso"
+
+    list_display = ('id', 'nome_origem', 'status', 'get_progresso', 'mensagem', 'criado_em', 'finalizado_em')
+    list_filter = ('status', 'criado_em')
+    search_fields = ('nome_origem',)
+    ordering = ('-criado_em',)
+    readonly_fields = [field.name for field in Exclusao._meta.fields]  # Todos os campos readonly
+
+
+@admin.register(Processamento)
+class ProcessamentoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nome_arquivo', 'origem', 'status', 'linhas_lidas', 'linhas_importadas', 'linhas_com_erro',
+                    'linhas_atualizadas', 'linhas_ignoradas', 'modo', 'criado_em', 'finalizado_em')
+    list_filter = ('status', 'criado_em')
+    search_fields = ('nome_arquivo',)
+    ordering = ('-criado_em',)
+    readonly_fields = [field.name for field in Processamento._meta.fields]  # Todos os campos readonly
 
 
 @admin.register(Performance)
-class PerformanceAdmin(admin.ModelAdmin):
+class PerformanceAdmin(ExportacaoAdminMixin, admin.ModelAdmin):
     def get_filial(self, obj):
         return obj.origem_doc.filial if obj.origem_doc else "Sem Origem"
 
     get_filial.short_description = "Filial"
 
+    def get_tempo_disponivel(self, obj):
+        return obj.tempo_disponivel_formatado
+
+    get_tempo_disponivel.short_description = "Tempo disponível absoluto"
+    get_tempo_disponivel.admin_order_field = 'tempo_disponivel_absoluto'
+
     list_display = ('data_do_periodo', 'id_da_pessoa_entregadora', 'pessoa_entregadora',
                     'sub_praca', 'numero_de_corridas_ofertadas',
-                    'numero_de_corridas_completadas', 'tempo_disponivel_absoluto', 'get_filial')
+                    'numero_de_corridas_completadas', 'get_tempo_disponivel', 'get_filial')
     search_fields = ('origem_doc__nome', 'sub_praca', 'id_da_pessoa_entregadora')
     list_filter = ('sub_praca', 'periodo')
     ordering = ('-data_do_periodo',)
@@ -30,15 +94,145 @@ class PerformanceAdmin(admin.ModelAdmin):
     readonly_fields = [field.name for field in Performance._meta.fields]  # Todos os campos readonly
 
 
+@admin.register(PerformanceDiaria)
+class PerformanceDiariaAdmin(ExportacaoAdminMixin, admin.ModelAdmin):
+    def get_tempo_disponivel(self, obj):
+        return obj.tempo_disponivel_formatado
+
+    get_tempo_disponivel.short_description = "Tempo disponível absoluto"
+    get_tempo_disponivel.admin_order_field = 'tempo_disponivel_absoluto'
+
+    list_display = ('data_do_periodo', 'id_da_pessoa_entregadora', 'pessoa_entregadora', 'sub_praca', 'periodos',
+                    'numero_de_corridas_ofertadas', 'numero_de_corridas_aceitas', 'numero_de_corridas_completadas',
+                    'get_tempo_disponivel')
+    search_fields = ('id_da_pessoa_entregadora', 'pessoa_entregadora', 'sub_praca')
+    list_filter = ('sub_praca',)
+    ordering = ('-data_do_periodo',)
+
+    readonly_fields = [field.name for field in PerformanceDiaria._meta.fields]  # Mantida pela importação
+
+
+@admin.register(AtividadeCoorte)
+class AtividadeCoorteAdmin(admin.ModelAdmin):
+    """
+    No lugar da lista, a matriz de retenção das coortes (ver fato.coortes). Parâmetros
+    na querystring: inicio e fim (datas de ingresso), agrupar (semana ou mes), medida
+    (retencao ou horas) e semanas (colunas).
+    """
+    SEMANAS_PADRAO = 26
+    MEDIDAS = {'retencao': 'Retenção (% de ativos)', 'horas': 'Horas disponíveis'}
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def parametros(self, request):
+        hoje = timezone.localdate()
+        try:
+            fim = date.fromisoformat(request.GET.get('fim', ''))
+        except ValueError:
+            fim = hoje
+        try:
+            inicio = date.fromisoformat(request.GET.get('inicio', ''))
+        except ValueError:
+            inicio = fim - timedelta(days=364)
+        agrupar = request.GET.get('agrupar') if request.GET.get('agrupar') in AGRUPAMENTOS else 'semana'
+        medida = request.GET.get('medida') if request.GET.get('medida') in self.MEDIDAS else 'retencao'
+        semanas = request.GET.get('semanas', '')
+        semanas = int(semanas) if semanas.isdigit() and int(semanas) > 0 else self.SEMANAS_PADRAO
+        return inicio, fim, agrupar, medida, semanas
+
+    def changelist_view(self, request, extra_context=None):
+        inicio, fim, agrupar, medida, semanas = self.parametros(request)
+        matriz = matriz_de_retencao(inicio, fim, agrupar, semanas)
+
+        maior_valor = max((coluna['horas'] for linha in matriz for coluna in linha['semanas']), default=0) or 1
+        linhas = []
+        for linha in matriz:
+            celulas = []
+            for coluna in linha['semanas']:
+                if medida == 'retencao':
+                    texto, intensidade = f"{coluna['retencao']:.0%}", coluna['retencao']
+                else:
+                    texto, intensidade = f"{coluna['horas']:.0f}", coluna['horas'] / maior_valor
+                celulas.append({
+                    'texto': texto, 'ativos': coluna['ativos'], 'horas': f"{coluna['horas']:.1f}",
+                    'intensidade': f"{intensidade:.2f}",
+                })
+            linhas.append({'coorte': linha['coorte'], 'tamanho': linha['tamanho'], 'celulas': celulas})
+
+        contexto = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Retenção das coortes de entregadores",
+            'linhas': linhas,
+            'colunas': range(max((len(linha['celulas']) for linha in linhas), default=0)),
+            'inicio': inicio, 'fim': fim, 'agrupar': agrupar, 'medida': medida, 'semanas': semanas,
+            'agrupamentos': {'semana': 'Semana de ingresso', 'mes': 'Mês de ingresso'},
+            'medidas': self.MEDIDAS,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/fato/atividadecoorte/matriz.html', contexto)
+
+
+@admin.register(SaldoRepasse)
+class SaldoRepasseAdmin(ExportacaoAdminMixin, admin.ModelAdmin):
+    def get_liquido(self, obj):
+        return obj.liquido_formatado
+
+    get_liquido.short_description = "Líquido do repasse"
+    get_liquido.admin_order_field = 'liquido'
+
+    def get_saldo(self, obj):
+        return obj.saldo_formatado
+
+    get_saldo.short_description = "Saldo acumulado"
+    get_saldo.admin_order_field = 'saldo'
+
+    list_display = ('data_do_repasse', 'id_da_pessoa_entregadora', 'lancamentos', 'get_liquido', 'get_saldo')
+    search_fields = ('=id_da_pessoa_entregadora',)  # Busca exata: usa o índice saldo_repasse_chave
+    list_filter = ('data_do_repasse',)
+    ordering = ('id_da_pessoa_entregadora', '-data_do_repasse')
+
+    readonly_fields = [field.name for field in SaldoRepasse._meta.fields]  # Mantido pela importação
+
+
+@admin.register(Divergencia)
+class DivergenciaAdmin(ExportacaoAdminMixin, admin.ModelAdmin):
+    def get_diferenca(self, obj):
+        return obj.diferenca_formatada
+
+    get_diferenca.short_description = "Diferença"
+    get_diferenca.admin_order_field = 'diferenca'
+
+    list_display = ('data', 'id_da_pessoa_entregadora', 'periodo', 'tipo', 'corridas_completadas', 'get_diferenca')
+    search_fields = ('=id_da_pessoa_entregadora', 'periodo')
+    list_filter = ('tipo', 'data')
+    ordering = ('-data', 'id_da_pessoa_entregadora', 'periodo')
+
+    readonly_fields = [field.name for field in Divergencia._meta.fields]  # Mantida pela conciliação
+
+
 @admin.register(Financeiro)
-class FinanceiroAdmin(admin.ModelAdmin):
+class FinanceiroAdmin(ExportacaoAdminMixin, admin.ModelAdmin):
     def get_filial(self, obj):
         return obj.origem_doc.filial if obj.origem_doc else "Sem Origem"
 
     get_filial.short_description = "Filial"
 
+    def get_valor(self, obj):
+        return obj.valor_formatado
+
+    get_valor.short_description = "Valor"
+    get_valor.admin_order_field = 'valor'
+
     list_display = ('origem_doc','id_da_pessoa_entregadora','recebedor', 'get_filial', 'data_do_lancamento_financeiro',
-                    'subpraca', 'valor', 'descricao')
+                    'subpraca', 'get_valor', 'descricao')
     search_fields = ('origem_doc__nome', 'subpraca', 'id_da_pessoa_entregadora', 'descricao')
     list_filter = ('subpraca', 'tipo', 'periodo')
     ordering = ('-data_do_lancamento_financeiro',)
@@ -0,0 +1,106 @@
+#fato/agregados.py
+"""
+Manutenção da PerformanceDiaria (Performance somada por entregador, dia e sub-praça).
+
+A tabela nunca é somada aos poucos: para cada (data, entregador) tocado por um bloco
+importado ou por uma faixa excluída, as linhas diárias são apagadas e recalculadas a
+partir da Performance, na mesma transação da gravação. Assim uma linha atualizada
+(modo 'atualizar') ou removida não deixa resto na soma.
+"""
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from .models import Performance, PerformanceDiaria
+
+logger = logging.getLogger(__name__)
+
+LOTE_ENTREGADORES = 500  # Ids por consulta (limite de parâmetros do SQLite)
+
+CHAVE = ['id_da_pessoa_entregadora', 'data_do_periodo', 'sub_praca']
+
+SOMAS = {
+    'pessoa_entregadora': Max('pessoa_entregadora'),
+    'periodos': Count('id'),
+    'duracao_do_periodo': Sum('duracao_do_periodo'),
+    'tempo_disponivel_absoluto': Sum('tempo_disponivel_absoluto'),
+    'numero_de_corridas_ofertadas': Sum('numero_de_corridas_ofertadas'),
+    'numero_de_corridas_aceitas': Sum('numero_de_corridas_aceitas'),
+    'numero_de_corridas_rejeitadas': Sum('numero_de_corridas_rejeitadas'),
+    'numero_de_corridas_completadas': Sum('numero_de_corridas_completadas'),
+    'numero_de_corridas_canceladas_pela_pessoa_entregadora': Sum('numero_de_corridas_canceladas_pela_pessoa_entregadora'),
+    'numero_de_pedidos_aceitos_e_concluidos': Sum('numero_de_pedidos_aceitos_e_concluidos'),
+    'soma_das_taxas_das_corridas_aceitas': Sum('soma_das_taxas_das_corridas_aceitas'),
+}
+
+
+def chaves_do_bloco(df):
+    """{data: {ids}} das linhas de um bloco de Performance já convertido."""
+    chaves = defaultdict(set)
+    pares = df[['data_do_periodo', 'id_da_pessoa_entregadora']].drop_duplicates()
+    for data, id_entregador in pares.itertuples(index=False, name=None):
+        chaves[data].add(id_entregador)
+    return chaves
+
+
+def chaves_das_linhas(linhas):
+    """{data: {ids}} de um queryset de Performance."""
+    chaves = defaultdict(set)
+    for data, id_entregador in linhas.values_list('data_do_periodo', 'id_da_pessoa_entregadora').distinct():
+        chaves[data].add(id_entregador)
+    return chaves
+
+
+def recalcular(datas, ids):
+    """Refaz as linhas diárias dos entregadores `ids` nas `datas`. Retorna quantas foram gravadas."""
+    filtro = {'data_do_periodo__in': datas, 'id_da_pessoa_entregadora__in': ids}
+    PerformanceDiaria.objects.filter(**filtro).delete()
+    somas = Performance.objects.filter(**filtro).values(*CHAVE).annotate(**SOMAS).order_by()
+    return len(PerformanceDiaria.objects.bulk_create([PerformanceDiaria(**linha) for linha in somas]))
+
+
+def atualizar_performance_diaria(chaves, lote=LOTE_ENTREGADORES):
+    """
+    Recalcula as linhas diárias das chaves {data: {ids}}. Deve rodar na transação que
+    alterou a Performance, para que a tabela nunca fique defasada.
+    """
+    gravadas = 0
+    for data, ids in chaves.items():
+        ids = sorted(ids)
+        for inicio in range(0, len(ids), lote):
+            gravadas += recalcular([data], ids[inicio:inicio + lote])
+    return gravadas
+
+
+def reconstruir_performance_diaria(inicio=None, fim=None, progresso=None):
+    """
+    Refaz a PerformanceDiaria inteira (ou só entre `inicio` e `fim`), uma data por
+    transação. `progresso(data, gravadas)` é chamado depois de cada data. Retorna o total gravado.
+    """
+    datas = Performance.objects.all()
+    diarias = PerformanceDiaria.objects.all()
+    if inicio:
+        datas, diarias = datas.filter(data_do_periodo__gte=inicio), diarias.filter(data_do_periodo__gte=inicio)
+    if fim:
+        datas, diarias = datas.filter(data_do_periodo__lte=fim), diarias.filter(data_do_periodo__lte=fim)
+    datas = set(datas.values_list('data_do_periodo', flat=True).distinct())
+    # Datas que ficaram só na tabela diária (a Performance delas foi removida por fora)
+    orfas = set(diarias.values_list('data_do_periodo', flat=True).distinct()) - datas
+
+    total = 0
+    with transaction.atomic():
+        PerformanceDiaria.objects.filter(data_do_periodo__in=orfas).delete()
+    for data in sorted(datas):
+        with transaction.atomic():
+            PerformanceDiaria.objects.filter(data_do_periodo=data).delete()
+            somas = Performance.objects.filter(data_do_periodo=data).values(*CHAVE).annotate(**SOMAS).order_by()
+            gravadas = len(PerformanceDiaria.objects.bulk_create(
+                [PerformanceDiaria(**linha) for linha in somas], batch_size=LOTE_ENTREGADORES
+            ))
+        total += gravadas
+        if progresso:
+            progresso(data, gravadas)
+    logger.info(f"PerformanceDiaria reconstruída: {total} linhas em {len(datas)} datas.")
+    return total
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FatoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fato'
+
+    def ready(self):
+        import fato.signals
@@ -0,0 +1,129 @@
+#fato/cache.py
+"""
+Cache dos relatórios gerados a partir das tabelas de fato.
+
+A chave de cada resultado junta os parâmetros do relatório com a versão dos dados:
+a última Origem (e quantas são) por filial e tipo, contando só as origens cujo
+intervalo de datas encosta no intervalo do relatório. Uma importação nova, ou uma
+origem excluída, muda a versão apenas dos relatórios cujas datas ela toca; as
+entradas antigas simplesmente deixam de ser lidas e expiram pelo TIMEOUT do cache.
+
+Usa o framework de cache do Django (alias settings.RELATORIOS_CACHE): locmem vale
+por processo; os backends de arquivo ou banco compartilham o cache entre os workers
+e os comandos.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db.models import Count, Max, Min, Q
+
+from .importacao import MODELOS
+from .models import Financeiro, Origem, Performance
+
+# Colunas de data que cada tipo de relatório pode filtrar; o intervalo da origem cobre todas
+COLUNAS_DE_DATA = {
+    Performance: ['data_do_periodo'],
+    Financeiro: ['data_do_lancamento_financeiro', 'data_do_periodo_de_referencia', 'data_do_repasse'],
+}
+
+# Relatórios com contadores de acertos/falhas (ver estatisticas_do_cache)
+RELATORIOS = ['relatorio_horas', 'consultar_cubo', 'consultar_quantis', 'scorecard']
+
+AUSENTE = object()
+
+
+def cache_de_relatorios():
+    return caches[getattr(settings, 'RELATORIOS_CACHE', DEFAULT_CACHE_ALIAS)]
+
+
+def intervalo_da_origem(origem):
+    """(menor data, maior data) das linhas da origem, ou (None, None) se não houver datas."""
+    modelo = MODELOS[origem.tipo]
+    linhas = modelo.objects.filter(origem_doc=origem)
+    limites = {}
+    for coluna in COLUNAS_DE_DATA[modelo]:
+        limites[f'{coluna}_inicio'] = Min(coluna)
+        limites[f'{coluna}_fim'] = Max(coluna)
+    valores = linhas.aggregate(**limites)
+    inicios = [valores[f'{coluna}_inicio'] for coluna in COLUNAS_DE_DATA[modelo] if valores[f'{coluna}_inicio']]
+    fins = [valores[f'{coluna}_fim'] for coluna in COLUNAS_DE_DATA[modelo] if valores[f'{coluna}_fim']]
+    return (min(inicios) if inicios else None), (max(fins) if fins else None)
+
+
+def registrar_intervalo(origem):
+    """Preenche data_inicial/data_final da origem (sem salvar), antes do save que conclui a importação."""
+    origem.data_inicial, origem.data_final = intervalo_da_origem(origem)
+
+
+def versao_dos_dados(tipos, inicio=None, fim=None, filial=None):
+    """
+    Última origem e quantidade de origens por filial e tipo, entre as importações
+    concluídas que tocam o intervalo. Origens sem datas valem para qualquer intervalo.
+    """
+    origens = Origem.objects.filter(tipo__in=tipos, linhas_importadas__gt=0)
+    if filial:
+        origens = origens.filter(filial=filial)
+    if inicio:
+        origens = origens.filter(Q(data_final__isnull=True) | Q(data_final__gte=inicio))
+    if fim:
+        origens = origens.filter(Q(data_inicial__isnull=True) | Q(data_inicial__lte=fim))
+    ultimas = origens.values('tipo', 'filial').annotate(ultima=Max('pk'), quantidade=Count('pk')).order_by('tipo', 'filial')
+    return ';'.join(f"{linha['tipo']}/{linha['filial']}:{linha['ultima']}.{linha['quantidade']}" for linha in ultimas)
+
+
+def chave_do_relatorio(nome, parametros, versao):
+    conteudo = repr((parametros, versao)).encode()
+    return f"relatorio:{nome}:{hashlib.sha256(conteudo).hexdigest()}"
+
+
+def contar(nome, evento):
+    cache = cache_de_relatorios()
+    chave = f"relatorio_contador:{nome}:{evento}"
+    cache.add(chave, 0, timeout=None)
+    try:
+        cache.incr(chave)
+    except ValueError:  # Removido entre o add e o incr (cache cheio)
+        cache.set(chave, 1, timeout=None)
+
+
+def em_cache(nome, calcular, tipos, inicio=None, fim=None, filial=None, parametros=(), versao_extra='', timeout=None):
+    """
+    Resultado de `calcular()` para o relatório `nome`, lido do cache quando os dados
+    (das origens dos `tipos` entre `inicio` e `fim`) não mudaram desde o último cálculo.
+    `parametros` são os demais argumentos que mudam o resultado; `versao_extra` entra na
+    chave para dados de fora das tabelas de fato. `timeout` None usa o do cache.
+    """
+    cache = cache_de_relatorios()
+    versao = versao_dos_dados(tipos, inicio, fim, filial)
+    chave = chave_do_relatorio(nome, (inicio, fim, filial, parametros), (versao, versao_extra))
+
+    resultado = cache.get(chave, AUSENTE)
+    if resultado is not AUSENTE:
+        contar(nome, 'acertos')
+        return resultado
+
+    contar(nome, 'falhas')
+    resultado = calcular()
+    if timeout is None:
+        cache.set(chave, resultado)
+    else:
+        cache.set(chave, resultado, timeout)
+    return resultado
+
+
+def estatisticas_do_cache(nomes=None):
+    """{relatório: {'acertos': n, 'falhas': n}} dos contadores do cache."""
+    nomes = nomes or RELATORIOS
+    cache = cache_de_relatorios()
+    contadores = cache.get_many([f"relatorio_contador:{nome}:{evento}" for nome in nomes for evento in ('acertos', 'falhas')])
+    return {
+        nome: {evento: contadores.get(f"relatorio_contador:{nome}:{evento}", 0) for evento in ('acertos', 'falhas')}
+        for nome in nomes
+    }
+
+
+def zerar_estatisticas(nomes=None):
+    cache_de_relatorios().delete_many([
+        f"relatorio_contador:{nome}:{evento}" for nome in (nomes or RELATORIOS) for evento in ('acertos', 'falhas')
+    ])
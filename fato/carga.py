@@ -0,0 +1,130 @@
+#fato/carga.py
+"""
+Carga direta das tabelas de fato, sem montar um objeto do modelo por linha.
+
+O bloco já convertido (ver importacao.preparar_chunk) vira uma lista de tuplas com os
+tipos do banco e vai inteiro para o driver: COPY FROM STDIN no PostgreSQL e
+executemany no SQLite. Só serve para inserir; o upsert continua pelo ORM.
+"""
+import csv
+import io
+from contextlib import contextmanager
+from datetime import date
+
+from django.conf import settings
+from django.db import connection
+
+# Ajustes do SQLite durante a carga: sem fsync a cada commit e cache maior.
+# São desfeitos no fim (ver sessao_de_carga).
+PRAGMAS_SQLITE = {
+    'synchronous': 'OFF',
+    'cache_size': '-65536',  # 64 MB
+    'temp_store': 'MEMORY',
+}
+
+
+def carga_direta_habilitada():
+    """Valor padrão vindo de settings.IMPORTACAO_CARGA_DIRETA."""
+    return getattr(settings, 'IMPORTACAO_CARGA_DIRETA', False)
+
+
+def colunas_do_bloco(modelo, df):
+    """Nomes das colunas no banco, na ordem do DataFrame, mais a FK da origem."""
+    colunas = [modelo._meta.get_field(campo).column for campo in df.columns] + ['origem_doc_id']
+    return [connection.ops.quote_name(coluna) for coluna in colunas]
+
+
+def valores_para_banco(modelo, df):
+    """
+    Converte o bloco para tipos que o driver grava sem adaptação: datas viram texto
+    ISO, inteiros e decimais do numpy viram int/float do Python, vazio vira None.
+    """
+    colunas = {}
+    for campo in df.columns:
+        serie = df[campo]
+        tipo = modelo._meta.get_field(campo).get_internal_type()
+        if tipo == 'DateField':
+            serie = serie.map(lambda data: data.isoformat() if isinstance(data, date) else None)
+        colunas[campo] = serie.astype(object).where(serie.notna(), None)
+    return colunas
+
+
+def linhas_do_bloco(modelo, df, origem):
+    """Tuplas prontas para o INSERT/COPY, com o id da origem no fim."""
+    colunas = valores_para_banco(modelo, df)
+    origem_id = [origem.pk] * len(df)
+    return list(zip(*(colunas[campo].tolist() for campo in df.columns), origem_id))
+
+
+def carregar_sqlite(cursor, tabela, colunas, linhas):
+    marcadores = ', '.join(['%s'] * len(colunas))
+    sql = f'INSERT INTO {connection.ops.quote_name(tabela)} ({", ".join(colunas)}) VALUES ({marcadores})'
+    cursor.executemany(sql, linhas)
+
+
+def carregar_postgresql(cursor, tabela, colunas, linhas):
+    sql = f'COPY {connection.ops.quote_name(tabela)} ({", ".join(colunas)}) FROM STDIN'
+    bruto = cursor.cursor
+    if hasattr(bruto, 'copy'):
+        # psycopg 3
+        with bruto.copy(sql) as copia:
+            for linha in linhas:
+                copia.write_row(linha)
+        return
+
+    # psycopg2: COPY em CSV a partir de um buffer em memória (o bloco já é limitado pelo chunksize)
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for linha in linhas:
+        escritor.writerow(['\\N' if valor is None else valor for valor in linha])
+    buffer.seek(0)
+    bruto.copy_expert(f"{sql} WITH (FORMAT csv, NULL '\\N')", buffer)
+
+
+CARREGADORES = {
+    'sqlite': carregar_sqlite,
+    'postgresql': carregar_postgresql,
+}
+
+
+def suporta_carga_direta():
+    return connection.vendor in CARREGADORES
+
+
+def carregar_bloco(modelo, df, origem):
+    """
+    Grava as linhas válidas do bloco direto pelo driver (só nos bancos de CARREGADORES).
+    Retorna a quantidade de linhas gravadas.
+    """
+    if df.empty:
+        return 0
+    linhas = linhas_do_bloco(modelo, df, origem)
+    # O COPY usa o cursor do driver: os erros dele também viram IntegrityError etc. do Django
+    with connection.cursor() as cursor, connection.wrap_database_errors:
+        CARREGADORES[connection.vendor](cursor, modelo._meta.db_table, colunas_do_bloco(modelo, df), linhas)
+    return len(linhas)
+
+
+@contextmanager
+def sessao_de_carga():
+    """
+    Aplica os PRAGMAS_SQLITE enquanto durar o bloco `with` e restaura os valores
+    anteriores. Deve envolver as transações da carga, não ficar dentro delas.
+    Nos outros bancos não faz nada.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        anteriores = {}
+        for pragma, valor in PRAGMAS_SQLITE.items():
+            cursor.execute(f'PRAGMA {pragma}')
+            anteriores[pragma] = cursor.fetchone()[0]
+            cursor.execute(f'PRAGMA {pragma} = {valor}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for pragma, valor in anteriores.items():
+                cursor.execute(f'PRAGMA {pragma} = {valor}')
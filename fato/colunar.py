@@ -0,0 +1,205 @@
+#fato/colunar.py
+"""
+Cópia colunar (Parquet) de cada arquivo importado.
+
+Depois de uma importação bem-sucedida, as linhas gravadas da origem são lidas do
+banco em lotes e escritas em Parquet com os tipos do modelo, particionadas como
+<IMPORTACAO_DIRETORIO_COLUNAR>/filial=<filial>/tipo_origem=<tipo>/data=<AAAA-MM-DD>/origem_<id>.parquet
+(tipo_origem porque o Financeiro já tem uma coluna `tipo`).
+As análises leem só as colunas e as partições de datas que pedem (ver ler_colunar),
+sem reinterpretar CSV.
+
+Depende do pyarrow, que é opcional: sem ele as importações seguem normalmente e nada
+é arquivado.
+"""
+import logging
+import os
+
+import pandas as pd
+from django.conf import settings
+
+from .importacao import CHAVES_NATURAIS, MODELOS
+from .models import Financeiro, Performance
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende do ambiente
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+LOTE_LEITURA = 50000  # Linhas lidas do banco por vez ao escrever o Parquet
+COMPRESSAO = 'zstd'
+SEM_DATA = 'sem_data'  # Partição das linhas sem data (lançamentos financeiros sem data)
+
+# Coluna de data que define a partição de cada tipo
+COLUNA_DATA = {
+    Performance: 'data_do_periodo',
+    Financeiro: 'data_do_lancamento_financeiro',
+}
+
+
+def colunar_disponivel():
+    """True se o pyarrow está instalado e settings.IMPORTACAO_ARQUIVO_COLUNAR não desligou o arquivo."""
+    return pa is not None and getattr(settings, 'IMPORTACAO_ARQUIVO_COLUNAR', True)
+
+
+def diretorio_colunar():
+    return getattr(settings, 'IMPORTACAO_DIRETORIO_COLUNAR', None) or os.path.join(settings.MEDIA_ROOT, 'colunar')
+
+
+def slug(texto):
+    return texto.lower().replace(" ", "_")  # Mesma normalização do upload_to
+
+
+def campos_arquivados(modelo):
+    """Todos os campos do modelo, menos o id; a origem vai como origem_doc_id."""
+    return [campo.attname for campo in modelo._meta.concrete_fields if not campo.primary_key]
+
+
+def tipo_arrow(campo):
+    tipo = campo.get_internal_type()
+    if tipo == 'DateField':
+        return pa.date32()
+    if tipo == 'DecimalField':
+        return pa.decimal128(campo.max_digits, campo.decimal_places)
+    if tipo in ('IntegerField', 'ForeignKey'):
+        return pa.int64()
+    return pa.string()
+
+
+def esquema_do_modelo(modelo):
+    return pa.schema([
+        pa.field(campo.attname, tipo_arrow(campo))
+        for campo in modelo._meta.concrete_fields if not campo.primary_key
+    ])
+
+
+def lotes(iteravel, tamanho):
+    lote = []
+    for item in iteravel:
+        lote.append(item)
+        if len(lote) == tamanho:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def caminho_da_particao(origem, data):
+    return os.path.join(
+        f"filial={slug(origem.filial)}", f"tipo_origem={origem.tipo}", f"data={data}", f"origem_{origem.pk}.parquet"
+    )
+
+
+def escrever_arquivo_colunar(origem, lote=LOTE_LEITURA):
+    """
+    Escreve as linhas da origem em Parquet, um arquivo por data, e registra os caminhos
+    (relativos ao diretório colunar) em origem.arquivos_colunares. Retorna esses caminhos.
+    """
+    modelo = MODELOS[origem.tipo]
+    campos = campos_arquivados(modelo)
+    esquema = esquema_do_modelo(modelo)
+    coluna_data = COLUNA_DATA[modelo]
+    raiz = diretorio_colunar()
+    escritores = {}  # data -> (caminho relativo, ParquetWriter)
+
+    linhas = modelo.objects.filter(origem_doc=origem).order_by('pk').values_list(*campos)
+    try:
+        for lote_de_linhas in lotes(linhas.iterator(chunk_size=lote), lote):
+            colunas = list(zip(*lote_de_linhas))
+            tabela = pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)], schema=esquema
+            )
+            datas = tabela.column(coluna_data)
+            for data in pc.unique(datas).to_pylist():
+                if data is None:
+                    parte, particao = tabela.filter(pc.is_null(datas)), SEM_DATA
+                else:
+                    parte, particao = tabela.filter(pc.equal(datas, pa.scalar(data, pa.date32()))), data.isoformat()
+                if particao not in escritores:
+                    relativo = caminho_da_particao(origem, particao)
+                    os.makedirs(os.path.dirname(os.path.join(raiz, relativo)), exist_ok=True)
+                    escritores[particao] = (relativo, pq.ParquetWriter(
+                        os.path.join(raiz, relativo), esquema, compression=COMPRESSAO
+                    ))
+                escritores[particao][1].write_table(parte)
+    except Exception:
+        for relativo, escritor in escritores.values():
+            escritor.close()
+            remover_arquivo(os.path.join(raiz, relativo))
+        raise
+
+    for _relativo, escritor in escritores.values():
+        escritor.close()
+    origem.arquivos_colunares = sorted(relativo for relativo, _escritor in escritores.values())
+    origem.save(update_fields=['arquivos_colunares'])
+    return origem.arquivos_colunares
+
+
+def arquivar_origem(origem):
+    """
+    Cópia colunar depois de uma importação. Falhas só vão para o log: o arquivo colunar
+    é derivado do banco e pode ser refeito com `manage.py arquivar_origens`.
+    """
+    if not colunar_disponivel():
+        return []
+    try:
+        return escrever_arquivo_colunar(origem)
+    except Exception:
+        logger.exception(f"Erro ao escrever a cópia colunar da origem {origem.pk}")
+        return []
+
+
+def remover_arquivo(caminho):
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def remover_arquivos_colunares(origem):
+    """Apaga os Parquets da origem (as pastas de partição vazias ficam)."""
+    raiz = diretorio_colunar()
+    for relativo in origem.arquivos_colunares or []:
+        remover_arquivo(os.path.join(raiz, relativo))
+
+
+def ler_colunar(tipo, inicio, fim, colunas=None, filial=None):
+    """
+    DataFrame com as `colunas` (padrão: todas) das linhas do `tipo` com data entre
+    `inicio` e `fim` (inclusive), opcionalmente de uma filial. Só as partições das datas
+    pedidas são abertas e só as colunas pedidas são lidas.
+
+    Uma linha atualizada por um arquivo revisado (modo 'atualizar') aparece no Parquet
+    das duas origens; vale a da origem mais nova.
+    """
+    if pa is None:
+        raise ImportError("A leitura do arquivo colunar precisa do pyarrow.")
+    modelo = MODELOS[tipo]
+    colunas = list(colunas or campos_arquivados(modelo))
+    raiz = diretorio_colunar()
+    if not os.path.isdir(raiz):
+        return pd.DataFrame(columns=colunas)
+
+    chaves = CHAVES_NATURAIS[modelo] + ['sequencia', 'origem_doc_id']
+    lidas = colunas + [chave for chave in chaves if chave not in colunas]
+
+    filtro = (ds.field('tipo_origem') == tipo) \
+        & (ds.field('data') >= inicio.isoformat()) & (ds.field('data') <= fim.isoformat())
+    if filial:
+        filtro &= ds.field('filial') == slug(filial)
+    # Performance e Financeiro dividem a raiz: o esquema vem do modelo, não do primeiro arquivo encontrado
+    particoes = pa.schema([('filial', pa.string()), ('tipo_origem', pa.string()), ('data', pa.string())])
+    esquema = pa.unify_schemas([esquema_do_modelo(modelo), particoes])
+    dataset = ds.dataset(raiz, schema=esquema, format='parquet',
+                         partitioning=ds.partitioning(particoes, flavor='hive'))
+    df = dataset.to_table(columns=lidas, filter=filtro).to_pandas()
+
+    if df['origem_doc_id'].nunique() > 1:
+        repetidas = df.sort_values('origem_doc_id', kind='stable').duplicated(chaves[:-1], keep='last')
+        df = df[~repetidas.reindex(df.index)]
+    return df[colunas].reset_index(drop=True)
@@ -0,0 +1,195 @@
+#fato/conciliacao.py
+"""
+Conciliação entre Performance e Financeiro: todo entregador-dia-período com corridas
+completadas na Performance deve ter um crédito de corridas no Financeiro (data do
+período de referência), e vice-versa. O resultado vai para a tabela Divergencia:
+- faltando: corridas completadas sem crédito no Financeiro;
+- sobrando: crédito no Financeiro sem corrida completada na Performance;
+- valor: os dois lados existem, mas o crédito difere da soma das taxas das corridas.
+
+Só entram os créditos de corridas (CREDITO_DE_CORRIDAS): valor por hora online,
+promoções, gorjetas e tempo de espera não têm contrapartida nas taxas da Performance.
+Créditos de corridas sem período são conciliados no nível entregador-dia, contra as
+corridas do dia que ficaram sem crédito do próprio período (divergência com período vazio).
+
+Cada data é conciliada à parte, em faixas de LOTE_ENTREGADORES entregadores: os dois
+lados da faixa saem agrupados do banco (um GROUP BY cada, pelos índices das chaves
+naturais), o Financeiro vira um dicionário pela chave e a Performance é percorrida em
+streaming contra ele, então a memória depende do tamanho da faixa e não da data. As
+divergências da data são apagadas e regravadas na mesma transação, então refazer uma
+data é sempre seguro.
+
+Cada importação concluída concilia as datas que trouxe (conciliar_origem); a exclusão
+de uma origem refaz as datas que ela tinha. Origens ainda não conciliadas (ex.:
+importadas antes desta tabela existir) são pegas por `manage.py conciliar`.
+"""
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import Divergencia, Financeiro, Origem, Performance
+from .saldos import DEBITO
+
+logger = logging.getLogger(__name__)
+
+LOTE_GRAVACAO = 1000  # Divergências por INSERT
+LOTE_ENTREGADORES = 500  # Entregadores por faixa conciliada de uma vez
+TOLERANCIA_CENTAVOS = 1  # Diferença de arredondamento aceita entre o crédito e as taxas
+
+# Lançamento das taxas das corridas ("Corridas concluidas" no export)
+CREDITO_DE_CORRIDAS = Q(descricao__icontains='corrida') & ~DEBITO
+
+TIPOS = ['performance', 'financeiro']
+
+# Coluna de data de cada lado da conciliação
+COLUNA_DATA = {
+    Performance: 'data_do_periodo',
+    Financeiro: 'data_do_periodo_de_referencia',
+}
+
+
+def faixas_de_entregadores(data, lote=LOTE_ENTREGADORES):
+    """(primeiro, último) id de cada faixa de `lote` entregadores com linhas na data, nos dois lados."""
+    ids = set(Performance.objects.filter(data_do_periodo=data).values_list(
+        'id_da_pessoa_entregadora', flat=True).distinct().order_by())
+    ids |= set(Financeiro.objects.filter(CREDITO_DE_CORRIDAS, data_do_periodo_de_referencia=data).values_list(
+        'id_da_pessoa_entregadora', flat=True).distinct().order_by())
+    ids = sorted(ids)
+    return [(ids[inicio], ids[min(inicio + lote, len(ids)) - 1]) for inicio in range(0, len(ids), lote)]
+
+
+def corridas_da_data(data, faixa):
+    """(id, período, corridas completadas, taxas) com corridas completadas na data, na faixa de entregadores."""
+    return Performance.objects.filter(
+        data_do_periodo=data, id_da_pessoa_entregadora__range=faixa,
+    ).values('id_da_pessoa_entregadora', 'periodo').annotate(
+        completadas=Sum('numero_de_corridas_completadas'),
+        taxas=Sum('soma_das_taxas_das_corridas_aceitas'),
+    ).filter(completadas__gt=0).values_list(
+        'id_da_pessoa_entregadora', 'periodo', 'completadas', 'taxas'
+    ).order_by()
+
+
+def creditos_da_data(data, faixa):
+    """
+    Créditos de corridas em centavos com período de referência na data, na faixa de
+    entregadores: ({(id, período): valor}, {id: valor dos lançamentos sem período}).
+    """
+    creditos = Financeiro.objects.filter(
+        CREDITO_DE_CORRIDAS, data_do_periodo_de_referencia=data, id_da_pessoa_entregadora__range=faixa,
+    ).values('id_da_pessoa_entregadora', 'periodo').annotate(creditos=Sum('valor')).filter(
+        creditos__gt=0
+    ).values_list('id_da_pessoa_entregadora', 'periodo', 'creditos').order_by()
+    por_periodo, sem_periodo = {}, {}
+    for id_entregador, periodo, valor in creditos:
+        if periodo:
+            por_periodo[(id_entregador, periodo)] = valor
+        else:
+            sem_periodo[id_entregador] = valor
+    return por_periodo, sem_periodo
+
+
+def divergencias_da_faixa(data, faixa, tolerancia=TOLERANCIA_CENTAVOS):
+    """Divergências (não gravadas) de uma faixa de entregadores numa data."""
+    creditos, sem_periodo = creditos_da_data(data, faixa)
+    sem_credito = defaultdict(list)  # id -> (completadas, taxas) dos períodos a conciliar no nível do dia
+    divergencias = []
+    for id_entregador, periodo, completadas, taxas in corridas_da_data(data, faixa).iterator():
+        credito = creditos.pop((id_entregador, periodo), None)
+        if credito is None and id_entregador in sem_periodo:
+            sem_credito[id_entregador].append((completadas, taxas))
+            continue
+        if credito is None:
+            tipo = Divergencia.FALTANDO
+        elif abs(credito - taxas) > tolerancia:
+            tipo = Divergencia.VALOR
+        else:
+            continue
+        divergencias.append(Divergencia(
+            tipo=tipo, id_da_pessoa_entregadora=id_entregador, data=data, periodo=periodo,
+            corridas_completadas=completadas, valor_performance=taxas, valor_financeiro=credito or 0,
+        ))
+    # Crédito sem período contra a soma das corridas do dia que ficaram sem crédito do próprio período
+    for id_entregador, credito in sem_periodo.items():
+        periodos = sem_credito.get(id_entregador, [])
+        completadas = sum(completadas for completadas, _taxas in periodos)
+        taxas = sum(taxas for _completadas, taxas in periodos)
+        if abs(credito - taxas) <= tolerancia:
+            continue
+        divergencias.append(Divergencia(
+            tipo=Divergencia.VALOR if periodos else Divergencia.SOBRANDO, id_da_pessoa_entregadora=id_entregador,
+            data=data, periodo='', corridas_completadas=completadas, valor_performance=taxas,
+            valor_financeiro=credito,
+        ))
+    # O que sobrou no dicionário não tem corrida completada correspondente
+    for (id_entregador, periodo), credito in creditos.items():
+        divergencias.append(Divergencia(
+            tipo=Divergencia.SOBRANDO, id_da_pessoa_entregadora=id_entregador, data=data, periodo=periodo,
+            valor_financeiro=credito,
+        ))
+    return divergencias
+
+
+def divergencias_da_data(data, tolerancia=TOLERANCIA_CENTAVOS, lote=LOTE_ENTREGADORES):
+    """Divergências (não gravadas) de uma data, faixa por faixa de entregadores."""
+    divergencias = []
+    for faixa in faixas_de_entregadores(data, lote):
+        divergencias.extend(divergencias_da_faixa(data, faixa, tolerancia))
+    for divergencia in divergencias:
+        divergencia.diferenca = divergencia.valor_financeiro - divergencia.valor_performance
+    return divergencias
+
+
+def conciliar_datas(datas, progresso=None):
+    """
+    Refaz as divergências das `datas`, uma data por transação. `progresso(data, divergencias)`
+    é chamado depois de cada data. Retorna o total de divergências gravadas.
+    """
+    total = 0
+    for data in sorted(datas):
+        with transaction.atomic():
+            Divergencia.objects.filter(data=data).delete()
+            gravadas = len(Divergencia.objects.bulk_create(divergencias_da_data(data), batch_size=LOTE_GRAVACAO))
+        total += gravadas
+        if progresso:
+            progresso(data, gravadas)
+    return total
+
+
+def datas_da_origem(origem):
+    """Datas conciliáveis das linhas da origem (Performance ou Financeiro)."""
+    for modelo, coluna in COLUNA_DATA.items():
+        if modelo.objects.filter(origem_doc=origem).exists():
+            datas = modelo.objects.filter(origem_doc=origem).exclude(**{coluna: None})
+            return set(datas.values_list(coluna, flat=True).distinct().order_by())
+    return set()
+
+
+def conciliar_origem(origem):
+    """Concilia as datas de uma origem recém-importada e a marca como conciliada (sem salvar o resto)."""
+    total = conciliar_datas(datas_da_origem(origem))
+    origem.conciliada_em = timezone.now()
+    Origem.objects.filter(pk=origem.pk).update(conciliada_em=origem.conciliada_em)
+    return total
+
+
+def origens_pendentes():
+    return Origem.objects.filter(tipo__in=TIPOS, linhas_importadas__gt=0, conciliada_em=None).order_by('pk')
+
+
+def conciliar_pendentes(progresso=None):
+    """
+    Concilia, de uma vez, as datas de todas as origens ainda não conciliadas (uma data
+    tocada por várias origens é refeita uma vez só). Retorna (origens, divergências).
+    """
+    origens = list(origens_pendentes())
+    datas = set()
+    for origem in origens:
+        datas |= datas_da_origem(origem)
+    total = conciliar_datas(datas, progresso)
+    Origem.objects.filter(pk__in=[origem.pk for origem in origens]).update(conciliada_em=timezone.now())
+    logger.info(f"Conciliação: {len(origens)} origens, {len(datas)} datas, {total} divergências.")
+    return len(origens), total
@@ -0,0 +1,191 @@
+#fato/conversores.py
+"""
+Conversões de colunas inteiras dos CSVs para os tipos gravados no banco.
+
+Cada conversor recebe uma Series de texto e devolve (valores_convertidos, invalidos),
+onde `invalidos` é a máscara das linhas que não puderam ser convertidas.
+Vazio é tratado como 0 nos campos numéricos, como no import antigo.
+
+Os formatos mais comuns (inteiros e decimais simples, durações 'HH:MM:SS') passam por
+um caminho rápido com numpy sobre os bytes da coluna; qualquer valor fora dele faz a
+coluna inteira seguir pelo caminho geral, que trata vazios, vírgulas e espaços.
+"""
+import numpy as np
+import pandas as pd
+
+
+def como_bytes(serie):
+    """Array numpy de bytes da coluna, ou None se houver valor fora do ASCII."""
+    try:
+        return np.asarray(serie.to_numpy(), dtype='S')
+    except UnicodeEncodeError:
+        return None
+
+
+def sem_invalidos(serie):
+    return pd.Series(False, index=serie.index)
+
+
+def inteiros_rapido(serie):
+    """Caminho rápido: int64 se todos os valores são inteiros sem sinal de vazio; senão None."""
+    dados = como_bytes(serie)
+    if dados is None:
+        return None
+    try:
+        return dados.astype(np.int64)
+    except (ValueError, OverflowError):
+        return None
+
+
+def decimais_rapido(serie):
+    """Caminho rápido: float64 se todos os valores são números com ponto decimal; senão None."""
+    dados = como_bytes(serie)
+    if dados is None:
+        return None
+    try:
+        numeros = dados.astype(np.float64)
+    except ValueError:
+        return None
+    return numeros if np.isfinite(numeros).all() else None  # 'nan'/'inf' seguem pelo caminho geral
+
+
+def converter_inteiros(serie):
+    """Converte para int. Vazio vira 0 (como o `int(x or 0)` antigo)."""
+    rapido = inteiros_rapido(serie)
+    if rapido is not None:
+        return pd.Series(rapido, index=serie.index), sem_invalidos(serie)
+    texto = serie.str.strip()
+    numeros = pd.to_numeric(texto, errors='coerce')
+    invalidos = (numeros.isna() & texto.ne('')) | (numeros.notna() & (numeros % 1 != 0))
+    return numeros.where(~invalidos, 0).fillna(0).astype('int64'), invalidos
+
+
+def converter_datas(serie):
+    """Aceita AAAA-MM-DD (export padrão) e DD/MM/AAAA (planilhas consolidadas)."""
+    texto = serie.str.strip()
+    datas = pd.to_datetime(texto, format='%Y-%m-%d', errors='coerce')
+    faltando = datas.isna() & texto.ne('')
+    if faltando.any():
+        datas = datas.fillna(pd.to_datetime(texto.where(faltando), format='%d/%m/%Y', errors='coerce'))
+    return datas.dt.date, datas.isna()
+
+
+def converter_datas_opcionais(serie):
+    """Como converter_datas, mas vazio vira None (campos de data que aceitam nulo)."""
+    datas, invalidos = converter_datas(serie)
+    vazios = serie.str.strip().eq('')
+    return datas.astype(object).where(~invalidos, None), invalidos & ~vazios
+
+
+def duracoes_rapido(serie):
+    """Caminho rápido: segundos se todos os valores são exatamente 'HH:MM:SS'; senão None."""
+    dados = como_bytes(serie)
+    if dados is None or dados.dtype.itemsize != 8:
+        return None
+    caracteres = dados.view(np.uint8).reshape(-1, 8)
+    digitos = caracteres[:, [0, 1, 3, 4, 6, 7]] - ord('0')  # Não dígitos dão valores > 9 (uint8)
+    if (digitos > 9).any() or (digitos[:, [2, 4]] > 5).any() \
+            or (caracteres[:, [2, 5]] != ord(':')).any():
+        return None
+    digitos = digitos.astype(np.int64)
+    horas = digitos[:, 0] * 10 + digitos[:, 1]
+    minutos = digitos[:, 2] * 10 + digitos[:, 3]
+    segundos = digitos[:, 4] * 10 + digitos[:, 5]
+    return horas * 3600 + minutos * 60 + segundos
+
+
+def converter_duracoes(serie):
+    """Converte 'HH:MM:SS' (as horas podem passar de 24) para segundos inteiros."""
+    rapido = duracoes_rapido(serie)
+    if rapido is not None:
+        return pd.Series(rapido, index=serie.index), sem_invalidos(serie)
+    texto = serie.str.strip()
+    partes = texto.str.extract(r'^(\d+):([0-5]?\d):([0-5]?\d)$')
+    invalidos = partes[0].isna() & texto.ne('')
+    partes = partes.fillna('0').astype('int64')
+    segundos = partes[0] * 3600 + partes[1] * 60 + partes[2]
+    return segundos.where(~invalidos, 0), invalidos
+
+
+def numeros_br(texto):
+    """
+    Interpreta números escritos com vírgula decimal ('1.234,56') ou ponto decimal ('99.50').
+    Quando há vírgula, os pontos são separadores de milhar.
+    """
+    com_virgula = texto.str.contains(',', regex=False)
+    normalizado = texto.where(~com_virgula, texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+    return pd.to_numeric(normalizado, errors='coerce')
+
+
+def converter_decimais(serie):
+    """Converte percentuais e outros decimais para float com 2 casas."""
+    rapido = decimais_rapido(serie)
+    if rapido is not None:
+        return pd.Series(rapido, index=serie.index).round(2), sem_invalidos(serie)
+    texto = serie.str.strip()
+    numeros = numeros_br(texto)
+    invalidos = numeros.isna() & texto.ne('')
+    return numeros.where(~invalidos, 0).fillna(0).round(2), invalidos
+
+
+def converter_decimais_opcionais(serie):
+    """Como converter_decimais, mas vazio vira None (percentuais que nem sempre vêm no arquivo)."""
+    texto = serie.str.strip()
+    numeros = numeros_br(texto).round(2)
+    invalidos = numeros.isna() & texto.ne('')
+    return numeros.astype(object).where(numeros.notna(), None), invalidos
+
+
+def converter_centavos(serie, inteiros_em_centavos=False):
+    """
+    Converte valores monetários para centavos inteiros. Valores com separador decimal
+    estão em reais ('6,50' -> 650). Sem separador, `inteiros_em_centavos` diz se o
+    número já está em centavos (soma das taxas da Performance) ou em reais.
+    """
+    rapido = inteiros_rapido(serie)
+    if rapido is not None:
+        centavos = rapido if inteiros_em_centavos else rapido * 100
+        return pd.Series(centavos, index=serie.index), sem_invalidos(serie)
+    texto = serie.str.strip()
+    numeros = numeros_br(texto)
+    invalidos = numeros.isna() & texto.ne('')
+    sem_separador = ~texto.str.contains(r'[.,]')
+    multiplicador = pd.Series(100, index=serie.index)
+    if inteiros_em_centavos:
+        multiplicador = multiplicador.where(~sem_separador, 1)
+    centavos = (numeros.where(~invalidos, 0).fillna(0) * multiplicador).round()
+    return centavos.astype('int64'), invalidos
+
+
+def converter_centavos_inteiros(serie):
+    """Soma das taxas: inteiros já vêm em centavos no export."""
+    return converter_centavos(serie, inteiros_em_centavos=True)
+
+
+MOTIVOS = {
+    converter_inteiros: 'valor inteiro inválido',
+    converter_datas: 'data inválida',
+    converter_datas_opcionais: 'data inválida',
+    converter_duracoes: 'duração inválida (esperado HH:MM:SS)',
+    converter_decimais: 'número decimal inválido',
+    converter_decimais_opcionais: 'número decimal inválido',
+    converter_centavos: 'valor monetário inválido',
+    converter_centavos_inteiros: 'valor monetário inválido',
+}
+
+
+def formatar_centavos(centavos):
+    """Centavos -> 'R$ 1.234,56', para exibição."""
+    if centavos is None:
+        return ''
+    reais = f"{centavos / 100:,.2f}".replace(',', '_').replace('.', ',').replace('_', '.')
+    return f"R$ {reais}"
+
+
+def formatar_duracao(segundos):
+    """Segundos -> 'HH:MM:SS', para exibição."""
+    if segundos is None:
+        return ''
+    horas, resto = divmod(int(segundos), 3600)
+    minutos, segundos = divmod(resto, 60)
+    return f"{horas:02d}:{minutos:02d}:{segundos:02d}"
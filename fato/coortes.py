@@ -0,0 +1,165 @@
+#fato/coortes.py
+"""
+Coortes de entregadores pela data de ingresso na franquia (Driver.dt_franquia).
+
+AtividadeCoorte guarda, para cada data de ingresso e semana de atividade, quantos
+entregadores daquela data rodaram na semana e o tempo disponível deles. As coortes
+por semana ou mês de ingresso são somas dessas linhas (cada entregador está numa data
+só), então a matriz de retenção de um ano sai de alguns milhares de linhas, sem ler
+Performance nem PerformanceDiaria.
+
+A tabela vem da PerformanceDiaria, uma semana de atividade por vez: as semanas das
+datas importadas ou excluídas são refeitas junto com o cubo (fato.cubo.atualizar_cubo);
+quando a dt_franquia (ou o uuid) de um entregador muda, são refeitas as semanas em que
+ele rodou (atualizar_coortes_dos_entregadores).
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from app.models import Driver
+
+from .models import AtividadeCoorte, PerformanceDiaria
+
+logger = logging.getLogger(__name__)
+
+LOTE_ENTREGADORES = 500  # Ids por consulta (limite de parâmetros do SQLite)
+SEGUNDOS_POR_HORA = 3600
+
+
+def inicio_da_semana(data):
+    return data - timedelta(days=data.weekday())
+
+
+# Primeiro dia da coorte de uma data de ingresso
+AGRUPAMENTOS = {
+    'semana': inicio_da_semana,
+    'mes': lambda data: data.replace(day=1),
+}
+
+
+def ingressos():
+    """uuid -> dt_franquia dos entregadores com os dois preenchidos."""
+    return dict(Driver.objects.exclude(uuid=None).exclude(dt_franquia=None).values_list('uuid', 'dt_franquia'))
+
+
+def recalcular_semana(semana, datas_de_ingresso):
+    """Refaz as linhas de uma semana de atividade (segunda-feira). Retorna quantas foram gravadas."""
+    AtividadeCoorte.objects.filter(semana=semana).delete()
+    ativos = PerformanceDiaria.objects.filter(data_do_periodo__range=(semana, semana + timedelta(days=6))).values(
+        'id_da_pessoa_entregadora'
+    ).annotate(segundos=Sum('tempo_disponivel_absoluto')).values_list('id_da_pessoa_entregadora', 'segundos').order_by()
+
+    por_ingresso = defaultdict(lambda: [0, 0])
+    for id_entregador, segundos in ativos:
+        entrada = datas_de_ingresso.get(id_entregador)
+        # Atividade antes da semana de ingresso (dt_franquia editada à mão) não entra na matriz
+        if entrada is None or inicio_da_semana(entrada) > semana:
+            continue
+        por_ingresso[entrada][0] += 1
+        por_ingresso[entrada][1] += segundos or 0
+
+    return len(AtividadeCoorte.objects.bulk_create([
+        AtividadeCoorte(entrada=entrada, semana=semana, entregadores=entregadores, segundos=segundos)
+        for entrada, (entregadores, segundos) in por_ingresso.items()
+    ]))
+
+
+def atualizar_coortes(datas):
+    """Refaz as semanas de atividade que contêm as datas. Deve rodar na transação que alterou a PerformanceDiaria."""
+    semanas = sorted({inicio_da_semana(data) for data in datas})
+    if not semanas:
+        return 0
+    datas_de_ingresso = ingressos()
+    return sum(recalcular_semana(semana, datas_de_ingresso) for semana in semanas)
+
+
+def atualizar_coortes_dos_entregadores(uuids, lote=LOTE_ENTREGADORES):
+    """Depois de mudar a dt_franquia (ou o uuid) de entregadores: refaz as semanas em que eles rodaram."""
+    uuids = sorted(set(uuid for uuid in uuids if uuid))
+    datas = set()
+    for inicio in range(0, len(uuids), lote):
+        datas |= set(PerformanceDiaria.objects.filter(
+            id_da_pessoa_entregadora__in=uuids[inicio:inicio + lote]
+        ).values_list('data_do_periodo', flat=True).distinct().order_by())
+    with transaction.atomic():
+        return atualizar_coortes(datas)
+
+
+def reconstruir_coortes(progresso=None):
+    """
+    Refaz a AtividadeCoorte inteira, uma semana por transação. `progresso(semana, gravadas)`
+    é chamado depois de cada semana. Retorna o total gravado.
+    """
+    datas = PerformanceDiaria.objects.values_list('data_do_periodo', flat=True).distinct().order_by()
+    semanas = sorted({inicio_da_semana(data) for data in datas})
+    datas_de_ingresso = ingressos()
+
+    total = 0
+    with transaction.atomic():
+        # Semanas que ficaram só na tabela de coortes (a Performance delas foi removida por fora)
+        AtividadeCoorte.objects.exclude(semana__in=semanas).delete()
+    for semana in semanas:
+        with transaction.atomic():
+            gravadas = recalcular_semana(semana, datas_de_ingresso)
+        total += gravadas
+        if progresso:
+            progresso(semana, gravadas)
+    logger.info(f"AtividadeCoorte reconstruída: {total} linhas em {len(semanas)} semanas.")
+    return total
+
+
+def matriz_de_retencao(inicio, fim, agrupar_por='semana', semanas=None):
+    """
+    Coortes com ingresso entre `inicio` e `fim`, agrupadas por 'semana' ou 'mes' de
+    ingresso. Para cada coorte: tamanho (entregadores com uuid e dt_franquia) e, para
+    cada semana depois do ingresso (0 = semana do início da coorte), entregadores
+    ativos, retenção (ativos / tamanho) e horas. `semanas` limita as colunas.
+
+    Retorna [{'coorte': data, 'tamanho': n, 'semanas': [{'semana': k, 'ativos': n,
+    'retencao': 0-1, 'horas': h}, ...]}], uma por coorte com entregadores.
+    """
+    if agrupar_por not in AGRUPAMENTOS:
+        raise ValueError(f"Agrupamento desconhecido: {agrupar_por}. Opções: {', '.join(AGRUPAMENTOS)}")
+    coorte_de = AGRUPAMENTOS[agrupar_por]
+
+    tamanhos = defaultdict(int)
+    por_data = Driver.objects.exclude(uuid=None).filter(dt_franquia__range=(inicio, fim)).values(
+        'dt_franquia'
+    ).annotate(quantidade=Count('pk')).values_list('dt_franquia', 'quantidade').order_by()
+    for entrada, quantidade in por_data:
+        tamanhos[coorte_de(entrada)] += quantidade
+
+    celulas = defaultdict(lambda: [0, 0])
+    atividade = AtividadeCoorte.objects.filter(entrada__range=(inicio, fim)).values_list(
+        'entrada', 'semana', 'entregadores', 'segundos'
+    ).order_by()
+    for entrada, semana, entregadores, segundos in atividade:
+        coorte = coorte_de(entrada)
+        deslocamento = (semana - inicio_da_semana(coorte)).days // 7
+        if semanas is not None and deslocamento >= semanas:
+            continue
+        celulas[coorte, deslocamento][0] += entregadores
+        celulas[coorte, deslocamento][1] += segundos
+
+    # As colunas vão até a última semana com dados, para que coortes sem ninguém rodando mostrem zero
+    ultima_semana = AtividadeCoorte.objects.aggregate(ultima=Max('semana'))['ultima']
+
+    matriz = []
+    for coorte in sorted(tamanhos):
+        tamanho = tamanhos[coorte]
+        colunas = []
+        total_de_semanas = (ultima_semana - inicio_da_semana(coorte)).days // 7 + 1 if ultima_semana else 0
+        if semanas is not None:
+            total_de_semanas = min(total_de_semanas, semanas)
+        for deslocamento in range(total_de_semanas):
+            ativos, segundos = celulas.get((coorte, deslocamento), (0, 0))
+            colunas.append({
+                'semana': deslocamento, 'ativos': ativos, 'retencao': ativos / tamanho,
+                'horas': segundos / SEGUNDOS_POR_HORA,
+            })
+        matriz.append({'coorte': coorte, 'tamanho': tamanho, 'semanas': colunas})
+    return matriz
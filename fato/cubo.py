@@ -0,0 +1,308 @@
+#fato/cubo.py
+"""
+Cubo de Performance: as medidas somáveis (linhas, segundos, corridas, centavos)
+pré-agregadas em vários grãos de tempo × praça/sub-praça/período.
+
+O grão mais fino (dia × praça × sub-praça × período) vem direto da Performance; os
+demais são somados a partir dele. Depois de cada importação (ou exclusão) de uma
+origem, só as datas dela — e as semanas e meses que as contêm — são recalculadas.
+
+consultar_cubo responde um recorte qualquer a partir do grão mais grosso que tenha
+as dimensões pedidas e cujos limites de tempo batam com o intervalo. Medianas e
+percentis não são somáveis: consultar_quantis junta os esboços diários de fato.quantis.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .cache import em_cache
+from .coortes import atualizar_coortes
+from .models import CuboPerformance, EsbocoQuantis, Performance
+from .quantis import METRICAS, Esboco, atualizar_esbocos
+
+logger = logging.getLogger(__name__)
+
+LOTE_DATAS = 500  # Datas por consulta (limite de parâmetros do SQLite)
+
+DIMENSOES = ['praca', 'sub_praca', 'periodo']
+
+MEDIDAS = [
+    'linhas', 'duracao_do_periodo', 'tempo_disponivel_absoluto', 'numero_de_corridas_ofertadas',
+    'numero_de_corridas_aceitas', 'numero_de_corridas_rejeitadas', 'numero_de_corridas_completadas',
+    'numero_de_corridas_canceladas_pela_pessoa_entregadora', 'numero_de_pedidos_aceitos_e_concluidos',
+    'soma_das_taxas_das_corridas_aceitas',
+]
+
+# Razões calculadas depois da soma: (numerador, denominador)
+RAZOES = {
+    'taxa_de_aceitacao': ('numero_de_corridas_aceitas', 'numero_de_corridas_ofertadas'),
+    'taxa_de_conclusao': ('numero_de_corridas_completadas', 'numero_de_corridas_aceitas'),
+}
+
+# (nome, tempo, dimensões), do mais fino ao mais grosso
+GRAOS = [
+    ('dia_sub_praca_periodo', 'dia', ['praca', 'sub_praca', 'periodo']),
+    ('dia_sub_praca', 'dia', ['praca', 'sub_praca']),
+    ('semana_sub_praca_periodo', 'semana', ['praca', 'sub_praca', 'periodo']),
+    ('semana_sub_praca', 'semana', ['praca', 'sub_praca']),
+    ('mes_sub_praca_periodo', 'mes', ['praca', 'sub_praca', 'periodo']),
+    ('mes_sub_praca', 'mes', ['praca', 'sub_praca']),
+    ('mes_praca', 'mes', ['praca']),
+]
+GRAO_BASE = GRAOS[0][0]
+
+# Primeiro dia do período de tempo que contém a data
+INICIO_DO_TEMPO = {
+    'dia': lambda data: data,
+    'semana': lambda data: data - timedelta(days=data.weekday()),
+    'mes': lambda data: data.replace(day=1),
+}
+
+QUANTIS = (0.5, 0.9)  # Padrão de consultar_quantis: mediana e p90
+
+# Chave de agrupamento de uma data em cada granularidade aceita na consulta
+CHAVE_DO_TEMPO = {
+    **INICIO_DO_TEMPO,
+    'dia_da_semana': lambda data: data.weekday(),  # 0 = segunda
+}
+
+
+def fim_do_tempo(tempo, data):
+    """Último dia do período de tempo que contém a data."""
+    inicio = INICIO_DO_TEMPO[tempo](data)
+    if tempo == 'semana':
+        return inicio + timedelta(days=6)
+    if tempo == 'mes':
+        return (inicio + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return inicio
+
+
+def lotes(itens, tamanho):
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+def datas_da_origem(origem):
+    return set(Performance.objects.filter(origem_doc=origem).values_list('data_do_periodo', flat=True).distinct())
+
+
+def recalcular_base(datas):
+    """Grão mais fino, direto da Performance."""
+    somas = {'linhas': Count('id'), **{medida: Sum(medida) for medida in MEDIDAS[1:]}}
+    for lote in lotes(datas, LOTE_DATAS):
+        CuboPerformance.objects.filter(grao=GRAO_BASE, data__in=lote).delete()
+        linhas = Performance.objects.filter(data_do_periodo__in=lote).values(
+            *DIMENSOES, data=F('data_do_periodo')
+        ).annotate(**somas).order_by()
+        CuboPerformance.objects.bulk_create([CuboPerformance(grao=GRAO_BASE, **linha) for linha in linhas])
+
+
+def recalcular_grao(nome, tempo, dimensoes, datas):
+    """Um grão derivado, somado do grão base, para os períodos de tempo que contêm as datas."""
+    somas = {medida: Sum(medida) for medida in MEDIDAS}
+    base = CuboPerformance.objects.filter(grao=GRAO_BASE)
+    for inicio in sorted({INICIO_DO_TEMPO[tempo](data) for data in datas}):
+        CuboPerformance.objects.filter(grao=nome, data=inicio).delete()
+        linhas = base.filter(data__range=(inicio, fim_do_tempo(tempo, inicio))).values(*dimensoes).annotate(**somas)
+        CuboPerformance.objects.bulk_create([
+            CuboPerformance(grao=nome, data=inicio, **linha) for linha in linhas.order_by()
+        ])
+
+
+def atualizar_cubo(datas):
+    """
+    Recalcula todos os grãos do cubo para as datas (e suas semanas e meses), os
+    esboços de quantis das datas (fato.quantis) e as semanas de atividade das coortes
+    (fato.coortes), numa transação.
+    """
+    datas = sorted(set(datas))
+    if not datas:
+        return
+    with transaction.atomic():
+        recalcular_base(datas)
+        for nome, tempo, dimensoes in GRAOS[1:]:
+            recalcular_grao(nome, tempo, dimensoes, datas)
+        atualizar_esbocos(datas)
+        atualizar_coortes(datas)
+
+
+def atualizar_cubo_da_origem(origem):
+    """Depois da importação de uma origem de Performance."""
+    if origem.tipo == 'performance':
+        atualizar_cubo(datas_da_origem(origem))
+
+
+def reconstruir_cubo(inicio=None, fim=None, progresso=None):
+    """
+    Refaz o cubo (inteiro ou só entre `inicio` e `fim`), um mês por transação.
+    `progresso(mes, datas)` é chamado depois de cada mês. Retorna quantas datas foram processadas.
+    """
+    datas = Performance.objects.all()
+    base = CuboPerformance.objects.filter(grao=GRAO_BASE)
+    if inicio:
+        datas, base = datas.filter(data_do_periodo__gte=inicio), base.filter(data__gte=inicio)
+    if fim:
+        datas, base = datas.filter(data_do_periodo__lte=fim), base.filter(data__lte=fim)
+    # As datas que só existem no cubo (Performance removida por fora) também são recalculadas, e somem
+    datas = set(datas.values_list('data_do_periodo', flat=True).distinct()) \
+        | set(base.values_list('data', flat=True).distinct())
+
+    por_mes = defaultdict(list)
+    for data in datas:
+        por_mes[INICIO_DO_TEMPO['mes'](data)].append(data)
+    for mes in sorted(por_mes):
+        atualizar_cubo(por_mes[mes])
+        if progresso:
+            progresso(mes, len(por_mes[mes]))
+    return len(datas)
+
+
+def atende(grao, dimensoes, tempo, inicio, fim):
+    """True se o grão tem as dimensões e os limites de tempo para responder a consulta."""
+    _nome, tempo_do_grao, dimensoes_do_grao = grao
+    if not set(dimensoes) <= set(dimensoes_do_grao):
+        return False
+    if tempo_do_grao == 'dia':
+        return True
+    # Semana e mês não se decompõem: só respondem a si mesmos (ou ao total) em intervalos alinhados
+    if tempo not in (None, tempo_do_grao):
+        return False
+    return (inicio is None or inicio == INICIO_DO_TEMPO[tempo_do_grao](inicio)) \
+        and (fim is None or fim == fim_do_tempo(tempo_do_grao, fim))
+
+
+def escolher_grao(dimensoes=(), tempo=None, inicio=None, fim=None):
+    """Nome do grão mais grosso que responde a consulta."""
+    for grao in reversed(GRAOS):
+        if atende(grao, dimensoes, tempo, inicio, fim):
+            return grao[0]
+    raise ValueError(f"Nenhum grão do cubo tem as dimensões {list(dimensoes)}.")
+
+
+def consultar_cubo(dimensoes=(), tempo=None, inicio=None, fim=None, filtros=None, medidas=None):
+    """
+    Soma das `medidas` (padrão: todas, mais as RAZOES) agrupada pelas `dimensoes`
+    (praca, sub_praca, periodo) e pelo `tempo` ('dia', 'semana', 'mes', 'dia_da_semana'
+    ou None para o total do intervalo). `filtros` é {dimensão: valor ou lista de valores}.
+
+    Retorna uma lista de dicts com a chave 'tempo' (quando pedido), as dimensões e as medidas.
+    O resultado fica em cache (fato.cache) até uma importação tocar o intervalo.
+
+        consultar_cubo(['sub_praca', 'periodo'], 'dia_da_semana', inicio, fim)
+        consultar_cubo(['praca'], 'mes', medidas=['taxa_de_aceitacao'])
+    """
+    dimensoes = list(dimensoes)
+    filtros = filtros or {}
+    if tempo is not None and tempo not in CHAVE_DO_TEMPO:
+        raise ValueError(f"Tempo desconhecido: {tempo}")
+    desconhecidas = set(dimensoes + list(filtros)) - set(DIMENSOES)
+    if desconhecidas:
+        raise ValueError(f"Dimensões desconhecidas: {sorted(desconhecidas)}")
+    medidas = list(medidas or MEDIDAS + list(RAZOES))
+    desconhecidas = set(medidas) - set(MEDIDAS) - set(RAZOES)
+    if desconhecidas:
+        raise ValueError(f"Medidas desconhecidas: {sorted(desconhecidas)}")
+
+    # Os filtros viram tuplas ordenadas para que a chave do cache não dependa da ordem
+    parametros = (dimensoes, tempo, medidas, sorted(
+        (dimensao, tuple(sorted(valor)) if isinstance(valor, (list, tuple, set)) else valor)
+        for dimensao, valor in filtros.items()
+    ))
+    return em_cache(
+        'consultar_cubo', lambda: agregar_cubo(dimensoes, tempo, inicio, fim, filtros, medidas),
+        ['performance'], inicio, fim, parametros=parametros,
+    )
+
+
+def agregar_cubo(dimensoes, tempo, inicio, fim, filtros, medidas):
+    """Consulta ao cubo já validada por consultar_cubo, sem cache."""
+    somadas = [medida for medida in MEDIDAS
+               if medida in medidas or any(medida in RAZOES[razao] for razao in medidas if razao in RAZOES)]
+    grao = escolher_grao(dimensoes + list(filtros), tempo, inicio, fim)
+    linhas = CuboPerformance.objects.filter(grao=grao)
+    if inicio:
+        linhas = linhas.filter(data__gte=inicio)
+    if fim:
+        linhas = linhas.filter(data__lte=fim)
+    for dimensao, valor in filtros.items():
+        linhas = linhas.filter(**({f'{dimensao}__in': valor} if isinstance(valor, (list, tuple, set)) else {dimensao: valor}))
+
+    agrupadas = (['data'] if tempo else []) + dimensoes
+    linhas = linhas.values(*agrupadas).annotate(**{medida: Sum(medida) for medida in somadas}).order_by(*agrupadas)
+    logger.debug(f"consultar_cubo({dimensoes}, {tempo}) pelo grão {grao}")
+
+    # O banco já agrupou pela data do grão; dia da semana, ou semana/mês a partir do grão diário, são reagrupados aqui
+    resultado = {}
+    for linha in linhas:
+        chave = tuple(linha[dimensao] for dimensao in dimensoes)
+        if tempo:
+            chave = (CHAVE_DO_TEMPO[tempo](linha['data']),) + chave
+        acumulado = resultado.setdefault(chave, dict.fromkeys(somadas, 0))
+        for medida in somadas:
+            acumulado[medida] += linha[medida] or 0
+
+    saida = []
+    for chave in sorted(resultado):
+        valores = resultado[chave]
+        linha = dict(zip((['tempo'] if tempo else []) + dimensoes, chave))
+        for medida in medidas:
+            if medida in RAZOES:
+                numerador, denominador = RAZOES[medida]
+                linha[medida] = valores[numerador] / valores[denominador] if valores[denominador] else None
+            else:
+                linha[medida] = valores[medida]
+        saida.append(linha)
+    return saida
+
+
+def consultar_quantis(metrica, inicio=None, fim=None, tempo=None, por_sub_praca=False, sub_pracas=None,
+                      quantis=QUANTIS):
+    """
+    Quantis da `metrica` agrupados pelo `tempo` ('dia', 'semana', 'mes', 'dia_da_semana'
+    ou None para o intervalo todo) e, com `por_sub_praca`, pela sub-praça. Retorna uma
+    lista de dicts com 'tempo' (quando pedido), 'sub_praca' (idem), 'contagem' e um
+    'p50', 'p90'... por quantil. Fica em cache (fato.cache) até uma importação tocar o intervalo.
+
+        consultar_quantis('tempo_disponivel_absoluto', inicio, fim, 'semana')
+        consultar_quantis('corridas_por_entregador', inicio, fim, 'mes', por_sub_praca=True)
+    """
+    if metrica not in METRICAS:
+        raise ValueError(f"Métrica desconhecida: {metrica}. Opções: {', '.join(METRICAS)}")
+    if tempo is not None and tempo not in CHAVE_DO_TEMPO:
+        raise ValueError(f"Tempo desconhecido: {tempo}")
+    sub_pracas = sorted(sub_pracas) if sub_pracas else None
+    quantis = tuple(quantis)
+    return em_cache(
+        'consultar_quantis', lambda: juntar_esbocos(metrica, inicio, fim, tempo, por_sub_praca, sub_pracas, quantis),
+        ['performance'], inicio, fim, parametros=(metrica, tempo, por_sub_praca, sub_pracas, quantis),
+    )
+
+
+def juntar_esbocos(metrica, inicio, fim, tempo, por_sub_praca, sub_pracas, quantis):
+    """Consulta já validada por consultar_quantis, sem cache."""
+    esbocos = EsbocoQuantis.objects.filter(metrica=metrica)
+    if inicio:
+        esbocos = esbocos.filter(data__gte=inicio)
+    if fim:
+        esbocos = esbocos.filter(data__lte=fim)
+    if sub_pracas:
+        esbocos = esbocos.filter(sub_praca__in=sub_pracas)
+
+    juntos = {}
+    for data, sub_praca, dados in esbocos.values_list('data', 'sub_praca', 'esboco').iterator():
+        chave = ((CHAVE_DO_TEMPO[tempo](data),) if tempo else ()) + ((sub_praca,) if por_sub_praca else ())
+        juntos.setdefault(chave, Esboco()).juntar(Esboco.de_dict(dados))
+
+    nomes = (['tempo'] if tempo else []) + (['sub_praca'] if por_sub_praca else [])
+    saida = []
+    for chave in sorted(juntos):
+        esboco = juntos[chave]
+        linha = dict(zip(nomes, chave))
+        linha['contagem'] = esboco.contagem
+        for q in quantis:
+            linha[f'p{round(q * 100):g}'] = esboco.quantil(q)
+        saida.append(linha)
+    return saida
@@ -0,0 +1,110 @@
+#fato/deteccao.py
+"""
+Detecção do formato de um CSV lendo só o começo do arquivo.
+
+Encoding, delimitador, aspas e cabeçalho saem de uma amostra de tamanho fixo, e o
+tipo (Performance ou Financeiro) é escolhido pelas colunas obrigatórias antes de
+qualquer leitura completa. Arquivo em formato errado é recusado sem passar pelo pandas.
+Linhas depois da amostra em outro encoding são rejeitadas uma a uma na importação.
+"""
+import codecs
+import csv
+import io
+
+from charset_normalizer import from_bytes
+
+from .importacao import identificar_tipo
+
+TAMANHO_AMOSTRA = 64 * 1024  # Bytes lidos do início do arquivo
+LINHAS_AMOSTRA = 20  # Linhas usadas pelo csv.Sniffer
+DELIMITADORES = ';,\t|'
+# Fora do UTF-8, os exports que recebemos vêm de planilhas em português: Windows-1252/Latin-1
+# (ou UTF-16 salvo pelo Excel). Restringir os candidatos evita palpites como cp1250.
+ENCODINGS_CANDIDATOS = ['cp1252', 'latin_1', 'utf_16']
+
+
+class FormatoInvalido(ValueError):
+    """O começo do arquivo já mostra que ele não pode ser importado."""
+
+
+class FormatoArquivo:
+    """Como ler o CSV: o que o pd.read_csv precisa e o tipo de fato identificado."""
+
+    def __init__(self, encoding, delimitador, aspas='"', colunas=None, tipo=None):
+        self.encoding = encoding
+        self.delimitador = delimitador
+        self.aspas = aspas
+        self.colunas = colunas or []
+        self.tipo = tipo
+
+    def opcoes_read_csv(self):
+        # A amostra pode não ter mostrado tudo: bytes que o encoding não decodifica viram U+FFFD
+        # e a linha é rejeitada (importacao.mal_decodificados), em vez de a leitura parar no meio
+        return {'encoding': self.encoding, 'encoding_errors': 'replace', 'delimiter': self.delimitador,
+                'quotechar': self.aspas}
+
+    def __repr__(self):
+        return f"FormatoArquivo({self.tipo}, {self.encoding!r}, {self.delimitador!r})"
+
+
+def ler_amostra(arquivo, tamanho=TAMANHO_AMOSTRA):
+    """Primeiros `tamanho` bytes do arquivo; a posição volta para o início."""
+    arquivo.seek(0)
+    amostra = arquivo.read(tamanho)
+    arquivo.seek(0)
+    return amostra
+
+
+def detectar_encoding(amostra):
+    """Pelo BOM; UTF-8 quando decodifica sem erro; senão pergunta ao charset-normalizer."""
+    if amostra.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if amostra.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # Até a última quebra de linha, para não cortar um caractere multibyte no fim da amostra
+        amostra[:amostra.rfind(b'\n') + 1 or len(amostra)].decode('utf-8')
+        return 'utf-8-sig'
+    except UnicodeDecodeError:
+        pass
+    provavel = from_bytes(amostra, cp_isolation=ENCODINGS_CANDIDATOS).best()
+    return provavel.encoding if provavel else 'cp1252'
+
+
+def detectar_dialeto(texto):
+    """Delimitador e aspas pelas primeiras linhas; se o Sniffer não decidir, conta no cabeçalho."""
+    primeiras = '\n'.join(texto.splitlines()[:LINHAS_AMOSTRA])
+    try:
+        dialeto = csv.Sniffer().sniff(primeiras, delimiters=DELIMITADORES)
+        return dialeto.delimiter, dialeto.quotechar or '"'
+    except csv.Error:
+        cabecalho = texto.split('\n', 1)[0]
+        contagem = {delimitador: cabecalho.count(delimitador) for delimitador in DELIMITADORES}
+        delimitador = max(contagem, key=contagem.get)
+        return (delimitador if contagem[delimitador] else ';'), '"'
+
+
+def detectar_formato(arquivo, tamanho_amostra=TAMANHO_AMOSTRA):
+    """
+    FormatoArquivo do arquivo (aberto em modo binário), lendo no máximo `tamanho_amostra`
+    bytes. Levanta FormatoInvalido se o arquivo está vazio ou não é de nenhum tipo conhecido.
+    """
+    amostra = ler_amostra(arquivo, tamanho_amostra)
+    if not amostra.strip():
+        raise FormatoInvalido("arquivo vazio")
+
+    encoding = detectar_encoding(amostra)
+    texto = amostra.decode(encoding, errors='replace')
+    if len(amostra) == tamanho_amostra and '\n' in texto:
+        texto = texto[:texto.rfind('\n')]  # Descarta a última linha, possivelmente incompleta
+    delimitador, aspas = detectar_dialeto(texto)
+
+    cabecalho = next(csv.reader(io.StringIO(texto), delimiter=delimitador, quotechar=aspas), [])
+    colunas = [str(coluna).strip().lower() for coluna in cabecalho]
+    tipo = identificar_tipo(set(colunas))
+    if tipo is None:
+        raise FormatoInvalido(
+            f"colunas obrigatórias de Performance ou Financeiro não encontradas "
+            f"(delimitador {delimitador!r}, encoding {encoding})"
+        )
+    return FormatoArquivo(encoding, delimitador, aspas, colunas, tipo)
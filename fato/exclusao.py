@@ -0,0 +1,91 @@
+#fato/exclusao.py
+"""
+Exclusão de uma Origem sem carregar as linhas de fato na memória.
+
+O `on_delete=CASCADE` faz o Django coletar todas as linhas de Performance/Financeiro
+antes de apagar. Aqui as linhas são apagadas em lotes de ids da própria origem, cada
+lote na sua própria transação, e a origem (com o arquivo e o relatório de rejeições)
+só é removida quando não sobra nenhuma linha. A PerformanceDiaria e o SaldoRepasse das
+chaves de cada lote são recalculados na mesma transação do DELETE; o cubo (fato.cubo)
+e a conciliação (fato.conciliacao), no fim, para as datas que a origem tinha.
+"""
+import logging
+
+from django.db import transaction
+
+from .agregados import atualizar_performance_diaria, chaves_das_linhas
+from .conciliacao import conciliar_datas, datas_da_origem as datas_para_conciliar
+from .cubo import atualizar_cubo, datas_da_origem
+from .models import Financeiro, Performance
+from .saldos import atualizar_saldos, chaves_das_linhas as chaves_de_repasse
+
+logger = logging.getLogger(__name__)
+
+LOTE_EXCLUSAO = 5000  # Ids por DELETE
+
+MODELOS_DA_ORIGEM = [Performance, Financeiro]
+
+
+def linhas_da_origem(origem):
+    return sum(modelo.objects.filter(origem_doc=origem).count() for modelo in MODELOS_DA_ORIGEM)
+
+
+def excluir_linhas(modelo, origem, lote=LOTE_EXCLUSAO, progresso=None):
+    """
+    Apaga as linhas do modelo ligadas à origem em lotes de `lote` ids, na ordem dos ids.
+    `progresso(excluidas)` é chamado depois de cada lote. Retorna o total apagado.
+    """
+    linhas = modelo.objects.filter(origem_doc=origem)
+    ids = linhas.order_by('pk').values_list('pk', flat=True)
+
+    # Os lotes seguem os ids que a origem tem de fato: origens importadas aos poucos, intercaladas com
+    # outras, teriam milhares de faixas vazias entre o menor e o maior id
+    excluidas, ultimo = 0, None
+    while True:
+        pagina = list((ids if ultimo is None else ids.filter(pk__gt=ultimo))[:lote])
+        if not pagina:
+            return excluidas
+        ultimo = pagina[-1]
+        faixa = linhas.filter(pk__gte=pagina[0], pk__lte=ultimo)
+        with transaction.atomic():
+            chaves = chaves_das_linhas(faixa) if modelo is Performance else chaves_de_repasse(faixa)
+            # Sem sinais nem relações reversas, o delete() vira um único DELETE ... WHERE
+            apagadas, _ = faixa.delete()
+            if modelo is Performance:
+                atualizar_performance_diaria(chaves)
+            else:
+                atualizar_saldos(chaves)
+        excluidas += apagadas
+        if progresso:
+            progresso(excluidas)
+
+
+def excluir_origem(origem, lote=LOTE_EXCLUSAO, progresso=None):
+    """
+    Apaga as linhas de fato da origem em lotes e, no fim, a própria origem e os
+    arquivos dela. `progresso(excluidas)` recebe o total acumulado. Retorna o total apagado.
+    """
+    datas = datas_da_origem(origem)
+    datas_conciliadas = datas_para_conciliar(origem)
+    total = 0
+    for modelo in MODELOS_DA_ORIGEM:
+        anteriores = total
+        total += excluir_linhas(
+            modelo, origem, lote,
+            progresso=(lambda excluidas: progresso(anteriores + excluidas)) if progresso else None,
+        )
+
+    atualizar_cubo(datas)
+    conciliar_datas(datas_conciliadas)
+
+    # Os arquivos só saem do storage depois que o registro da origem foi removido
+    arquivos = [arquivo for arquivo in (origem.arquivo, origem.arquivo_rejeicoes) if arquivo]
+    origem_id = origem.pk
+    origem.blocos.all().delete()
+    origem.delete()
+    for arquivo in arquivos:
+        try:
+            arquivo.storage.delete(arquivo.name)
+        except OSError:
+            logger.warning(f"Não foi possível remover o arquivo {arquivo.name} da origem {origem_id}")
+    return total
@@ -0,0 +1,179 @@
+#fato/exportacao.py
+"""
+Exportação em CSV e XLSX sem montar o resultado inteiro na memória.
+
+As linhas saem do banco em lotes (queryset.iterator: cursor do lado do servidor no
+PostgreSQL) e vão direto para o destino:
+- CSV: StreamingHttpResponse; o cabeçalho é enviado antes mesmo da consulta rodar.
+- XLSX: openpyxl em modo write-only (cada linha vai para um arquivo temporário do
+  openpyxl, a memória não cresce com o número de linhas). O XLSX é um zip que só se
+  fecha no fim, então a planilha vai para um arquivo temporário e é enviada dele
+  com FileResponse.
+
+Colunas são tuplas (rótulo, campo) ou (rótulo, campos, formatar): `campos` é um nome
+aceito por values_list (inclusive com __) ou uma tupla deles, e `formatar` recebe os
+valores na mesma ordem.
+"""
+import csv
+import math
+import tempfile
+from datetime import datetime
+
+from django.contrib import admin
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+LOTE_EXPORTACAO = 2000  # Linhas buscadas do banco por vez
+TAMANHO_PEDACO = 64 * 1024  # Caracteres acumulados antes de enviar um pedaço do CSV
+DELIMITADOR_CSV = ';'  # Mesmo dos CSVs importados; o Excel em pt-BR abre direto
+
+FORMATOS = {
+    'csv': 'CSV',
+    'xlsx': 'Excel (XLSX)',
+}
+
+
+def colunas_do_modelo(modelo):
+    """Todos os campos concretos do modelo, com o verbose_name como rótulo."""
+    return [(str(campo.verbose_name), campo.attname) for campo in modelo._meta.concrete_fields]
+
+
+def normalizar_colunas(colunas):
+    """[(rótulo, (campos...), formatar ou None)]"""
+    normalizadas = []
+    for coluna in colunas:
+        rotulo, campos, *formatar = coluna
+        campos = (campos,) if isinstance(campos, str) else tuple(campos)
+        normalizadas.append((rotulo, campos, formatar[0] if formatar else None))
+    return normalizadas
+
+
+def cabecalho_das_colunas(colunas):
+    return [rotulo for rotulo, _campos, _formatar in normalizar_colunas(colunas)]
+
+
+def linhas_do_queryset(queryset, colunas, lote=LOTE_EXPORTACAO):
+    """Gera uma lista de valores por linha, buscando `lote` linhas do banco por vez."""
+    colunas = normalizar_colunas(colunas)
+    campos = []
+    for _rotulo, campos_da_coluna, _formatar in colunas:
+        campos.extend(campo for campo in campos_da_coluna if campo not in campos)
+    posicoes = [[campos.index(campo) for campo in campos_da_coluna] for _rotulo, campos_da_coluna, _formatar in colunas]
+
+    for valores in queryset.values_list(*campos).iterator(chunk_size=lote):
+        linha = []
+        for (_rotulo, _campos, formatar), indices in zip(colunas, posicoes):
+            if formatar:
+                linha.append(formatar(*(valores[indice] for indice in indices)))
+            else:
+                linha.append(valores[indices[0]])
+        yield linha
+
+
+class Eco:
+    """Pseudo-arquivo do csv.writer: devolve o texto em vez de guardar."""
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(cabecalho, linhas):
+    """Texto do CSV em pedaços de ~TAMANHO_PEDACO caracteres, com BOM para o Excel reconhecer o UTF-8."""
+    escritor = csv.writer(Eco(), delimiter=DELIMITADOR_CSV)
+    yield '\ufeff' + escritor.writerow(cabecalho)
+    pedaco, tamanho = [], 0
+    for linha in linhas:
+        texto = escritor.writerow(linha)
+        pedaco.append(texto)
+        tamanho += len(texto)
+        if tamanho >= TAMANHO_PEDACO:
+            yield ''.join(pedaco)
+            pedaco, tamanho = [], 0
+    if pedaco:
+        yield ''.join(pedaco)
+
+
+def resposta_csv(nome_arquivo, cabecalho, linhas):
+    resposta = StreamingHttpResponse(gerar_csv(cabecalho, linhas), content_type='text/csv; charset=utf-8')
+    resposta['Content-Disposition'] = f'attachment; filename="{nome_arquivo}"'
+    return resposta
+
+
+def valor_para_planilha(valor):
+    """O Excel não aceita datas com fuso nem NaN."""
+    if isinstance(valor, datetime) and timezone.is_aware(valor):
+        return timezone.make_naive(valor)
+    if isinstance(valor, float) and math.isnan(valor):
+        return None
+    return valor
+
+
+def escrever_xlsx(destino, abas):
+    """
+    Grava {aba: (cabecalho, linhas)} num .xlsx (caminho ou arquivo aberto) com o
+    openpyxl em modo write-only: as linhas são consumidas uma a uma.
+    """
+    livro = Workbook(write_only=True)
+    for nome, (cabecalho, linhas) in abas.items():
+        aba = livro.create_sheet(title=nome[:31])  # Limite de tamanho do nome da aba no Excel
+        aba.append(list(cabecalho))
+        for linha in linhas:
+            aba.append([valor_para_planilha(valor) for valor in linha])
+    livro.save(destino)
+
+
+def abas_de_dataframes(abas):
+    """{aba: DataFrame} no formato de escrever_xlsx, linha a linha."""
+    return {nome: (list(df.columns), df.itertuples(index=False, name=None)) for nome, df in abas.items()}
+
+
+def resposta_xlsx(nome_arquivo, abas):
+    arquivo = tempfile.TemporaryFile()
+    escrever_xlsx(arquivo, abas)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo, as_attachment=True, filename=nome_arquivo,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def resposta_de_exportacao(formato, nome, cabecalho, linhas):
+    """Resposta de download no `formato` ('csv' ou 'xlsx'); `nome` sem extensão."""
+    if formato == 'csv':
+        return resposta_csv(f"{nome}.csv", cabecalho, linhas)
+    if formato == 'xlsx':
+        return resposta_xlsx(f"{nome}.xlsx", {nome: (cabecalho, linhas)})
+    raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+
+class ExportacaoAdminMixin:
+    """
+    Ações "Exportar selecionados" (CSV e XLSX) no changelist, em streaming. Com
+    "selecionar todos", o queryset é o filtrado inteiro. `colunas_exportacao` define as
+    colunas (padrão: todos os campos do modelo).
+    """
+    colunas_exportacao = None
+
+    def get_colunas_exportacao(self, request):
+        return self.colunas_exportacao or colunas_do_modelo(self.model)
+
+    def get_actions(self, request):
+        acoes = super().get_actions(request)
+        if self.has_view_permission(request):
+            for nome in ('exportar_csv', 'exportar_xlsx'):
+                acoes[nome] = self.get_action(nome)
+        return acoes
+
+    def exportar(self, request, queryset, formato):
+        colunas = self.get_colunas_exportacao(request)
+        nome = f"{self.model._meta.model_name}_{timezone.localdate():%Y-%m-%d}"
+        return resposta_de_exportacao(formato, nome, cabecalho_das_colunas(colunas), linhas_do_queryset(queryset, colunas))
+
+    @admin.action(description="Exportar selecionados (CSV)")
+    def exportar_csv(self, request, queryset):
+        return self.exportar(request, queryset, 'csv')
+
+    @admin.action(description="Exportar selecionados (Excel)")
+    def exportar_xlsx(self, request, queryset):
+        return self.exportar(request, queryset, 'xlsx')
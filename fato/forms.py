@@ -3,9 +3,21 @@
 from django import forms
 from django.forms.widgets import FileInput, Select
 
-# Classe para permitir o upload de múltiplos arquivos (não será mais usada)
+# Classe para permitir o upload de múltiplos arquivos
 class MultiFileInput(FileInput):
-    allow_multiple_selected = True  # Permite selecionar múltiplos arquivos, mas não será necessário agora
+    allow_multiple_selected = True  # Permite selecionar vários arquivos de uma vez (ex.: uma semana de diários)
+
+
+class MultiFileField(forms.FileField):
+    """FileField que aceita vários arquivos; cleaned_data traz sempre uma lista."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('widget', MultiFileInput())
+        super().__init__(*args, **kwargs)
+
+    def clean(self, data, initial=None):
+        arquivos = data if isinstance(data, (list, tuple)) else [data]
+        return [super(MultiFileField, self).clean(arquivo, initial) for arquivo in arquivos]
 
 # Opções de filial para o campo 'filial'
 FILIAL_CHOICE = [
@@ -21,8 +33,7 @@ def validate_file_extension(value):
         raise forms.ValidationError('Apenas arquivos CSV são permitidos.')
 
 class ImportacaoForm(forms.Form):
-    arquivos = forms.FileField(
-        widget=FileInput(),
+    arquivos = MultiFileField(
         required=True,
         validators=[validate_file_extension]
     )
@@ -32,3 +43,26 @@ class ImportacaoForm(forms.Form):
         required=True,
         widget=Select(attrs={'class': 'select2 form-control'})  # Para estilizar o select com select2
     )
+
+    # 'atualizar' corrige linhas já importadas pela chave natural em vez de duplicá-las
+    modo = forms.ChoiceField(
+        choices=[
+            ('inserir', 'Inserir linhas (arquivo novo)'),
+            ('atualizar', 'Atualizar linhas existentes (arquivo revisado)'),
+        ],
+        initial='inserir',
+        required=False,
+        widget=Select(attrs={'class': 'form-control'}),
+    )
+
+    # Arquivo reenviado com linhas adicionadas: importa só os blocos que a versão anterior não tinha
+    apenas_blocos_novos = forms.BooleanField(
+        required=False,
+        label='Importar apenas as linhas novas de um arquivo já importado',
+    )
+
+    # Roda todas as conversões e regras do arquivo e mostra os erros por coluna, sem gravar nada
+    somente_validar = forms.BooleanField(
+        required=False,
+        label='Somente validar (não importa nada)',
+    )
@@ -0,0 +1,568 @@
+#fato/importacao.py
+"""
+Motor de importação dos CSVs de fato (Performance e Financeiro).
+
+O arquivo é lido em blocos de tamanho fixo, cada coluna é convertida de uma vez
+(ver fato.conversores) e o bloco vai direto para o bulk_create (ou para a carga
+direta do fato.carga). Assim o uso de memória depende do tamanho do bloco e não
+do tamanho do arquivo.
+"""
+import csv
+import hashlib
+import io
+import logging
+import os
+from contextlib import nullcontext
+from itertools import repeat
+
+import pandas as pd
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .agregados import atualizar_performance_diaria, chaves_do_bloco
+from .carga import carga_direta_habilitada, carregar_bloco, sessao_de_carga, suporta_carga_direta
+from .conversores import (
+    MOTIVOS, converter_centavos, converter_centavos_inteiros, converter_datas, converter_datas_opcionais,
+    converter_decimais, converter_decimais_opcionais, converter_duracoes, converter_inteiros,
+)
+from .leitura import abrir_mapa, ler_faixa, pode_mapear
+from .models import Performance, Financeiro, Origem, BlocoOrigem
+from .saldos import atualizar_saldos, chaves_do_bloco as chaves_de_repasse
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_CHUNK = 5000  # Linhas lidas do CSV por vez
+BATCH_SIZE = 1000  # Linhas por INSERT no bulk_create
+
+# Colunas que precisam de conversão; o restante é gravado como texto
+CONVERSOES = {
+    Performance: {
+        'data_do_periodo': converter_datas,
+        'duracao_do_periodo': converter_duracoes,
+        'numero_minimo_de_entregadores_regulares_na_escala': converter_inteiros,
+        'tempo_disponivel_escalado': converter_decimais,
+        'tempo_disponivel_absoluto': converter_duracoes,
+        'numero_de_corridas_ofertadas': converter_inteiros,
+        'numero_de_corridas_aceitas': converter_inteiros,
+        'numero_de_corridas_rejeitadas': converter_inteiros,
+        'numero_de_corridas_completadas': converter_inteiros,
+        'numero_de_corridas_canceladas_pela_pessoa_entregadora': converter_inteiros,
+        'numero_de_pedidos_aceitos_e_concluidos': converter_inteiros,
+        'soma_das_taxas_das_corridas_aceitas': converter_centavos_inteiros,
+    },
+    Financeiro: {
+        'data_do_lancamento_financeiro': converter_datas_opcionais,
+        'data_do_periodo_de_referencia': converter_datas_opcionais,
+        'data_do_repasse': converter_datas_opcionais,
+        'valor': converter_centavos,
+        'percentual_de_tempo_disponivel': converter_decimais_opcionais,
+        'percentual_de_aceitacao': converter_decimais_opcionais,
+        'percentual_de_conclusao': converter_decimais_opcionais,
+    },
+}
+
+
+# Conjunto mínimo de colunas obrigatórias para cada modelo
+OBRIGATORIOS_FINANCEIRO = {"data_do_lancamento_financeiro", "valor", "periodo"}
+OBRIGATORIOS_PERFORMANCE = {"data_do_periodo", "periodo", "id_da_pessoa_entregadora"}
+
+MODELOS = {
+    'performance': Performance,
+    'financeiro': Financeiro,
+}
+
+# Chave natural de cada linha (com a `sequencia`, é única no banco; ver os constraints dos modelos)
+CHAVES_NATURAIS = {
+    Performance: ['data_do_periodo', 'periodo', 'id_da_pessoa_entregadora', 'sub_praca'],
+    Financeiro: ['data_do_periodo_de_referencia', 'periodo', 'id_da_pessoa_entregadora', 'subpraca', 'tipo', 'descricao'],
+}
+
+# Modos de gravação: 'inserir' só acrescenta linhas; 'atualizar' faz upsert pela chave natural
+MODO_INSERIR = 'inserir'
+MODO_ATUALIZAR = 'atualizar'
+
+LOTE_CONSULTA = 500  # Entregadores por consulta ao buscar as linhas já existentes
+
+MOTIVO_JA_IMPORTADA = "linha já importada por outro arquivo (para corrigi-la, reenvie no modo 'atualizar')"
+
+# Bytes que o encoding detectado no começo do arquivo não decodifica viram este caractere na leitura
+CARACTERE_INVALIDO = '\ufffd'
+MOTIVO_ENCODING = "caractere inválido no encoding do arquivo (salve o CSV em UTF-8)"
+
+
+CABECALHO_REJEICOES = ['linha', 'coluna', 'motivo', 'valor']
+
+
+class ResultadoImportacao:
+    """
+    Contadores de uma importação e as linhas rejeitadas. As rejeições vão para um CSV
+    em memória (`rejeicoes`, uma linha por coluna inválida) e são contadas por motivo
+    em `erros_por_tipo`; ver salvar_rejeicoes.
+    """
+
+    def __init__(self):
+        self.linhas_lidas = 0
+        self.linhas_importadas = 0
+        self.linhas_com_erro = 0
+        self.linhas_ignoradas = 0  # Já importadas (versão anterior do arquivo ou linha sem alteração)
+        self.linhas_atualizadas = 0  # Linhas existentes alteradas no modo 'atualizar'
+        self.erros_por_tipo = {}  # motivo -> quantidade
+        self.rejeicoes = io.StringIO()
+
+    def rejeitar(self, linhas, coluna, motivo, valores):
+        """Registra de uma vez todas as linhas do bloco rejeitadas pela mesma coluna."""
+        if not len(linhas):
+            return
+        self.erros_por_tipo[motivo] = self.erros_por_tipo.get(motivo, 0) + len(linhas)
+        escritor = csv.writer(self.rejeicoes, delimiter=';')
+        if not self.rejeicoes.tell():
+            escritor.writerow(CABECALHO_REJEICOES)
+        escritor.writerows(zip(linhas, repeat(coluna), repeat(motivo), valores))
+
+    def incorporar(self, outro, linhas_antes):
+        """
+        Soma o resultado de uma faixa do arquivo lida à parte (ver utils.importar_arquivo_dividido).
+        As linhas das rejeições de `outro` são renumeradas com as `linhas_antes` dela.
+        """
+        self.linhas_lidas += outro.linhas_lidas
+        self.linhas_importadas += outro.linhas_importadas
+        self.linhas_ignoradas += outro.linhas_ignoradas
+        self.linhas_atualizadas += outro.linhas_atualizadas
+        self.linhas_com_erro = self.linhas_lidas - self.linhas_importadas - self.linhas_ignoradas
+        for motivo, quantidade in outro.erros_por_tipo.items():
+            self.erros_por_tipo[motivo] = self.erros_por_tipo.get(motivo, 0) + quantidade
+
+        rejeicoes = csv.reader(io.StringIO(outro.rejeicoes.getvalue()), delimiter=';')
+        if next(rejeicoes, None) is None:
+            return
+        escritor = csv.writer(self.rejeicoes, delimiter=';')
+        if not self.rejeicoes.tell():
+            escritor.writerow(CABECALHO_REJEICOES)
+        escritor.writerows([int(linha) + linhas_antes, *resto] for linha, *resto in rejeicoes)
+
+
+def resumo_dos_erros(erros_por_tipo):
+    """'data inválida: 3, valor monetário inválido: 1', do motivo mais frequente para o menos."""
+    return ', '.join(
+        f"{motivo}: {quantidade}"
+        for motivo, quantidade in sorted(erros_por_tipo.items(), key=lambda item: -item[1])
+    )
+
+
+def salvar_rejeicoes(origem, resultado):
+    """
+    Grava o relatório de rejeições ao lado de Origem.arquivo (<nome>_rejeicoes.csv) e os
+    totais por motivo em Origem.erros_por_tipo. Não chama origem.save().
+    """
+    origem.erros_por_tipo = resultado.erros_por_tipo
+    if not resultado.erros_por_tipo:
+        return
+    nome = os.path.splitext(os.path.basename(origem.arquivo.name or origem.nome))[0]
+    conteudo = resultado.rejeicoes.getvalue().encode('utf-8-sig')
+    origem.arquivo_rejeicoes.save(f"{nome}_rejeicoes.csv", ContentFile(conteudo), save=False)
+
+
+def campos_do_modelo(modelo):
+    """Campos preenchidos a partir do CSV (tudo menos a PK e a FK da origem)."""
+    return [
+        field.name for field in modelo._meta.concrete_fields
+        if not field.primary_key and field.name != 'origem_doc'
+    ]
+
+
+def calcular_sha256(arquivo):
+    """SHA-256 do conteúdo lido em pedaços, sem carregar o arquivo inteiro na memória."""
+    sha256 = hashlib.sha256()
+    arquivo.seek(0)
+    if hasattr(arquivo, 'chunks'):
+        for pedaco in arquivo.chunks():
+            sha256.update(pedaco)
+    else:
+        for pedaco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            sha256.update(pedaco)
+    arquivo.seek(0)
+    return sha256.hexdigest()
+
+
+def hash_do_bloco(hashes_das_linhas):
+    """Impressão digital de um bloco a partir dos hashes (uint64) de cada linha."""
+    return hashlib.sha256(hashes_das_linhas.tobytes()).hexdigest()
+
+
+def blocos_anteriores(origem, chunksize=TAMANHO_CHUNK):
+    """
+    Blocos da versão anterior do mesmo arquivo (mesmo nome, filial e tipo), no formato
+    {indice: (linhas, hash)}. Vazio se o arquivo nunca foi importado.
+    """
+    anterior = (
+        Origem.objects.filter(nome=origem.nome, filial=origem.filial, tipo=origem.tipo)
+        .exclude(pk=origem.pk).order_by('-timestamp').first()
+    )
+    if anterior is None:
+        return {}
+    blocos = anterior.blocos.filter(tamanho_chunk=chunksize).values_list('indice', 'linhas', 'hash_sha256')
+    return {indice: (linhas, hash_sha256) for indice, linhas, hash_sha256 in blocos}
+
+
+def linhas_ja_importadas(hashes_das_linhas, bloco_anterior):
+    """
+    Quantas linhas do início do bloco já foram importadas pela versão anterior:
+    o bloco inteiro, só o começo (o bloco anterior era o último e estava incompleto) ou nenhuma.
+    """
+    if bloco_anterior is None:
+        return 0
+    linhas, hash_anterior = bloco_anterior
+    if linhas <= len(hashes_das_linhas) and hash_do_bloco(hashes_das_linhas[:linhas]) == hash_anterior:
+        return linhas
+    return 0
+
+
+def identificar_tipo(colunas):
+    """'performance', 'financeiro' ou None, de acordo com as colunas obrigatórias presentes."""
+    if OBRIGATORIOS_PERFORMANCE.issubset(colunas):
+        return 'performance'
+    if OBRIGATORIOS_FINANCEIRO.issubset(colunas):
+        return 'financeiro'
+    return None
+
+
+def normalizar_colunas(df):
+    """Remove espaços e coloca os cabeçalhos em minúsculas."""
+    df.columns = [str(col).strip().lower() for col in df.columns]
+    return df
+
+
+def chaves_das_linhas(modelo, df):
+    """Hash (uint64) da chave natural de cada linha do CSV, com os textos sem espaços nas pontas."""
+    chaves = df.reindex(columns=CHAVES_NATURAIS[modelo], fill_value='').apply(lambda coluna: coluna.str.strip())
+    return pd.util.hash_pandas_object(chaves, index=False)
+
+
+def numerar_sequencia(chaves, contagem):
+    """
+    Numera as ocorrências repetidas da chave natural dentro do arquivo (0, 1, 2...).
+    `contagem` guarda quantas vezes cada chave (ver chaves_das_linhas) já apareceu nos blocos anteriores.
+    """
+    sequencia = chaves.groupby(chaves, sort=False).cumcount()
+    if contagem:
+        sequencia = sequencia + chaves.map(contagem).fillna(0).astype('int64')
+    for chave, quantidade in chaves.value_counts(sort=False).items():
+        contagem[chave] = contagem.get(chave, 0) + quantidade
+    return sequencia
+
+
+def mal_decodificados(df):
+    """
+    Pares (coluna, máscara) das colunas com caracteres que não puderam ser decodificados.
+    O encoding é detectado só pelo começo do arquivo; os bytes de outro encoding que
+    aparecem depois são trocados por CARACTERE_INVALIDO na leitura em vez de interrompê-la.
+    """
+    for coluna in df.columns:
+        texto = df[coluna]
+        # Confere o bloco inteiro de uma vez; a máscara só é montada quando há algum caractere inválido
+        if pd.api.types.is_string_dtype(texto) and CARACTERE_INVALIDO in texto.str.cat():
+            yield coluna, texto.str.contains(CARACTERE_INVALIDO, regex=False).to_numpy()
+
+
+def preparar_chunk(modelo, df, resultado, primeira_linha):
+    """
+    Converte um bloco do CSV para os tipos do modelo, coluna por coluna.
+    Linhas inválidas são registradas no resultado e removidas do bloco.
+    """
+    # Colunas ausentes no arquivo entram vazias, colunas extras são ignoradas
+    df = df.reindex(columns=campos_do_modelo(modelo), fill_value='')
+
+    # Número da linha no arquivo (cabeçalho é a linha 1)
+    linhas = pd.RangeIndex(primeira_linha, primeira_linha + len(df))
+    rejeitadas = pd.Series(False, index=df.index)
+
+    for coluna, invalidos in mal_decodificados(df):
+        resultado.rejeitar(linhas[invalidos], coluna, MOTIVO_ENCODING, df[coluna][invalidos])
+        rejeitadas |= invalidos
+
+    for coluna, conversor in CONVERSOES[modelo].items():
+        texto = df[coluna]
+        df[coluna], invalidos = conversor(texto)
+        invalidos = invalidos.to_numpy()
+        resultado.rejeitar(linhas[invalidos], coluna, MOTIVOS[conversor], texto[invalidos])
+        rejeitadas |= invalidos
+
+    return df[~rejeitadas]
+
+
+def inserir_chunk(modelo, df, origem, batch_size=BATCH_SIZE):
+    """Monta os objetos a partir das tuplas do bloco e grava com bulk_create."""
+    campos = list(df.columns)
+    objetos = [
+        modelo(origem_doc=origem, **dict(zip(campos, valores)))
+        for valores in df.itertuples(index=False, name=None)
+    ]
+    modelo.objects.bulk_create(objetos, batch_size=batch_size)
+    return len(objetos)
+
+
+def ler_em_chunks(arquivo, formato, chunksize=TAMANHO_CHUNK):
+    """
+    Lê o CSV como texto puro em blocos, com o encoding, delimitador e aspas do
+    `formato` (ver fato.deteccao); a conversão de tipos fica com o preparar_chunk.
+    """
+    if hasattr(arquivo, 'seek'):
+        arquivo.seek(0)
+
+    # Arquivo em disco: lê pelo mmap, com memória constante (ver fato.leitura)
+    if pode_mapear(arquivo, formato):
+        with abrir_mapa(arquivo) as mapa:
+            for df in ler_faixa(mapa, 0, len(mapa), formato, chunksize):
+                yield normalizar_colunas(df)
+        return
+
+    leitor = pd.read_csv(
+        arquivo,
+        **formato.opcoes_read_csv(),
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunksize,
+    )
+    for df in leitor:
+        yield normalizar_colunas(df)
+
+
+def preparar_dataframes(dfs, modelo, resultado, chunksize=TAMANHO_CHUNK, anteriores=None, contagem=None):
+    """
+    Converte os blocos de texto `dfs` (na ordem do arquivo). Gera trios (BlocoOrigem
+    ainda sem origem, DataFrame com as linhas válidas, chaves das linhas válidas).
+
+    `anteriores` são os blocos da versão anterior do arquivo (ver blocos_anteriores);
+    as linhas que ela já importou são contadas como ignoradas e não aparecem no DataFrame.
+    `contagem` acumula as ocorrências de cada chave natural (ver numerar_sequencia).
+    O índice dos DataFrames é o número da linha no arquivo.
+    """
+    anteriores = anteriores or {}
+    contagem = {} if contagem is None else contagem
+    primeira_linha = 2
+
+    for indice, df in enumerate(dfs):
+        resultado.linhas_lidas += len(df)
+        df.index = pd.RangeIndex(primeira_linha, primeira_linha + len(df))  # Número da linha no arquivo
+        hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        bloco = BlocoOrigem(indice=indice, linhas=len(df), tamanho_chunk=chunksize, hash_sha256=hash_do_bloco(hashes))
+        chaves = chaves_das_linhas(modelo, df)
+        df['sequencia'] = numerar_sequencia(chaves, contagem)
+
+        ignoradas = linhas_ja_importadas(hashes, anteriores.get(indice))
+        resultado.linhas_ignoradas += ignoradas
+        validos = preparar_chunk(modelo, df.iloc[ignoradas:], resultado, primeira_linha + ignoradas)
+
+        primeira_linha += len(df)
+        yield bloco, validos, chaves.loc[validos.index]
+
+
+def preparar_blocos(arquivo, modelo, formato, resultado, chunksize=TAMANHO_CHUNK, anteriores=None):
+    """
+    Lê e converte o arquivo bloco a bloco, sem gravar nada. Gera pares
+    (BlocoOrigem ainda sem origem, DataFrame com as linhas válidas); ver preparar_dataframes.
+    """
+    dfs = ler_em_chunks(arquivo, formato, chunksize)
+    for bloco, validos, _chaves in preparar_dataframes(dfs, modelo, resultado, chunksize, anteriores):
+        yield bloco, validos
+
+
+def buscar_existentes(modelo, df):
+    """Linhas do banco com a mesma chave natural das linhas do bloco (consultas por lote de entregadores)."""
+    chaves = CHAVES_NATURAIS[modelo] + ['sequencia']
+    campos = ['id'] + campos_do_modelo(modelo)
+    primeira_chave = chaves[0]
+    entregadores = df['id_da_pessoa_entregadora'].unique().tolist()
+
+    datas = Q(**{f'{primeira_chave}__in': df[primeira_chave].dropna().unique().tolist()})
+    if df[primeira_chave].isna().any():
+        # Data vazia é NULL no banco, que o __in não encontra
+        datas |= Q(**{f'{primeira_chave}__isnull': True})
+
+    partes = []
+    for inicio in range(0, len(entregadores), LOTE_CONSULTA):
+        consulta = modelo.objects.filter(
+            datas, id_da_pessoa_entregadora__in=entregadores[inicio:inicio + LOTE_CONSULTA],
+        ).values_list(*campos)
+        partes.append(pd.DataFrame.from_records(list(consulta), columns=campos))
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=campos)
+
+
+def separar_alterados(modelo, df):
+    """
+    Compara o bloco com o que já está no banco pela chave natural (datas vazias são
+    iguais entre si, como no merge do pandas). Retorna (linhas novas, linhas alteradas
+    com o `id` da linha existente, quantidade sem alteração).
+    """
+    chaves = CHAVES_NATURAIS[modelo] + ['sequencia']
+    existentes = buscar_existentes(modelo, df)
+    if existentes.empty:
+        return df, df.iloc[:0].assign(id=0), 0
+
+    mesclado = df.merge(existentes, on=chaves, how='left', suffixes=('', '__antigo'), indicator=True)
+    existe = (mesclado['_merge'] == 'both').to_numpy()
+
+    diferente = pd.Series(False, index=mesclado.index)
+    for coluna in df.columns:
+        if coluna in chaves:
+            continue
+        novo, antigo = mesclado[coluna], mesclado[f'{coluna}__antigo']
+        if modelo._meta.get_field(coluna).get_internal_type() == 'DecimalField':
+            # Decimal do banco x float do bloco
+            novo, antigo = pd.to_numeric(novo, errors='coerce'), pd.to_numeric(antigo, errors='coerce')
+        iguais = (novo == antigo) | (novo.isna() & antigo.isna())
+        diferente |= ~iguais.fillna(False).astype(bool)
+    diferente = diferente.to_numpy()
+
+    alterado = existe & diferente
+    alterados = df[alterado].assign(id=mesclado['id'].to_numpy()[alterado].astype('int64'))
+    return df[~existe], alterados, int((existe & ~diferente).sum())
+
+
+def atualizar_chunk(modelo, df, origem, resultado, batch_size=BATCH_SIZE):
+    """
+    Upsert do bloco pela chave natural: insere as linhas novas e atualiza só as que mudaram.
+    As alteradas são regravadas pelo id da linha existente (INSERT ... ON CONFLICT(id) DO
+    UPDATE), porque o índice único não compara as chaves do Financeiro com a data de
+    referência vazia. As linhas atualizadas passam para a nova origem.
+    """
+    novos, alterados, sem_alteracao = separar_alterados(modelo, df)
+    inserir_chunk(modelo, novos, origem, batch_size)
+    campos = list(alterados.columns)
+    objetos = [
+        modelo(origem_doc=origem, **dict(zip(campos, valores)))
+        for valores in alterados.itertuples(index=False, name=None)
+    ]
+    modelo.objects.bulk_create(
+        objetos,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=[campo for campo in campos if campo != 'id'] + ['origem_doc'],
+    )
+    resultado.linhas_atualizadas += len(objetos)
+    resultado.linhas_ignoradas += sem_alteracao
+    return len(novos) + len(objetos)
+
+
+def rejeitar_ja_importadas(modelo, df, resultado):
+    """
+    Modo 'inserir': tira do bloco as linhas cuja chave natural já está no banco (ex.: um
+    arquivo revisado enviado como novo) e as registra como rejeitadas. Retorna o resto.
+    """
+    chaves = CHAVES_NATURAIS[modelo] + ['sequencia']
+    existentes = buscar_existentes(modelo, df)[chaves]
+    if existentes.empty:
+        return df
+    mesclado = df[chaves].merge(existentes, on=chaves, how='left', indicator=True)
+    repetidas = (mesclado['_merge'] == 'both').to_numpy()
+    if repetidas.any():
+        valores = df.loc[repetidas, CHAVES_NATURAIS[modelo]].fillna('').astype(str).agg(' / '.join, axis=1)
+        resultado.rejeitar(df.index[repetidas], 'chave natural', MOTIVO_JA_IMPORTADA, valores)
+    return df[~repetidas]
+
+
+def inserir_bloco(modelo, df, origem, resultado, batch_size=BATCH_SIZE, carga_direta=False):
+    """
+    Modo 'inserir': grava o bloco e retorna as linhas gravadas. Se o INSERT esbarrar na
+    chave natural, as linhas já importadas vão para o relatório de rejeições e o resto é
+    gravado; o banco só é consultado quando isso acontece.
+    """
+    def inserir(linhas):
+        if carga_direta and suporta_carga_direta():
+            return carregar_bloco(modelo, linhas, origem)
+        return inserir_chunk(modelo, linhas, origem, batch_size)
+
+    try:
+        with transaction.atomic():
+            resultado.linhas_importadas += inserir(df)
+        return df
+    except IntegrityError:
+        df = rejeitar_ja_importadas(modelo, df, resultado)
+        resultado.linhas_importadas += inserir(df)
+        return df
+
+
+def gravar_bloco(modelo, origem, bloco, validos, resultado, batch_size=BATCH_SIZE, modo=MODO_INSERIR,
+                 carga_direta=None):
+    """
+    Grava as linhas válidas de um bloco e a impressão digital dele, na mesma transação
+    (junto com a PerformanceDiaria ou o SaldoRepasse das chaves tocadas).
+    Com `carga_direta` (padrão: settings.IMPORTACAO_CARGA_DIRETA), as inserções vão
+    pelo fato.carga em vez do bulk_create.
+    """
+    if carga_direta is None:
+        carga_direta = carga_direta_habilitada()
+    importadas, atualizadas = resultado.linhas_importadas, resultado.linhas_atualizadas
+    with transaction.atomic():
+        if modo == MODO_ATUALIZAR:
+            resultado.linhas_importadas += atualizar_chunk(modelo, validos, origem, resultado, batch_size)
+        else:
+            validos = inserir_bloco(modelo, validos, origem, resultado, batch_size, carga_direta)
+        if modelo is Performance:
+            atualizar_performance_diaria(chaves_do_bloco(validos))
+        elif modelo is Financeiro:
+            # No upsert a linha pode ter saído de outra data de repasse: refaz o extrato inteiro
+            atualizar_saldos(chaves_de_repasse(validos, desde_o_inicio=modo == MODO_ATUALIZAR))
+        bloco.origem = origem
+        bloco.linhas_importadas = resultado.linhas_importadas - importadas
+        bloco.linhas_atualizadas = resultado.linhas_atualizadas - atualizadas
+        bloco.save()
+    resultado.linhas_com_erro = resultado.linhas_lidas - resultado.linhas_importadas - resultado.linhas_ignoradas
+
+
+def retomar_bloco(gravado, bloco, validos, resultado):
+    """
+    Soma ao resultado um bloco que a origem já gravou antes de ser interrompida. As
+    linhas válidas que ele não gravou ficaram sem alteração (modo 'atualizar').
+    """
+    if (gravado.linhas, gravado.hash_sha256) != (bloco.linhas, bloco.hash_sha256):
+        raise ValueError(f"O bloco {bloco.indice} do arquivo não é o mesmo que já foi gravado; reenvie o arquivo.")
+    resultado.linhas_importadas += gravado.linhas_importadas
+    resultado.linhas_atualizadas += gravado.linhas_atualizadas
+    resultado.linhas_ignoradas += len(validos) - gravado.linhas_importadas
+    resultado.linhas_com_erro = resultado.linhas_lidas - resultado.linhas_importadas - resultado.linhas_ignoradas
+
+
+def importar_arquivo(arquivo, modelo, origem, formato, chunksize=TAMANHO_CHUNK, batch_size=BATCH_SIZE,
+                     progresso=None, apenas_blocos_novos=False, modo=MODO_INSERIR, carga_direta=None):
+    """
+    Importa o arquivo inteiro para o modelo, bloco a bloco, lido conforme o `formato`
+    detectado por fato.deteccao.detectar_formato.
+
+    Cada bloco é gravado na sua própria transação para que o progresso fique visível
+    durante a importação; quem precisar do arquivo inteiro numa transação só deve
+    envolver a chamada em transaction.atomic(). Se `progresso` for informado, é
+    chamado com o ResultadoImportacao parcial depois de cada bloco.
+
+    Blocos que a própria origem já gravou (importação interrompida e retomada) não são
+    gravados de novo: entram no resultado com os contadores guardados no BlocoOrigem.
+
+    Com `apenas_blocos_novos`, as linhas que a versão anterior do mesmo arquivo já
+    importou (comparadas pela impressão digital de cada bloco) são ignoradas.
+
+    No modo 'atualizar', linhas cuja chave natural já existe são atualizadas (se mudaram)
+    em vez de duplicadas; no modo 'inserir', linhas com a chave natural já importada são
+    rejeitadas (ver rejeitar_ja_importadas).
+    """
+    resultado = ResultadoImportacao()
+    anteriores = blocos_anteriores(origem, chunksize) if apenas_blocos_novos else None
+    gravados = {bloco.indice: bloco for bloco in origem.blocos.filter(tamanho_chunk=chunksize)}
+    if carga_direta is None:
+        carga_direta = carga_direta_habilitada()
+
+    with sessao_de_carga() if carga_direta else nullcontext():
+        for bloco, validos in preparar_blocos(arquivo, modelo, formato, resultado, chunksize, anteriores):
+            if bloco.indice in gravados:
+                retomar_bloco(gravados[bloco.indice], bloco, validos, resultado)
+            else:
+                gravar_bloco(modelo, origem, bloco, validos, resultado, batch_size, modo, carga_direta)
+            if progresso:
+                progresso(resultado)
+
+    logger.info(
+        f"{origem}: {resultado.linhas_importadas} linhas gravadas ({resultado.linhas_atualizadas} atualizadas), "
+        f"{resultado.linhas_com_erro} com erro, {resultado.linhas_ignoradas} já importadas anteriormente."
+    )
+    return resultado
@@ -0,0 +1,251 @@
+#fato/jobs.py
+"""
+Execução das importações em segundo plano.
+
+A view só salva o arquivo (Origem.arquivo), cria o Processamento e coloca o id na
+fila; um pool de threads faz a leitura e a gravação. Processamentos que ficaram
+pendentes (ex.: servidor reiniciado) são retomados pelo comando
+`manage.py processar_importacoes`.
+
+A exclusão de uma origem segue o mesmo caminho: uma Exclusao é criada e o pool apaga
+as linhas de fato em lotes (ver fato.exclusao); pendências são retomadas pelo comando
+`manage.py excluir_origens --pendentes`.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .cache import registrar_intervalo
+from .colunar import arquivar_origem
+from .conciliacao import conciliar_origem
+from .cubo import atualizar_cubo_da_origem
+from .deteccao import detectar_formato
+from .exclusao import LOTE_EXCLUSAO, excluir_origem, linhas_da_origem
+from .importacao import MODELOS, MODO_ATUALIZAR, importar_arquivo, resumo_dos_erros, salvar_rejeicoes
+from .models import Exclusao, Processamento
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMPORTACAO_WORKERS', 2),
+    thread_name_prefix='importacao',
+)
+
+
+def submeter(funcao, *args):
+    """Executa a função no pool, com conexões de banco próprias da thread."""
+    def executar():
+        close_old_connections()
+        try:
+            funcao(*args)
+        except Exception:
+            logger.exception(f"Erro no processamento em segundo plano {funcao.__name__}{args}")
+        finally:
+            close_old_connections()
+
+    return executor.submit(executar)
+
+
+def enfileirar(processamento):
+    """Coloca o processamento na fila assim que a transação atual for confirmada."""
+    transaction.on_commit(lambda: submeter(executar_processamento, processamento.pk))
+
+
+def executar_processamento(processamento_id):
+    """
+    Importa o arquivo da origem do processamento, atualizando o progresso a cada bloco.
+
+    Cada bloco é confirmado na sua transação, nos dois modos. No modo 'atualizar' o
+    upsert passa para a origem nova linhas de importações anteriores, então uma falha
+    no meio não exclui a origem (isso apagaria essas linhas): os blocos gravados ficam,
+    o processamento termina com erro e `manage.py processar_importacoes --retomar` o
+    executa de novo a partir do primeiro bloco não gravado (ver importacao.retomar_bloco).
+    """
+    # Marca como "processando" de forma atômica para que dois workers não peguem o mesmo
+    reservado = Processamento.objects.filter(pk=processamento_id, status='pendente').update(
+        status='processando', iniciado_em=timezone.now()
+    )
+    if not reservado:
+        return
+
+    processamento = Processamento.objects.select_related('origem').get(pk=processamento_id)
+    origem = processamento.origem
+
+    def progresso(resultado):
+        Processamento.objects.filter(pk=processamento_id).update(
+            linhas_lidas=resultado.linhas_lidas,
+            linhas_importadas=resultado.linhas_importadas,
+            linhas_com_erro=resultado.linhas_com_erro,
+            linhas_ignoradas=resultado.linhas_ignoradas,
+            linhas_atualizadas=resultado.linhas_atualizadas,
+        )
+
+    try:
+        if origem is None:
+            raise ValueError("Origem do processamento não existe mais.")
+
+        with origem.arquivo.open('rb') as arquivo:
+            formato = detectar_formato(arquivo)
+            resultado = importar_arquivo(
+                arquivo, MODELOS[origem.tipo], origem, formato,
+                progresso=progresso, apenas_blocos_novos=processamento.apenas_blocos_novos,
+                modo=processamento.modo,
+            )
+    except Exception as e:
+        logger.exception(f"Erro ao processar o arquivo {processamento.nome_arquivo}")
+        mensagem = f"Erro ao processar o arquivo {processamento.nome_arquivo}: {descrever_erro(e)}"
+        if origem is not None and processamento.modo == MODO_ATUALIZAR and origem.blocos.exists():
+            mensagem += interromper_origem(origem)
+        elif origem is not None:
+            # Remove também o que já tinha sido gravado, em lotes
+            excluir_origem(origem)
+        finalizar(processamento_id, 'erro', mensagem)
+        return
+
+    # Só o resumo vai para a mensagem; as linhas rejeitadas ficam no relatório da origem
+    erros = []
+    if resultado.erros_por_tipo:
+        erros.append(f"{resultado.linhas_com_erro} linhas rejeitadas - {resumo_dos_erros(resultado.erros_por_tipo)}.")
+
+    if not resultado.linhas_importadas:
+        descartar_origem(origem, resultado)
+        if resultado.linhas_ignoradas:
+            finalizar(processamento_id, 'concluido',
+                      "\n".join(["Nenhuma linha nova ou alterada no arquivo."] + erros), resultado)
+        else:
+            finalizar(processamento_id, 'erro', "\n".join(["Nenhuma linha válida no arquivo."] + erros), resultado)
+        return
+
+    origem.linhas_importadas = resultado.linhas_importadas
+    origem.linhas_com_erro = resultado.linhas_com_erro
+    salvar_rejeicoes(origem, resultado)
+    # Cubo e intervalo antes do save: é a origem concluída que muda a versão dos relatórios em cache
+    atualizar_cubo_da_origem(origem)
+    registrar_intervalo(origem)
+    origem.save()
+    conciliar_origem(origem)
+    arquivar_origem(origem)
+    finalizar(processamento_id, 'concluido', "\n".join(erros), resultado)
+
+
+def interromper_origem(origem):
+    """
+    Origem do modo 'atualizar' que falhou depois de gravar alguns blocos: fica com as
+    linhas já confirmadas, e o cubo e o intervalo passam a contá-las. Retorna o
+    complemento da mensagem do processamento.
+    """
+    gravadas = origem.blocos.aggregate(total=Sum('linhas_importadas'))['total'] or 0
+    origem.linhas_importadas = gravadas
+    atualizar_cubo_da_origem(origem)
+    registrar_intervalo(origem)
+    origem.save()
+    return (f"\n{gravadas} linhas já foram gravadas e continuam nesta origem. Para continuar de onde parou, "
+            f"rode `manage.py processar_importacoes --retomar`.")
+
+
+def retomar_processamentos():
+    """
+    Devolve para a fila os processamentos do modo 'atualizar' interrompidos com blocos
+    já gravados: os que terminaram com erro e os que ficaram 'processando' (servidor
+    reiniciado no meio). Só deve rodar sem nenhum worker ativo. Retorna quantos voltaram.
+    """
+    interrompidos = Processamento.objects.filter(
+        modo=MODO_ATUALIZAR, status__in=['erro', 'processando'], origem__blocos__isnull=False,
+    ).values_list('pk', flat=True).distinct()
+    return Processamento.objects.filter(pk__in=list(interrompidos)).update(
+        status='pendente', mensagem='', finalizado_em=None,
+    )
+
+
+def descrever_erro(erro):
+    """Mensagem do erro para o usuário; o traceback completo fica no log."""
+    if isinstance(erro, IntegrityError):
+        # Chaves já importadas viram rejeições (importacao.inserir_bloco); sobra outra importação simultânea
+        return "outra importação gravou as mesmas linhas ao mesmo tempo. Reenvie o arquivo no modo 'atualizar'."
+    return str(erro)
+
+
+def descartar_origem(origem, resultado):
+    """
+    Origem que não gravou nenhuma linha. Se houve rejeições, o registro fica só para o
+    download do relatório, sem hash nem blocos, para que o arquivo possa ser reenviado.
+    """
+    if not resultado.erros_por_tipo:
+        origem.delete()
+        return
+    origem.blocos.all().delete()
+    origem.hash_sha256 = None
+    origem.linhas_importadas = 0
+    origem.linhas_com_erro = resultado.linhas_com_erro
+    salvar_rejeicoes(origem, resultado)
+    origem.save()
+
+
+def finalizar(processamento_id, status, mensagem, resultado=None):
+    campos = {'status': status, 'mensagem': mensagem, 'finalizado_em': timezone.now()}
+    if resultado is not None:
+        campos.update(
+            linhas_lidas=resultado.linhas_lidas,
+            linhas_importadas=resultado.linhas_importadas,
+            linhas_com_erro=resultado.linhas_com_erro,
+            linhas_ignoradas=resultado.linhas_ignoradas,
+            linhas_atualizadas=resultado.linhas_atualizadas,
+        )
+    Processamento.objects.filter(pk=processamento_id).update(**campos)
+
+
+def agendar_exclusao(origem):
+    """
+    Cria a Exclusao da origem e a coloca na fila. Se já houver uma exclusão em
+    andamento para a origem, devolve essa.
+    """
+    andamento = origem.exclusoes.filter(status__in=['pendente', 'processando']).first()
+    if andamento:
+        return andamento
+    exclusao = Exclusao.objects.create(origem=origem, nome_origem=str(origem))
+    transaction.on_commit(lambda: submeter(executar_exclusao, exclusao.pk))
+    return exclusao
+
+
+def executar_exclusao(exclusao_id, lote=LOTE_EXCLUSAO, progresso_extra=None):
+    """
+    Apaga a origem da exclusão em lotes de `lote` ids, atualizando o progresso a cada
+    lote. `progresso_extra(excluidas, total)` permite acompanhar fora do banco (ex.: comando).
+    """
+    reservado = Exclusao.objects.filter(pk=exclusao_id, status='pendente').update(
+        status='processando', iniciado_em=timezone.now()
+    )
+    if not reservado:
+        return
+
+    exclusao = Exclusao.objects.select_related('origem').get(pk=exclusao_id)
+    origem = exclusao.origem
+    if origem is None:
+        finalizar_exclusao(exclusao_id, 'concluido', "A origem já tinha sido removida.")
+        return
+
+    total = linhas_da_origem(origem)
+    Exclusao.objects.filter(pk=exclusao_id).update(linhas_total=total)
+
+    def progresso(excluidas):
+        Exclusao.objects.filter(pk=exclusao_id).update(linhas_excluidas=excluidas)
+        if progresso_extra:
+            progresso_extra(excluidas, total)
+
+    try:
+        excluidas = excluir_origem(origem, lote, progresso=progresso)
+    except Exception as e:
+        logger.exception(f"Erro ao excluir a origem {exclusao.nome_origem}")
+        finalizar_exclusao(exclusao_id, 'erro', f"Erro ao excluir {exclusao.nome_origem}: {e}")
+        return
+
+    Exclusao.objects.filter(pk=exclusao_id).update(linhas_excluidas=excluidas)
+    finalizar_exclusao(exclusao_id, 'concluido', f"{excluidas} linhas excluídas.")
+
+
+def finalizar_exclusao(exclusao_id, status, mensagem):
+    Exclusao.objects.filter(pk=exclusao_id).update(status=status, mensagem=mensagem, finalizado_em=timezone.now())
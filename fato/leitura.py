@@ -0,0 +1,158 @@
+#fato/leitura.py
+"""
+Leitura de CSVs grandes por mmap.
+
+O arquivo (já em disco: Origem.arquivo ou um upload em arquivo temporário) é mapeado
+em memória e entregue ao pandas por faixas de bytes, sem ler o arquivo inteiro para a
+memória. As páginas já consumidas são devolvidas ao sistema, então a memória residente
+não cresce com o tamanho do arquivo.
+
+As fronteiras entre registros são achadas no buffer mapeado contando as aspas (um
+'\\n' só termina um registro fora de um campo entre aspas), o que permite dividir um
+arquivo em faixas lidas em paralelo por processos diferentes (ver dividir_em_faixas).
+"""
+import io
+import mmap
+
+import numpy as np
+import pandas as pd
+
+TAMANHO_FAIXA = 64 * 1024 * 1024  # Bytes por faixa quando o arquivo é dividido entre processos
+TAMANHO_BUFFER = 1024 * 1024  # Bytes entregues ao pandas por leitura
+LIBERAR_A_CADA = 64 * 1024 * 1024  # Devolve as páginas lidas ao sistema a cada tantos bytes
+PASSO_CONTAGEM = 16 * 1024 * 1024  # Bytes por passo ao contar aspas (limita o array temporário do numpy)
+
+# Encodings em que '\n' e as aspas são sempre um byte só (UTF-16 não pode ser fatiado por bytes)
+ENCODINGS_FATIAVEIS = {'utf-8', 'utf-8-sig', 'utf_8', 'cp1252', 'latin_1', 'latin-1', 'iso-8859-1', 'ascii'}
+
+
+def pode_mapear(arquivo, formato):
+    """True se o arquivo está em disco e o encoding permite localizar registros por bytes."""
+    if formato.encoding.lower() not in ENCODINGS_FATIAVEIS:
+        return False
+    try:
+        arquivo.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+    return True
+
+
+def abrir_mapa(arquivo):
+    """mmap somente leitura do arquivo inteiro, com leitura sequencial sugerida ao sistema."""
+    mapa = mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapa, 'madvise'):
+        mapa.madvise(mmap.MADV_SEQUENTIAL)
+    return mapa
+
+
+class FaixaMapeada(io.RawIOBase):
+    """Arquivo somente leitura sobre mapa[inicio:fim], copiando só o que o leitor pede."""
+
+    def __init__(self, mapa, inicio, fim):
+        super().__init__()
+        self.mapa = mapa
+        self.visao = memoryview(mapa)
+        self.posicao = inicio
+        self.fim = fim
+        self.liberado_ate = inicio - inicio % mmap.PAGESIZE
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        quantidade = min(len(destino), self.fim - self.posicao)
+        if quantidade <= 0:
+            return 0
+        destino[:quantidade] = self.visao[self.posicao:self.posicao + quantidade]
+        self.posicao += quantidade
+        self.liberar_paginas_lidas()
+        return quantidade
+
+    def liberar_paginas_lidas(self):
+        if not hasattr(self.mapa, 'madvise') or self.posicao - self.liberado_ate < LIBERAR_A_CADA:
+            return
+        ate = self.posicao - self.posicao % mmap.PAGESIZE
+        self.mapa.madvise(mmap.MADV_DONTNEED, self.liberado_ate, ate - self.liberado_ate)
+        self.liberado_ate = ate
+
+    def close(self):
+        if not self.closed:
+            self.visao.release()
+        super().close()
+
+
+def contar_byte(dados, byte, inicio, fim):
+    """Ocorrências de `byte` em dados[inicio:fim], em passos para não alocar um array do tamanho da faixa."""
+    total = 0
+    for passo in range(inicio, fim, PASSO_CONTAGEM):
+        total += int(np.count_nonzero(dados[passo:min(passo + PASSO_CONTAGEM, fim)] == byte))
+    return total
+
+
+def proxima_fronteira(mapa, dados, inicio, alvo, aspas):
+    """
+    Primeira posição >= alvo em que começa um registro, sabendo que `inicio` é o começo
+    de um registro. Um registro começa depois de um '\\n' com quantidade par de aspas
+    desde `inicio` (as aspas escapadas "" não mudam a paridade).
+    """
+    if alvo <= inicio:
+        return inicio
+    if alvo >= len(mapa):
+        return len(mapa)
+
+    posicao = alvo - 1
+    paridade = contar_byte(dados, aspas, inicio, posicao) % 2
+    while True:
+        quebra = mapa.find(b'\n', posicao)
+        if quebra == -1:
+            return len(mapa)
+        paridade = (paridade + contar_byte(dados, aspas, posicao, quebra)) % 2
+        if paridade == 0:
+            return quebra + 1
+        posicao = quebra + 1
+
+
+def fim_do_cabecalho(mapa, aspas=b'"'):
+    """Posição em que começa o primeiro registro de dados."""
+    dados = np.frombuffer(mapa, dtype=np.uint8)
+    try:
+        return proxima_fronteira(mapa, dados, 0, 1, aspas[0])
+    finally:
+        del dados  # Libera a exportação do buffer para o mapa poder ser fechado
+
+
+def dividir_em_faixas(mapa, tamanho_faixa=TAMANHO_FAIXA, aspas=b'"'):
+    """
+    Faixas [(inicio, fim)] de aproximadamente `tamanho_faixa` bytes cobrindo todos os
+    registros de dados; cada uma começa e termina numa fronteira de registro.
+    """
+    dados = np.frombuffer(mapa, dtype=np.uint8)
+    try:
+        byte_aspas = aspas[0]
+        inicio = proxima_fronteira(mapa, dados, 0, 1, byte_aspas)
+        faixas = []
+        while inicio < len(mapa):
+            fim = proxima_fronteira(mapa, dados, inicio, inicio + tamanho_faixa, byte_aspas)
+            faixas.append((inicio, fim))
+            inicio = fim
+        return faixas
+    finally:
+        del dados
+
+
+def ler_faixa(mapa, inicio, fim, formato, chunksize):
+    """
+    DataFrames (texto puro) dos registros em mapa[inicio:fim], `chunksize` linhas por vez.
+    Com inicio 0 o cabeçalho vem do próprio arquivo; nas outras faixas, de formato.colunas.
+    """
+    faixa = io.BufferedReader(FaixaMapeada(mapa, inicio, fim), buffer_size=TAMANHO_BUFFER)
+    opcoes = formato.opcoes_read_csv()
+    if inicio > 0:
+        opcoes.update(header=None, names=formato.colunas)
+        if opcoes['encoding'] == 'utf-8-sig':
+            opcoes['encoding'] = 'utf-8'  # O BOM só existe no início do arquivo
+    try:
+        with pd.read_csv(faixa, dtype=str, keep_default_na=False, chunksize=chunksize, **opcoes) as leitor:
+            yield from leitor
+    finally:
+        faixa.close()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from fato.colunar import colunar_disponivel, escrever_arquivo_colunar, remover_arquivos_colunares
+from fato.models import Origem
+
+
+class Command(BaseCommand):
+    help = ('Escreve (ou refaz) a cópia colunar em Parquet das origens já importadas. '
+            'Sem ids, arquiva as origens que ainda não têm cópia.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('origens', nargs='*', type=int, help='Ids das origens (padrão: as que não têm cópia)')
+        parser.add_argument('--refazer', action='store_true', help='Reescreve também as origens que já têm cópia')
+
+    def handle(self, *args, **options):
+        if not colunar_disponivel():
+            raise CommandError("Arquivo colunar indisponível: instale o pyarrow e ative IMPORTACAO_ARQUIVO_COLUNAR.")
+
+        origens = Origem.objects.exclude(linhas_importadas=0).order_by('pk')
+        if options['origens']:
+            origens = origens.filter(pk__in=options['origens'])
+        elif not options['refazer']:
+            origens = origens.filter(arquivos_colunares=[])
+
+        for origem in origens:
+            remover_arquivos_colunares(origem)
+            arquivos = escrever_arquivo_colunar(origem)
+            self.stdout.write(f"{origem}: {len(arquivos)} arquivos")
+        self.stdout.write(self.style.SUCCESS(f"{len(origens)} origens arquivadas."))
@@ -0,0 +1,75 @@
+import os
+import time
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from fato.carga import carregar_bloco, sessao_de_carga, suporta_carga_direta
+from fato.deteccao import FormatoInvalido, detectar_formato
+from fato.importacao import (
+    BATCH_SIZE, MODELOS, ResultadoImportacao, TAMANHO_CHUNK, inserir_chunk, preparar_blocos,
+)
+from fato.models import Origem
+from fato.utils import descobrir_csvs
+
+DESLOCAMENTO_SEQUENCIA = 1_000_000
+
+
+class Command(BaseCommand):
+    help = ('Compara o bulk_create do ORM com a carga direta (COPY/executemany) nos CSVs de uma árvore GERAL/. '
+            'As inserções são desfeitas ao final de cada rodada; o banco não é alterado.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('raiz', nargs='?', default='GERAL', help='Pasta raiz (padrão: GERAL)')
+        parser.add_argument('--repeticoes', type=int, default=3, help='Rodadas por método; vale a mais rápida')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Linhas por INSERT no bulk_create')
+        parser.add_argument('--chunksize', type=int, default=TAMANHO_CHUNK, help='Linhas lidas do CSV por vez')
+
+    def medir(self, modelo, blocos, inserir, direta):
+        """Tempo para gravar todos os blocos numa transação que é desfeita no fim."""
+        with sessao_de_carga() if direta else nullcontext():
+            with transaction.atomic():
+                origem = Origem.objects.create(arquivo='benchmark.csv', nome='benchmark.csv', filial='benchmark')
+                inicio = time.perf_counter()
+                for validos in blocos:
+                    inserir(modelo, validos, origem)
+                segundos = time.perf_counter() - inicio
+                transaction.set_rollback(True)
+        return segundos
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['raiz']):
+            raise CommandError(f"Pasta {options['raiz']} não encontrada.")
+        if not suporta_carga_direta():
+            raise CommandError("O banco configurado não tem carga direta (só PostgreSQL e SQLite).")
+
+        metodos = {
+            'orm': (lambda modelo, df, origem: inserir_chunk(modelo, df, origem, options['batch_size']), False),
+            'direta': (carregar_bloco, True),
+        }
+
+        for caminho, _filial in descobrir_csvs(options['raiz']):
+            with open(caminho, 'rb') as arquivo:
+                try:
+                    formato = detectar_formato(arquivo)
+                except FormatoInvalido as e:
+                    self.stdout.write(f"Ignorado ({e}): {caminho}")
+                    continue
+                tipo = formato.tipo
+                modelo = MODELOS[tipo]
+                resultado = ResultadoImportacao()
+                # Sequência deslocada para não colidir com a chave natural de linhas já importadas
+                blocos = [validos.assign(sequencia=validos['sequencia'] + DESLOCAMENTO_SEQUENCIA)
+                          for _bloco, validos in preparar_blocos(
+                              arquivo, modelo, formato, resultado, options['chunksize'])]
+
+            linhas = sum(len(validos) for validos in blocos)
+            tempos = {}
+            for nome, (inserir, direta) in metodos.items():
+                tempos[nome] = min(self.medir(modelo, blocos, inserir, direta) for _ in range(options['repeticoes']))
+
+            self.stdout.write(f"{caminho} ({tipo}, {linhas} linhas)")
+            for nome, segundos in tempos.items():
+                self.stdout.write(f"  {nome:<7} {segundos:8.3f}s  {linhas / segundos:10.0f} linhas/s")
+            self.stdout.write(self.style.SUCCESS(f"  carga direta {tempos['orm'] / tempos['direta']:.1f}x mais rápida"))
@@ -0,0 +1,35 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from fato.conciliacao import conciliar_datas, conciliar_pendentes
+
+
+class Command(BaseCommand):
+    help = ('Concilia Performance e Financeiro (corridas completadas x créditos por entregador, dia e período). '
+            'Sem datas, concilia as origens importadas que ainda não foram conciliadas.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', type=date.fromisoformat, default=None, help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('--fim', type=date.fromisoformat, default=None, help='Data final (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        if bool(options['inicio']) != bool(options['fim']):
+            raise CommandError("Informe --inicio e --fim juntos.")
+        if options['inicio'] and options['fim'] < options['inicio']:
+            raise CommandError("A data final é anterior à inicial.")
+
+        def progresso(data, divergencias):
+            self.stdout.write(f"{data}: {divergencias} divergências")
+
+        inicio = time.perf_counter()
+        if options['inicio']:
+            dias = (options['fim'] - options['inicio']).days + 1
+            total = conciliar_datas([options['inicio'] + timedelta(days=dia) for dia in range(dias)], progresso)
+            resumo = f"{dias} datas"
+        else:
+            origens, total = conciliar_pendentes(progresso)
+            resumo = f"{origens} origens pendentes"
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo} conciliadas: {total} divergências ({time.perf_counter() - inicio:.2f}s)."
+        ))
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from fato.exclusao import LOTE_EXCLUSAO
+from fato.jobs import executar_exclusao
+from fato.models import Exclusao, Origem
+
+
+class Command(BaseCommand):
+    help = ('Exclui origens e as linhas de fato delas em lotes de ids, sem carregar as linhas na memória. '
+            'A origem e o arquivo só são removidos no fim.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('origens', nargs='*', type=int, help='Ids das origens a excluir')
+        parser.add_argument('--pendentes', action='store_true',
+                            help='Executa também as exclusões pendentes (ex.: agendadas pelo admin antes de um reinício)')
+        parser.add_argument('--lote', type=int, default=LOTE_EXCLUSAO, help='Ids apagados por DELETE')
+
+    def handle(self, *args, **options):
+        if not options['origens'] and not options['pendentes']:
+            raise CommandError("Informe os ids das origens ou --pendentes.")
+
+        exclusoes = []
+        for origem_id in options['origens']:
+            origem = Origem.objects.filter(pk=origem_id).first()
+            if origem is None:
+                raise CommandError(f"Origem {origem_id} não encontrada.")
+            exclusao = origem.exclusoes.filter(status='pendente').first() \
+                or Exclusao.objects.create(origem=origem, nome_origem=str(origem))
+            exclusoes.append(exclusao.pk)
+        if options['pendentes']:
+            pendentes = Exclusao.objects.filter(status='pendente').order_by('criado_em').values_list('id', flat=True)
+            exclusoes += [exclusao_id for exclusao_id in pendentes if exclusao_id not in exclusoes]
+
+        def progresso(excluidas, total):
+            self.stdout.write(f"  {excluidas} de {total} linhas excluídas")
+
+        for exclusao_id in exclusoes:
+            executar_exclusao(exclusao_id, options['lote'], progresso)
+            exclusao = Exclusao.objects.get(pk=exclusao_id)
+            estilo = self.style.ERROR if exclusao.status == 'erro' else self.style.SUCCESS
+            self.stdout.write(estilo(f"{exclusao.nome_origem}: {exclusao.mensagem or exclusao.get_status_display()}"))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+import os
+from fato.importacao import BATCH_SIZE, MODO_ATUALIZAR, MODO_INSERIR, TAMANHO_CHUNK
+from fato.leitura import TAMANHO_FAIXA
+from fato.utils import importar_pasta, validar_pasta
+
+
+class Command(BaseCommand):
+    help = 'Importa todos os CSVs de uma árvore GERAL/<TIPO>/<FILIAL>/*.csv, lendo os arquivos em paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('raiz', help='Pasta raiz (ex.: GERAL)')
+        parser.add_argument('--workers', type=int, default=None, help='Processos de leitura (padrão: nº de CPUs)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Linhas por INSERT')
+        parser.add_argument('--chunksize', type=int, default=TAMANHO_CHUNK, help='Linhas lidas do CSV por vez')
+        parser.add_argument('--atualizar', action='store_true',
+                            help='Atualiza linhas existentes pela chave natural em vez de inseri-las de novo')
+        parser.add_argument('--tamanho-faixa', type=int, default=TAMANHO_FAIXA // (1024 * 1024),
+                            help='Arquivos maiores que tantos MB são divididos entre os processos de leitura')
+        parser.add_argument('--carga-direta', action='store_true', default=None,
+                            help='Insere via COPY/executemany em vez do bulk_create (padrão: IMPORTACAO_CARGA_DIRETA)')
+        parser.add_argument('--validar', action='store_true',
+                            help='Só valida os arquivos e mostra os erros por coluna; nada é gravado')
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['raiz']):
+            raise CommandError(f"Pasta {options['raiz']} não encontrada.")
+
+        if options['validar']:
+            resumo = validar_pasta(options['raiz'], chunksize=options['chunksize'], saida=self.stdout.write)
+            estilo = self.style.WARNING if resumo['linhas_com_erro'] else self.style.SUCCESS
+            self.stdout.write(estilo(
+                f"{resumo['arquivos']} arquivos validados ({resumo['com_erro']} com erro). "
+                f"{resumo['linhas']} linhas ({resumo['linhas_com_erro']} com erro) em {resumo['segundos']:.2f}s. "
+                f"Nada foi importado."
+            ))
+            return
+
+        resumo = importar_pasta(
+            options['raiz'],
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            chunksize=options['chunksize'],
+            saida=self.stdout.write,
+            modo=MODO_ATUALIZAR if options['atualizar'] else MODO_INSERIR,
+            carga_direta=options['carga_direta'],
+            tamanho_faixa=options['tamanho_faixa'] * 1024 * 1024,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumo['importados']} de {resumo['arquivos']} arquivos importados "
+            f"({resumo['ignorados']} já importados, {resumo['com_erro']} com erro). "
+            f"{resumo['linhas']} linhas ({resumo['linhas_com_erro']} com erro) em {resumo['segundos']:.2f}s "
+            f"- {resumo['linhas_por_segundo']:.0f} linhas/s."
+        ))
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from app.importacao import executar_importacao_pessoas
+from app.models import ImportacaoPessoas
+from fato.models import Processamento
+from fato.jobs import executar_processamento, retomar_processamentos
+
+
+class Command(BaseCommand):
+    help = 'Processa as importações pendentes, de fatos e de pessoas (worker fora do servidor web)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Continua aguardando novos processamentos')
+        parser.add_argument('--intervalo', type=int, default=5, help='Segundos entre as verificações no modo --loop')
+        parser.add_argument('--retomar', action='store_true',
+                            help="Antes, devolve para a fila os processamentos no modo 'atualizar' interrompidos "
+                                 "no meio (com o servidor parado)")
+
+    def handle(self, *args, **options):
+        if options['retomar']:
+            self.stdout.write(f"{retomar_processamentos()} processamentos interrompidos voltaram para a fila.")
+        while True:
+            pendentes = list(Processamento.objects.filter(status='pendente').order_by('criado_em').values_list('id', flat=True))
+            for processamento_id in pendentes:
+                executar_processamento(processamento_id)
+                processamento = Processamento.objects.get(pk=processamento_id)
+                self.stdout.write(f"{processamento}: {processamento.linhas_importadas} linhas importadas, "
+                                  f"{processamento.linhas_com_erro} com erro.")
+
+            pessoas = ImportacaoPessoas.objects.filter(status='pendente').order_by('criado_em')
+            pessoas = list(pessoas.values_list('id', flat=True))
+            for importacao_id in pessoas:
+                executar_importacao_pessoas(importacao_id)
+                importacao = ImportacaoPessoas.objects.get(pk=importacao_id)
+                self.stdout.write(f"{importacao}: {importacao.linhas_importadas} linhas importadas, "
+                                  f"{importacao.linhas_com_erro} com erro.")
+
+            if not options['loop']:
+                break
+            time.sleep(options['intervalo'])
+
+        self.stdout.write(self.style.SUCCESS('Processamentos pendentes finalizados.'))
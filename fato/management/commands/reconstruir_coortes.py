@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from fato.coortes import reconstruir_coortes
+
+
+class Command(BaseCommand):
+    help = ('Refaz a AtividadeCoorte (entregadores ativos e horas por data de ingresso na franquia e semana) '
+            'a partir da PerformanceDiaria e da dt_franquia dos Drivers.')
+
+    def handle(self, *args, **options):
+        def progresso(semana, gravadas):
+            self.stdout.write(f"Semana de {semana}: {gravadas} linhas")
+
+        inicio = time.perf_counter()
+        total = reconstruir_coortes(progresso=progresso)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} linhas de coortes gravadas ({time.perf_counter() - inicio:.2f}s)."
+        ))
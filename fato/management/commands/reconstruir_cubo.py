@@ -0,0 +1,28 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from fato.cubo import reconstruir_cubo
+
+
+class Command(BaseCommand):
+    help = ('Refaz o cubo de Performance (medidas somadas por dia/semana/mês × praça/sub-praça/período) '
+            'e os esboços de quantis por dia × sub-praça a partir da tabela de Performance. '
+            'Sem datas, refaz o cubo inteiro.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', type=date.fromisoformat, default=None, help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('--fim', type=date.fromisoformat, default=None, help='Data final (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        if options['inicio'] and options['fim'] and options['fim'] < options['inicio']:
+            raise CommandError("A data final é anterior à inicial.")
+
+        def progresso(mes, datas):
+            self.stdout.write(f"{mes:%Y-%m}: {datas} datas")
+
+        inicio = time.perf_counter()
+        datas = reconstruir_cubo(options['inicio'], options['fim'], progresso=progresso)
+        self.stdout.write(self.style.SUCCESS(
+            f"Cubo refeito para {datas} datas ({time.perf_counter() - inicio:.2f}s)."
+        ))
@@ -0,0 +1,27 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from fato.agregados import reconstruir_performance_diaria
+
+
+class Command(BaseCommand):
+    help = ('Refaz a PerformanceDiaria (Performance somada por entregador, dia e sub-praça) a partir da '
+            'tabela de Performance. Sem datas, refaz a tabela inteira.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', type=date.fromisoformat, default=None, help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('--fim', type=date.fromisoformat, default=None, help='Data final (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        if options['inicio'] and options['fim'] and options['fim'] < options['inicio']:
+            raise CommandError("A data final é anterior à inicial.")
+
+        def progresso(data, gravadas):
+            self.stdout.write(f"{data}: {gravadas} linhas")
+
+        inicio = time.perf_counter()
+        total = reconstruir_performance_diaria(options['inicio'], options['fim'], progresso=progresso)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} linhas diárias gravadas ({time.perf_counter() - inicio:.2f}s)."
+        ))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from fato.saldos import reconstruir_saldos
+
+
+class Command(BaseCommand):
+    help = ('Refaz o SaldoRepasse (extrato do Financeiro por entregador e data do repasse, com saldo acumulado) '
+            'a partir da tabela de Financeiro.')
+
+    def handle(self, *args, **options):
+        def progresso(entregadores, gravadas):
+            self.stdout.write(f"{entregadores} entregadores: {gravadas} linhas")
+
+        inicio = time.perf_counter()
+        total = reconstruir_saldos(progresso=progresso)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} linhas de saldo gravadas ({time.perf_counter() - inicio:.2f}s)."
+        ))
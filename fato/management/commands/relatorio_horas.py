@@ -0,0 +1,28 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from fato.relatorios import relatorio_horas, salvar_planilha
+
+
+class Command(BaseCommand):
+    help = ('Gera a planilha de horas entregues e entregadores que rodaram/não rodaram por dia da semana '
+            'e por dia do mês, direto da tabela de Performance (substitui o analise.py).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('inicio', type=date.fromisoformat, help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('fim', type=date.fromisoformat, help='Data final (AAAA-MM-DD)')
+        parser.add_argument('--filial', default=None, help='Só as importações desta filial (ex.: "D&G SP")')
+        parser.add_argument('--saida', default='relatorio_horas_entregues_com_media_mediana.xlsx',
+                            help='Arquivo .xlsx de saída')
+
+    def handle(self, *args, **options):
+        if options['fim'] < options['inicio']:
+            raise CommandError("A data final é anterior à inicial.")
+
+        inicio = time.perf_counter()
+        abas = relatorio_horas(options['inicio'], options['fim'], filial=options['filial'])
+        salvar_planilha(abas, options['saida'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Relatório salvo em: {options['saida']} ({time.perf_counter() - inicio:.2f}s)"
+        ))
@@ -0,0 +1,29 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from fato.relatorios import salvar_planilha
+from fato.scorecard import KPIS, scorecard
+
+
+class Command(BaseCommand):
+    help = ('Gera o scorecard dos entregadores (horas, taxas de aceitação, conclusão e cancelamento, R$ por hora) '
+            'com posição e percentil dentro da sub-praça, a partir da Performance diária.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('inicio', type=date.fromisoformat, help='Data inicial (AAAA-MM-DD)')
+        parser.add_argument('fim', type=date.fromisoformat, help='Data final (AAAA-MM-DD)')
+        parser.add_argument('--ordenar-por', default='horas', choices=KPIS, help='KPI da posição na sub-praça')
+        parser.add_argument('--saida', default='scorecard_entregadores.xlsx', help='Arquivo .xlsx de saída')
+
+    def handle(self, *args, **options):
+        if options['fim'] < options['inicio']:
+            raise CommandError("A data final é anterior à inicial.")
+
+        inicio = time.perf_counter()
+        tabela = scorecard(options['inicio'], options['fim'], ordenar_por=options['ordenar_por'])
+        salvar_planilha({'Scorecard': tabela}, options['saida'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Scorecard de {len(tabela)} entregadores salvo em: {options['saida']} "
+            f"({time.perf_counter() - inicio:.2f}s)"
+        ))
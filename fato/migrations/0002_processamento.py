@@ -0,0 +1,35 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Processamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome_arquivo', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluido', 'Concluído'), ('erro', 'Erro')], db_index=True, default='pendente', max_length=20)),
+                ('linhas_lidas', models.IntegerField(default=0)),
+                ('linhas_importadas', models.IntegerField(default=0)),
+                ('linhas_com_erro', models.IntegerField(default=0)),
+                ('mensagem', models.TextField(blank=True, default='')),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('finalizado_em', models.DateTimeField(blank=True, null=True)),
+                ('origem', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='processamentos', to='fato.origem')),
+            ],
+            options={
+                'verbose_name': 'Processamento',
+                'verbose_name_plural': 'Processamentos',
+                'ordering': ('-criado_em',),
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0002_processamento'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='origem',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='origem',
+            name='hash_sha256',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='processamento',
+            name='apenas_blocos_novos',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='processamento',
+            name='linhas_ignoradas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='BlocoOrigem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('indice', models.IntegerField()),
+                ('linhas', models.IntegerField()),
+                ('tamanho_chunk', models.IntegerField()),
+                ('hash_sha256', models.CharField(max_length=64)),
+                ('origem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blocos', to='fato.origem')),
+            ],
+            options={
+                'verbose_name': 'Bloco da Origem',
+                'verbose_name_plural': 'Blocos da Origem',
+                'unique_together': {('origem', 'indice')},
+            },
+        ),
+    ]
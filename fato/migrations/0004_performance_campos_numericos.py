@@ -0,0 +1,112 @@
+# Converte as durações, o percentual escalado e a soma das taxas da Performance
+# de texto para números, preenchendo os registros já importados.
+
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+CAMPOS = [
+    'duracao_do_periodo',
+    'tempo_disponivel_escalado',
+    'tempo_disponivel_absoluto',
+    'soma_das_taxas_das_corridas_aceitas',
+]
+
+DURACAO = re.compile(r'^(\d+):(\d{1,2}):(\d{1,2})$')
+
+
+def para_segundos(valor):
+    encontrado = DURACAO.match((valor or '').strip())
+    if not encontrado:
+        return 0
+    horas, minutos, segundos = (int(parte) for parte in encontrado.groups())
+    return horas * 3600 + minutos * 60 + segundos
+
+
+def para_decimal(valor):
+    texto = (valor or '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return Decimal('0')
+
+
+def para_centavos(valor):
+    texto = (valor or '').strip()
+    if texto.isdigit():
+        return int(texto)  # O export traz a soma das taxas em centavos
+    return int(para_decimal(texto) * 100)
+
+
+def preencher_campos_numericos(apps, schema_editor):
+    Performance = apps.get_model('fato', 'Performance')
+    lote = []
+    for performance in Performance.objects.only('id', *CAMPOS).iterator(chunk_size=5000):
+        performance.duracao_do_periodo_num = para_segundos(performance.duracao_do_periodo)
+        performance.tempo_disponivel_escalado_num = para_decimal(performance.tempo_disponivel_escalado)
+        performance.tempo_disponivel_absoluto_num = para_segundos(performance.tempo_disponivel_absoluto)
+        performance.soma_das_taxas_das_corridas_aceitas_num = para_centavos(performance.soma_das_taxas_das_corridas_aceitas)
+        lote.append(performance)
+        if len(lote) >= 5000:
+            Performance.objects.bulk_update(lote, [f'{campo}_num' for campo in CAMPOS])
+            lote = []
+    if lote:
+        Performance.objects.bulk_update(lote, [f'{campo}_num' for campo in CAMPOS])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0003_origem_hash_sha256_blocos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performance',
+            name='duracao_do_periodo_num',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performance',
+            name='tempo_disponivel_escalado_num',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AddField(
+            model_name='performance',
+            name='tempo_disponivel_absoluto_num',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='performance',
+            name='soma_das_taxas_das_corridas_aceitas_num',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_campos_numericos, migrations.RunPython.noop),
+        migrations.RemoveField(model_name='performance', name='duracao_do_periodo'),
+        migrations.RemoveField(model_name='performance', name='tempo_disponivel_escalado'),
+        migrations.RemoveField(model_name='performance', name='tempo_disponivel_absoluto'),
+        migrations.RemoveField(model_name='performance', name='soma_das_taxas_das_corridas_aceitas'),
+        migrations.RenameField(
+            model_name='performance',
+            old_name='duracao_do_periodo_num',
+            new_name='duracao_do_periodo',
+        ),
+        migrations.RenameField(
+            model_name='performance',
+            old_name='tempo_disponivel_escalado_num',
+            new_name='tempo_disponivel_escalado',
+        ),
+        migrations.RenameField(
+            model_name='performance',
+            old_name='tempo_disponivel_absoluto_num',
+            new_name='tempo_disponivel_absoluto',
+        ),
+        migrations.RenameField(
+            model_name='performance',
+            old_name='soma_das_taxas_das_corridas_aceitas_num',
+            new_name='soma_das_taxas_das_corridas_aceitas',
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Converte as datas, o valor (para centavos) e os percentuais do Financeiro de texto
+# para tipos do banco, preenchendo os registros já importados, e cria os índices
+# usados nos totais por entregador e por repasse.
+
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+DATAS = ['data_do_lancamento_financeiro', 'data_do_periodo_de_referencia', 'data_do_repasse']
+PERCENTUAIS = ['percentual_de_tempo_disponivel', 'percentual_de_aceitacao', 'percentual_de_conclusao']
+CAMPOS = DATAS + ['valor'] + PERCENTUAIS
+
+
+def para_data(valor):
+    texto = (valor or '').strip()
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    return None
+
+
+def para_decimal(valor):
+    texto = (valor or '').strip()
+    if ',' in texto:
+        texto = texto.replace('.', '').replace(',', '.')
+    try:
+        return Decimal(texto).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def preencher_campos_tipados(apps, schema_editor):
+    Financeiro = apps.get_model('fato', 'Financeiro')
+    novos = [f'{campo}_novo' for campo in CAMPOS]
+    lote = []
+    for financeiro in Financeiro.objects.only('id', *CAMPOS).iterator(chunk_size=5000):
+        for campo in DATAS:
+            setattr(financeiro, f'{campo}_novo', para_data(getattr(financeiro, campo)))
+        for campo in PERCENTUAIS:
+            setattr(financeiro, f'{campo}_novo', para_decimal(getattr(financeiro, campo)))
+        valor = para_decimal(financeiro.valor)
+        financeiro.valor_novo = int(valor * 100) if valor is not None else 0
+        lote.append(financeiro)
+        if len(lote) >= 5000:
+            Financeiro.objects.bulk_update(lote, novos)
+            lote = []
+    if lote:
+        Financeiro.objects.bulk_update(lote, novos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0004_performance_campos_numericos'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name='financeiro',
+                name=f'{campo}_novo',
+                field=models.DateField(blank=True, null=True),
+            )
+            for campo in DATAS
+        ],
+        migrations.AddField(
+            model_name='financeiro',
+            name='valor_novo',
+            field=models.IntegerField(default=0),
+        ),
+        *[
+            migrations.AddField(
+                model_name='financeiro',
+                name=f'{campo}_novo',
+                field=models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True),
+            )
+            for campo in PERCENTUAIS
+        ],
+        migrations.RunPython(preencher_campos_tipados, migrations.RunPython.noop),
+        *[migrations.RemoveField(model_name='financeiro', name=campo) for campo in CAMPOS],
+        *[
+            migrations.RenameField(model_name='financeiro', old_name=f'{campo}_novo', new_name=campo)
+            for campo in CAMPOS
+        ],
+        migrations.AddIndex(
+            model_name='financeiro',
+            index=models.Index(fields=['id_da_pessoa_entregadora', 'data_do_repasse'], name='financeiro_pessoa_repasse_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='financeiro',
+            index=models.Index(fields=['data_do_repasse'], name='financeiro_repasse_idx'),
+        ),
+    ]
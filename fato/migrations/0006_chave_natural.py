@@ -0,0 +1,105 @@
+# Chave natural única para Performance e Financeiro (usada pelo modo de atualização da
+# importação). Numera as ocorrências repetidas da chave dentro de cada origem e, quando
+# a mesma linha foi importada por mais de uma origem, mantém só a da importação mais recente;
+# o total removido de cada origem vai para o log e sai de Origem.linhas_importadas.
+
+import logging
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+CHAVES = {
+    'Performance': ['data_do_periodo', 'periodo', 'id_da_pessoa_entregadora', 'sub_praca'],
+    'Financeiro': ['data_do_periodo_de_referencia', 'periodo', 'id_da_pessoa_entregadora', 'subpraca', 'tipo', 'descricao'],
+}
+
+LOTE = 5000
+
+
+def numerar_e_deduplicar(apps, schema_editor):
+    Origem = apps.get_model('fato', 'Origem')
+    for nome_modelo, chave in CHAVES.items():
+        Modelo = apps.get_model('fato', nome_modelo)
+        linhas = (
+            Modelo.objects.order_by(*chave, 'origem_doc_id', 'id')
+            .values_list('id', 'origem_doc_id', *chave)
+            .iterator(chunk_size=LOTE)
+        )
+
+        atualizar, remover, por_origem = [], [], Counter()
+        chave_atual, origem_atual, sequencia = None, None, 0
+        mantidos = {}  # sequencia -> (id, origem) mantidos para a chave atual
+
+        for id_linha, origem_id, *valores in linhas:
+            valores = tuple(valores)
+            if valores != chave_atual:
+                chave_atual, origem_atual, sequencia, mantidos = valores, origem_id, 0, {}
+            elif origem_id != origem_atual:
+                origem_atual, sequencia = origem_id, 0
+            else:
+                sequencia += 1
+
+            # Origens vêm em ordem crescente: a mesma sequência numa origem mais nova substitui a anterior
+            if sequencia in mantidos:
+                id_removido, origem_removida = mantidos[sequencia]
+                remover.append(id_removido)
+                por_origem[origem_removida] += 1
+            mantidos[sequencia] = (id_linha, origem_id)
+            atualizar.append(Modelo(id=id_linha, sequencia=sequencia))
+
+            if len(atualizar) >= LOTE:
+                Modelo.objects.bulk_update(atualizar, ['sequencia'])
+                atualizar = []
+
+        if atualizar:
+            Modelo.objects.bulk_update(atualizar, ['sequencia'])
+        if not remover:
+            continue
+
+        logger.warning(
+            f"{nome_modelo}: {len(remover)} linhas importadas de novo por uma origem mais recente serão "
+            f"removidas (por origem: {dict(sorted(por_origem.items()))})."
+        )
+        for inicio in range(0, len(remover), LOTE):
+            Modelo.objects.filter(id__in=remover[inicio:inicio + LOTE]).delete()
+        for origem_id, quantidade in por_origem.items():
+            Origem.objects.filter(pk=origem_id).update(linhas_importadas=F('linhas_importadas') - quantidade)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0005_financeiro_campos_tipados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='performance',
+            name='sequencia',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='financeiro',
+            name='sequencia',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(numerar_e_deduplicar, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='performance',
+            constraint=models.UniqueConstraint(
+                fields=('data_do_periodo', 'periodo', 'id_da_pessoa_entregadora', 'sub_praca', 'sequencia'),
+                name='performance_chave_natural',
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name='financeiro',
+            constraint=models.UniqueConstraint(
+                fields=('data_do_periodo_de_referencia', 'periodo', 'id_da_pessoa_entregadora', 'subpraca', 'tipo',
+                        'descricao', 'sequencia'),
+                name='financeiro_chave_natural',
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0006_chave_natural'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processamento',
+            name='linhas_atualizadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processamento',
+            name='modo',
+            field=models.CharField(choices=[('inserir', 'Inserir linhas'), ('atualizar', 'Atualizar pela chave natural')], default='inserir', max_length=20),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:19
+
+import fato.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0007_processamento_modo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='origem',
+            name='arquivo_rejeicoes',
+            field=models.FileField(blank=True, null=True, upload_to=fato.models.upload_to),
+        ),
+        migrations.AddField(
+            model_name='origem',
+            name='erros_por_tipo',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0009_exclusao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='origem',
+            name='arquivos_colunares',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
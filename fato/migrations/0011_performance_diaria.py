@@ -0,0 +1,62 @@
+# Performance somada por entregador, dia e sub-praça (ver fato.agregados). A tabela é
+# preenchida aqui a partir da Performance existente, uma data por vez.
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+CHAVE = ['id_da_pessoa_entregadora', 'data_do_periodo', 'sub_praca']
+
+SOMADOS = [
+    'duracao_do_periodo', 'tempo_disponivel_absoluto', 'numero_de_corridas_ofertadas', 'numero_de_corridas_aceitas',
+    'numero_de_corridas_rejeitadas', 'numero_de_corridas_completadas',
+    'numero_de_corridas_canceladas_pela_pessoa_entregadora', 'numero_de_pedidos_aceitos_e_concluidos',
+    'soma_das_taxas_das_corridas_aceitas',
+]
+
+
+def preencher(apps, schema_editor):
+    Performance = apps.get_model('fato', 'Performance')
+    PerformanceDiaria = apps.get_model('fato', 'PerformanceDiaria')
+    somas = {campo: Sum(campo) for campo in SOMADOS}
+    for data in Performance.objects.values_list('data_do_periodo', flat=True).distinct().order_by():
+        linhas = Performance.objects.filter(data_do_periodo=data).values(*CHAVE).annotate(
+            pessoa_entregadora=Max('pessoa_entregadora'), periodos=Count('id'), **somas
+        ).order_by()
+        PerformanceDiaria.objects.bulk_create([PerformanceDiaria(**linha) for linha in linhas], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0010_origem_arquivos_colunares'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PerformanceDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_da_pessoa_entregadora', models.CharField(max_length=255)),
+                ('data_do_periodo', models.DateField()),
+                ('sub_praca', models.CharField(max_length=255)),
+                ('pessoa_entregadora', models.CharField(max_length=255)),
+                ('periodos', models.IntegerField(default=0)),
+                ('duracao_do_periodo', models.IntegerField(default=0)),
+                ('tempo_disponivel_absoluto', models.IntegerField(default=0)),
+                ('numero_de_corridas_ofertadas', models.IntegerField(default=0)),
+                ('numero_de_corridas_aceitas', models.IntegerField(default=0)),
+                ('numero_de_corridas_rejeitadas', models.IntegerField(default=0)),
+                ('numero_de_corridas_completadas', models.IntegerField(default=0)),
+                ('numero_de_corridas_canceladas_pela_pessoa_entregadora', models.IntegerField(default=0)),
+                ('numero_de_pedidos_aceitos_e_concluidos', models.IntegerField(default=0)),
+                ('soma_das_taxas_das_corridas_aceitas', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Performance diária',
+                'verbose_name_plural': 'Performance diária',
+                'indexes': [models.Index(fields=['data_do_periodo'], name='performance_diaria_data_idx')],
+                'constraints': [models.UniqueConstraint(fields=('id_da_pessoa_entregadora', 'data_do_periodo', 'sub_praca'), name='performance_diaria_chave')],
+            },
+        ),
+        migrations.RunPython(preencher, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Cubo de Performance (ver fato.cubo). A tabela nasce vazia: preencher com
+# `manage.py reconstruir_cubo` depois de migrar.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0011_performance_diaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CuboPerformance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grao', models.CharField(max_length=30)),
+                ('data', models.DateField()),
+                ('praca', models.CharField(blank=True, default='', max_length=255)),
+                ('sub_praca', models.CharField(blank=True, default='', max_length=255)),
+                ('periodo', models.CharField(blank=True, default='', max_length=255)),
+                ('linhas', models.IntegerField(default=0)),
+                ('duracao_do_periodo', models.BigIntegerField(default=0)),
+                ('tempo_disponivel_absoluto', models.BigIntegerField(default=0)),
+                ('numero_de_corridas_ofertadas', models.BigIntegerField(default=0)),
+                ('numero_de_corridas_aceitas', models.BigIntegerField(default=0)),
+                ('numero_de_corridas_rejeitadas', models.BigIntegerField(default=0)),
+                ('numero_de_corridas_completadas', models.BigIntegerField(default=0)),
+                ('numero_de_corridas_canceladas_pela_pessoa_entregadora', models.BigIntegerField(default=0)),
+                ('numero_de_pedidos_aceitos_e_concluidos', models.BigIntegerField(default=0)),
+                ('soma_das_taxas_das_corridas_aceitas', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Cubo de Performance',
+                'verbose_name_plural': 'Cubo de Performance',
+                'constraints': [models.UniqueConstraint(fields=('grao', 'data', 'praca', 'sub_praca', 'periodo'), name='cubo_performance_chave')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Intervalo de datas de cada origem (usado na versão dos relatórios em cache, ver
+# fato.cache). Preenchido aqui para as origens já importadas.
+
+from django.db import migrations, models
+from django.db.models import Max, Min
+
+COLUNAS_DE_DATA = {
+    'performance': ('Performance', ['data_do_periodo']),
+    'financeiro': ('Financeiro', ['data_do_lancamento_financeiro', 'data_do_periodo_de_referencia', 'data_do_repasse']),
+}
+
+
+def preencher_intervalos(apps, schema_editor):
+    Origem = apps.get_model('fato', 'Origem')
+    for origem in Origem.objects.filter(tipo__in=COLUNAS_DE_DATA):
+        nome_modelo, colunas = COLUNAS_DE_DATA[origem.tipo]
+        Modelo = apps.get_model('fato', nome_modelo)
+        limites = {}
+        for coluna in colunas:
+            limites[f'{coluna}_inicio'] = Min(coluna)
+            limites[f'{coluna}_fim'] = Max(coluna)
+        valores = Modelo.objects.filter(origem_doc=origem).aggregate(**limites)
+        inicios = [valores[f'{coluna}_inicio'] for coluna in colunas if valores[f'{coluna}_inicio']]
+        fins = [valores[f'{coluna}_fim'] for coluna in colunas if valores[f'{coluna}_fim']]
+        Origem.objects.filter(pk=origem.pk).update(
+            data_inicial=min(inicios) if inicios else None, data_final=max(fins) if fins else None
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0012_cubo_performance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='origem',
+            name='data_final',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='origem',
+            name='data_inicial',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(preencher_intervalos, migrations.RunPython.noop),
+    ]
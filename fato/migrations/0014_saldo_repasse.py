@@ -0,0 +1,57 @@
+# Extrato do Financeiro por entregador e data do repasse, com saldo acumulado (ver
+# fato.saldos). A tabela é preenchida aqui a partir do Financeiro existente.
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+DEBITO = Q(tipo__istartswith='deb')
+
+
+def preencher(apps, schema_editor):
+    Financeiro = apps.get_model('fato', 'Financeiro')
+    SaldoRepasse = apps.get_model('fato', 'SaldoRepasse')
+    somas = Financeiro.objects.exclude(data_do_repasse=None).values('id_da_pessoa_entregadora', 'data_do_repasse').annotate(
+        lancamentos=Count('id'),
+        creditos=Sum('valor', filter=~DEBITO, default=0),
+        debitos=Sum('valor', filter=DEBITO, default=0),
+    ).order_by('id_da_pessoa_entregadora', 'data_do_repasse')
+
+    novos, saldos = [], {}
+    for linha in somas.iterator():
+        liquido = linha['creditos'] - linha['debitos']
+        saldos[linha['id_da_pessoa_entregadora']] = saldos.get(linha['id_da_pessoa_entregadora'], 0) + liquido
+        novos.append(SaldoRepasse(liquido=liquido, saldo=saldos[linha['id_da_pessoa_entregadora']], **linha))
+        if len(novos) >= 500:
+            SaldoRepasse.objects.bulk_create(novos)
+            novos = []
+    SaldoRepasse.objects.bulk_create(novos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0013_origem_intervalo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SaldoRepasse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_da_pessoa_entregadora', models.CharField(max_length=255)),
+                ('data_do_repasse', models.DateField()),
+                ('lancamentos', models.IntegerField(default=0)),
+                ('creditos', models.BigIntegerField(default=0)),
+                ('debitos', models.BigIntegerField(default=0)),
+                ('liquido', models.BigIntegerField(default=0)),
+                ('saldo', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Saldo de repasse',
+                'verbose_name_plural': 'Saldos de repasse',
+                'indexes': [models.Index(fields=['data_do_repasse'], name='saldo_repasse_data_idx')],
+                'constraints': [models.UniqueConstraint(fields=('id_da_pessoa_entregadora', 'data_do_repasse'), name='saldo_repasse_chave')],
+            },
+        ),
+        migrations.RunPython(preencher, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Conciliação entre Performance e Financeiro (ver fato.conciliacao). As origens já
+# importadas ficam pendentes: conciliar com `manage.py conciliar` depois de migrar.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0014_saldo_repasse'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='origem',
+            name='conciliada_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Divergencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('faltando', 'Sem crédito no Financeiro'), ('sobrando', 'Crédito sem corridas na Performance'), ('valor', 'Valor divergente')], max_length=20)),
+                ('id_da_pessoa_entregadora', models.CharField(max_length=255)),
+                ('data', models.DateField()),
+                ('periodo', models.CharField(max_length=255)),
+                ('corridas_completadas', models.IntegerField(default=0)),
+                ('valor_performance', models.BigIntegerField(default=0)),
+                ('valor_financeiro', models.BigIntegerField(default=0)),
+                ('diferenca', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Divergência',
+                'verbose_name_plural': 'Divergências',
+                'indexes': [models.Index(fields=['id_da_pessoa_entregadora', 'data'], name='divergencia_pessoa_data_idx')],
+                'constraints': [models.UniqueConstraint(fields=('data', 'id_da_pessoa_entregadora', 'periodo'), name='divergencia_chave')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Esboços de quantis por dia e sub-praça (ver fato.quantis). A tabela nasce vazia:
+# preencher com `manage.py reconstruir_cubo` depois de migrar.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0015_conciliacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EsbocoQuantis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metrica', models.CharField(max_length=50)),
+                ('data', models.DateField()),
+                ('sub_praca', models.CharField(max_length=255)),
+                ('contagem', models.IntegerField(default=0)),
+                ('esboco', models.JSONField(default=dict)),
+            ],
+            options={
+                'verbose_name': 'Esboço de quantis',
+                'verbose_name_plural': 'Esboços de quantis',
+                'indexes': [models.Index(fields=['data'], name='esboco_quantis_data_idx')],
+                'constraints': [models.UniqueConstraint(fields=('metrica', 'data', 'sub_praca'), name='esboco_quantis_chave')],
+            },
+        ),
+    ]
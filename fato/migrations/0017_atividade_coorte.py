@@ -0,0 +1,30 @@
+# Coortes de entregadores por data de ingresso na franquia (ver fato.coortes). A tabela
+# nasce vazia: preencher com `manage.py reconstruir_coortes` depois de migrar.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0016_esboco_quantis'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AtividadeCoorte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entrada', models.DateField()),
+                ('semana', models.DateField()),
+                ('entregadores', models.IntegerField(default=0)),
+                ('segundos', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Atividade da coorte',
+                'verbose_name_plural': 'Coortes de entregadores',
+                'indexes': [models.Index(fields=['semana'], name='atividade_coorte_semana_idx')],
+                'constraints': [models.UniqueConstraint(fields=('entrada', 'semana'), name='atividade_coorte_chave')],
+            },
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Chave natural dos lançamentos do Financeiro sem data do período de referência: o
+# índice financeiro_chave_natural não compara NULLs, então reimportações desses
+# lançamentos ficavam duplicadas. Antes do índice novo, as duplicatas são removidas
+# (fica a linha da importação mais recente, como na 0006), com o total por origem no
+# log; Origem.linhas_importadas e o SaldoRepasse dos entregadores afetados são refeitos.
+
+import logging
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+logger = logging.getLogger(__name__)
+
+CHAVE = ['periodo', 'id_da_pessoa_entregadora', 'subpraca', 'tipo', 'descricao', 'sequencia']
+DEBITO = Q(tipo__istartswith='deb')
+
+LOTE = 500
+
+
+def refazer_saldos(Financeiro, SaldoRepasse, entregadores):
+    """Extrato inteiro dos entregadores, como em fato.saldos.recalcular."""
+    for inicio in range(0, len(entregadores), LOTE):
+        ids = entregadores[inicio:inicio + LOTE]
+        SaldoRepasse.objects.filter(id_da_pessoa_entregadora__in=ids).delete()
+        somas = Financeiro.objects.filter(id_da_pessoa_entregadora__in=ids).exclude(data_do_repasse=None).values(
+            'id_da_pessoa_entregadora', 'data_do_repasse'
+        ).annotate(
+            lancamentos=Count('id'),
+            creditos=Sum('valor', filter=~DEBITO, default=0),
+            debitos=Sum('valor', filter=DEBITO, default=0),
+        ).order_by('id_da_pessoa_entregadora', 'data_do_repasse')
+
+        novos, saldos = [], {}
+        for linha in somas:
+            liquido = linha['creditos'] - linha['debitos']
+            saldos[linha['id_da_pessoa_entregadora']] = saldos.get(linha['id_da_pessoa_entregadora'], 0) + liquido
+            novos.append(SaldoRepasse(liquido=liquido, saldo=saldos[linha['id_da_pessoa_entregadora']], **linha))
+        SaldoRepasse.objects.bulk_create(novos, batch_size=LOTE)
+
+
+def remover_duplicatas(apps, schema_editor):
+    Financeiro = apps.get_model('fato', 'Financeiro')
+    Origem = apps.get_model('fato', 'Origem')
+    SaldoRepasse = apps.get_model('fato', 'SaldoRepasse')
+
+    # Origem mais nova primeiro: a primeira linha de cada chave fica, as seguintes saem
+    linhas = (
+        Financeiro.objects.filter(data_do_periodo_de_referencia=None)
+        .order_by(*CHAVE, '-origem_doc_id', '-id')
+        .values_list('id', 'origem_doc_id', *CHAVE)
+        .iterator(chunk_size=5000)
+    )
+    remover, por_origem, entregadores = [], Counter(), set()
+    chave_anterior = None
+    for id_linha, origem_id, *chave in linhas:
+        if chave == chave_anterior:
+            remover.append(id_linha)
+            por_origem[origem_id] += 1
+            entregadores.add(chave[1])
+        chave_anterior = chave
+    if not remover:
+        return
+
+    logger.warning(
+        f"Financeiro: {len(remover)} lançamentos sem data de referência importados mais de uma vez serão "
+        f"removidos (por origem: {dict(sorted(por_origem.items()))})."
+    )
+    for inicio in range(0, len(remover), LOTE):
+        Financeiro.objects.filter(id__in=remover[inicio:inicio + LOTE]).delete()
+    for origem_id, quantidade in por_origem.items():
+        Origem.objects.filter(pk=origem_id).update(linhas_importadas=F('linhas_importadas') - quantidade)
+    refazer_saldos(Financeiro, SaldoRepasse, sorted(entregadores))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0017_atividade_coorte'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_duplicatas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='financeiro',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(data_do_periodo_de_referencia__isnull=True),
+                fields=('periodo', 'id_da_pessoa_entregadora', 'subpraca', 'tipo', 'descricao', 'sequencia'),
+                name='financeiro_chave_sem_referencia',
+            ),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Linhas gravadas e atualizadas por bloco, para que um processamento no modo
+# 'atualizar' interrompido no meio seja retomado do primeiro bloco não gravado
+# (ver importacao.importar_arquivo). Blocos antigos ficam com zero: só os blocos
+# da própria origem interrompida são usados na retomada.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fato', '0018_financeiro_chave_sem_referencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blocoorigem',
+            name='linhas_importadas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='blocoorigem',
+            name='linhas_atualizadas',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -4,6 +4,7 @@ from symtable import Class
 from django.db import models
 from app.models import Driver, Subpraca
 from datetime import datetime
+from .conversores import formatar_centavos, formatar_duracao
 import os
 
 import os
@@ -31,9 +32,20 @@ class Origem(models.Model):
     linhas_importadas = models.IntegerField(default=0)  # Quantidade de registros bem-sucedidos
     linhas_com_erro = models.IntegerField(default=0)  # Quantidade de registros com erro
     timestamp = models.DateTimeField(auto_now_add=True)  # Data e hora da importação
+    # SHA-256 do conteúdo: o mesmo arquivo (mesmo renomeado) não é importado duas vezes
+    hash_sha256 = models.CharField(max_length=64, unique=True, null=True, blank=True)
+    # Linhas rejeitadas (linha, coluna, motivo, valor), na mesma pasta do arquivo importado
+    arquivo_rejeicoes = models.FileField(upload_to=upload_to, blank=True, null=True)
+    erros_por_tipo = models.JSONField(default=dict, blank=True)  # Motivo -> quantidade de rejeições
+    # Cópia em Parquet das linhas gravadas, um arquivo por data (ver fato.colunar)
+    arquivos_colunares = models.JSONField(default=list, blank=True)
+    # Menor e maior data das linhas gravadas; define quais relatórios em cache a origem invalida (ver fato.cache)
+    data_inicial = models.DateField(null=True, blank=True)
+    data_final = models.DateField(null=True, blank=True)
+    # Quando as datas da origem foram conciliadas entre Performance e Financeiro (ver fato.conciliacao)
+    conciliada_em = models.DateTimeField(null=True, blank=True)
 
     class Meta:
-        unique_together = ('nome', 'filial', 'tipo')  # Garante que 'nome' e 'filial' sejam únicos juntos
         verbose_name = "Origem"
         verbose_name_plural = "Origem"
 
@@ -47,11 +59,125 @@ class Origem(models.Model):
     def __str__(self):
         return f"{self.filial} - {self.nome}"
 
+class BlocoOrigem(models.Model):
+    """
+    Impressão digital de cada bloco de linhas lido de uma origem. Permite que um
+    arquivo reenviado só com linhas a mais importe apenas os blocos novos, e que uma
+    importação interrompida seja retomada depois do último bloco gravado.
+    """
+    origem = models.ForeignKey(Origem, on_delete=models.CASCADE, related_name='blocos')
+    indice = models.IntegerField()  # Posição do bloco no arquivo (0, 1, 2...)
+    linhas = models.IntegerField()
+    tamanho_chunk = models.IntegerField()  # Blocos só são comparáveis com o mesmo tamanho de leitura
+    hash_sha256 = models.CharField(max_length=64)
+    linhas_importadas = models.IntegerField(default=0)  # Gravadas pelo bloco; usadas para retomar a importação
+    linhas_atualizadas = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('origem', 'indice')
+        verbose_name = "Bloco da Origem"
+        verbose_name_plural = "Blocos da Origem"
+
+    def __str__(self):
+        return f"{self.origem} - bloco {self.indice}"
+
+
+class Processamento(models.Model):
+    """Importação em segundo plano de um arquivo já salvo em Origem.arquivo."""
+    MODOS = [
+        ('inserir', 'Inserir linhas'),
+        ('atualizar', 'Atualizar pela chave natural'),
+    ]
+    STATUS = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+
+    origem = models.ForeignKey(Origem, on_delete=models.SET_NULL, null=True, blank=True, related_name='processamentos')
+    nome_arquivo = models.CharField(max_length=255)  # Mantido mesmo se a origem for removida
+    status = models.CharField(max_length=20, choices=STATUS, default='pendente', db_index=True)
+    linhas_lidas = models.IntegerField(default=0)
+    linhas_importadas = models.IntegerField(default=0)
+    linhas_com_erro = models.IntegerField(default=0)
+    linhas_ignoradas = models.IntegerField(default=0)  # Linhas já importadas (blocos repetidos ou sem alteração)
+    linhas_atualizadas = models.IntegerField(default=0)  # Linhas existentes alteradas no modo 'atualizar'
+    apenas_blocos_novos = models.BooleanField(default=False)  # Reenvio de arquivo com linhas adicionadas
+    modo = models.CharField(max_length=20, choices=MODOS, default='inserir')
+    mensagem = models.TextField(blank=True, default='')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    finalizado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Processamento"
+        verbose_name_plural = "Processamentos"
+        ordering = ('-criado_em',)
+
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.get_status_display()})"
+
+    @property
+    def url_rejeicoes(self):
+        """Link para o relatório de linhas rejeitadas, quando houver."""
+        if self.origem_id and self.origem.arquivo_rejeicoes:
+            return self.origem.arquivo_rejeicoes.url
+        return ''
+
+    def como_dict(self):
+        """Representação usada pelo endpoint de progresso."""
+        return {
+            'id': self.id,
+            'arquivo': self.nome_arquivo,
+            'status': self.status,
+            'status_display': self.get_status_display(),
+            'linhas_lidas': self.linhas_lidas,
+            'linhas_importadas': self.linhas_importadas,
+            'linhas_com_erro': self.linhas_com_erro,
+            'linhas_ignoradas': self.linhas_ignoradas,
+            'linhas_atualizadas': self.linhas_atualizadas,
+            'mensagem': self.mensagem,
+            'url_rejeicoes': self.url_rejeicoes,
+            'finalizado': self.status in ('concluido', 'erro'),
+        }
+
+
+class Exclusao(models.Model):
+    """
+    Remoção em segundo plano de uma Origem: as linhas de fato são apagadas em lotes
+    por id e a origem (com o arquivo) só é removida no fim.
+    """
+    origem = models.ForeignKey(Origem, on_delete=models.SET_NULL, null=True, blank=True, related_name='exclusoes')
+    nome_origem = models.CharField(max_length=255)  # Mantido depois que a origem é removida
+    status = models.CharField(max_length=20, choices=Processamento.STATUS, default='pendente', db_index=True)
+    linhas_total = models.IntegerField(default=0)  # Linhas de fato da origem no início da exclusão
+    linhas_excluidas = models.IntegerField(default=0)
+    mensagem = models.TextField(blank=True, default='')
+    criado_em = models.DateTimeField(auto_now_add=True)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    finalizado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Exclusão"
+        verbose_name_plural = "Exclusões"
+        ordering = ('-criado_em',)
+
+    def __str__(self):
+        return f"{self.nome_origem} ({self.get_status_display()})"
+
+    @property
+    def percentual(self):
+        if not self.linhas_total:
+            return 100 if self.status == 'concluido' else 0
+        return round(100 * self.linhas_excluidas / self.linhas_total)
+
+
 class Performance(models.Model):
     origem_doc = models.ForeignKey(Origem, on_delete=models.CASCADE)
     data_do_periodo = models.DateField()
     periodo = models.CharField(max_length=255)
-    duracao_do_periodo = models.CharField(max_length=255)
+    duracao_do_periodo = models.IntegerField(default=0)  # Em segundos
     numero_minimo_de_entregadores_regulares_na_escala = models.IntegerField()
     tag = models.CharField(max_length=255)
     id_da_pessoa_entregadora = models.CharField(max_length=255)
@@ -59,30 +185,116 @@ class Performance(models.Model):
     praca = models.CharField(max_length=255)
     sub_praca = models.CharField(max_length=255)
     origem = models.CharField(max_length=255)
-    tempo_disponivel_escalado = models.CharField(max_length=255)  # Campo mantido como CharField
-    tempo_disponivel_absoluto = models.CharField(max_length=255)  # Campo mantido como CharField
+    tempo_disponivel_escalado = models.DecimalField(max_digits=6, decimal_places=2, default=0)  # Percentual
+    tempo_disponivel_absoluto = models.IntegerField(default=0)  # Em segundos
     numero_de_corridas_ofertadas = models.IntegerField()
     numero_de_corridas_aceitas = models.IntegerField()
     numero_de_corridas_rejeitadas = models.IntegerField()
     numero_de_corridas_completadas = models.IntegerField()
     numero_de_corridas_canceladas_pela_pessoa_entregadora = models.IntegerField()
     numero_de_pedidos_aceitos_e_concluidos = models.IntegerField()
-    soma_das_taxas_das_corridas_aceitas = models.CharField(max_length=255)
+    soma_das_taxas_das_corridas_aceitas = models.IntegerField(default=0)  # Em centavos
+    # Ocorrência da mesma chave natural dentro do arquivo (o export repete data/período/entregador/sub-praça)
+    sequencia = models.IntegerField(default=0)
 
 
     def __str__(self):
         return f"Performance {self.id} - {self.sub_praca}"
 
+    @property
+    def tempo_disponivel_formatado(self):
+        return formatar_duracao(self.tempo_disponivel_absoluto)
+
     class Meta:
         verbose_name = "Performance"
         verbose_name_plural = "Performance"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['data_do_periodo', 'periodo', 'id_da_pessoa_entregadora', 'sub_praca', 'sequencia'],
+                name='performance_chave_natural',
+            ),
+        ]
+
+
+class PerformanceDiaria(models.Model):
+    """
+    Performance somada por entregador, dia e sub-praça. Mantida pela importação e pela
+    exclusão de origens (ver fato.agregados); refeita com `manage.py reconstruir_performance_diaria`.
+    """
+    id_da_pessoa_entregadora = models.CharField(max_length=255)
+    data_do_periodo = models.DateField()
+    sub_praca = models.CharField(max_length=255)
+    pessoa_entregadora = models.CharField(max_length=255)
+    periodos = models.IntegerField(default=0)  # Linhas de Performance somadas
+    duracao_do_periodo = models.IntegerField(default=0)  # Em segundos
+    tempo_disponivel_absoluto = models.IntegerField(default=0)  # Em segundos
+    numero_de_corridas_ofertadas = models.IntegerField(default=0)
+    numero_de_corridas_aceitas = models.IntegerField(default=0)
+    numero_de_corridas_rejeitadas = models.IntegerField(default=0)
+    numero_de_corridas_completadas = models.IntegerField(default=0)
+    numero_de_corridas_canceladas_pela_pessoa_entregadora = models.IntegerField(default=0)
+    numero_de_pedidos_aceitos_e_concluidos = models.IntegerField(default=0)
+    soma_das_taxas_das_corridas_aceitas = models.IntegerField(default=0)  # Em centavos
+
+    def __str__(self):
+        return f"{self.id_da_pessoa_entregadora} - {self.data_do_periodo} - {self.sub_praca}"
+
+    @property
+    def tempo_disponivel_formatado(self):
+        return formatar_duracao(self.tempo_disponivel_absoluto)
+
+    class Meta:
+        verbose_name = "Performance diária"
+        verbose_name_plural = "Performance diária"
+        constraints = [
+            models.UniqueConstraint(
+                fields=['id_da_pessoa_entregadora', 'data_do_periodo', 'sub_praca'],
+                name='performance_diaria_chave',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['data_do_periodo'], name='performance_diaria_data_idx'),
+        ]
+
+
+class CuboPerformance(models.Model):
+    """
+    Medidas somáveis da Performance pré-agregadas em vários grãos (ver fato.cubo).
+    Dimensões fora do grão ficam vazias; `data` é o dia, a segunda-feira da semana ou o
+    primeiro dia do mês, conforme o grão.
+    """
+    grao = models.CharField(max_length=30)
+    data = models.DateField()
+    praca = models.CharField(max_length=255, blank=True, default='')
+    sub_praca = models.CharField(max_length=255, blank=True, default='')
+    periodo = models.CharField(max_length=255, blank=True, default='')
+    linhas = models.IntegerField(default=0)
+    duracao_do_periodo = models.BigIntegerField(default=0)  # Em segundos
+    tempo_disponivel_absoluto = models.BigIntegerField(default=0)  # Em segundos
+    numero_de_corridas_ofertadas = models.BigIntegerField(default=0)
+    numero_de_corridas_aceitas = models.BigIntegerField(default=0)
+    numero_de_corridas_rejeitadas = models.BigIntegerField(default=0)
+    numero_de_corridas_completadas = models.BigIntegerField(default=0)
+    numero_de_corridas_canceladas_pela_pessoa_entregadora = models.BigIntegerField(default=0)
+    numero_de_pedidos_aceitos_e_concluidos = models.BigIntegerField(default=0)
+    soma_das_taxas_das_corridas_aceitas = models.BigIntegerField(default=0)  # Em centavos
+
+    def __str__(self):
+        return f"{self.grao} {self.data} {self.praca} {self.sub_praca} {self.periodo}".strip()
+
+    class Meta:
+        verbose_name = "Cubo de Performance"
+        verbose_name_plural = "Cubo de Performance"
+        constraints = [
+            models.UniqueConstraint(fields=['grao', 'data', 'praca', 'sub_praca', 'periodo'], name='cubo_performance_chave'),
+        ]
 
 
 class Financeiro(models.Model):
     origem_doc = models.ForeignKey(Origem, on_delete=models.CASCADE)
-    data_do_lancamento_financeiro = models.CharField(max_length=255, null=True, blank=True)
-    data_do_periodo_de_referencia = models.CharField(max_length=255, null=True, blank=True)
-    data_do_repasse = models.CharField(max_length=255, null=True, blank=True)
+    data_do_lancamento_financeiro = models.DateField(null=True, blank=True)
+    data_do_periodo_de_referencia = models.DateField(null=True, blank=True)
+    data_do_repasse = models.DateField(null=True, blank=True)
     periodo = models.CharField(max_length=255)
     praca = models.CharField(max_length=255)
     subpraca = models.CharField(max_length=255)
@@ -90,24 +302,174 @@ class Financeiro(models.Model):
     id_da_pessoa_entregadora = models.CharField(max_length=255)
     recebedor = models.CharField(max_length=255)
     tipo = models.CharField(max_length=255)
-    valor = models.CharField(max_length=255)
+    valor = models.IntegerField(default=0)  # Em centavos
     descricao = models.TextField()
     atingido = models.CharField(max_length=255)
-    percentual_de_tempo_disponivel = models.CharField(max_length=255)
-    percentual_de_aceitacao = models.CharField(max_length=255)
-    percentual_de_conclusao = models.CharField(max_length=255)
+    percentual_de_tempo_disponivel = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    percentual_de_aceitacao = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    percentual_de_conclusao = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
     criterio_tempo_disponivel = models.CharField(max_length=255)
     criterio_rotas_aceitas = models.CharField(max_length=255)
     criterio_rotas_concluidas = models.CharField(max_length=255)
     margem_fee_porcentagem = models.CharField(max_length=255)
+    sequencia = models.IntegerField(default=0)  # Ocorrência da mesma chave natural dentro do arquivo
 
 
     def __str__(self):
         return f"Financeiro {self.id} - {self.subpraca}"
 
+    @property
+    def valor_formatado(self):
+        return formatar_centavos(self.valor)
+
     class Meta:
         verbose_name = "Financeiro"
         verbose_name_plural = "Financeiro"
+        indexes = [
+            # Totais por entregador e por repasse (GROUP BY id_da_pessoa_entregadora, data_do_repasse)
+            models.Index(fields=['id_da_pessoa_entregadora', 'data_do_repasse'], name='financeiro_pessoa_repasse_idx'),
+            models.Index(fields=['data_do_repasse'], name='financeiro_repasse_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['data_do_periodo_de_referencia', 'periodo', 'id_da_pessoa_entregadora', 'subpraca', 'tipo',
+                        'descricao', 'sequencia'],
+                name='financeiro_chave_natural',
+            ),
+            # O SQLite (e o PostgreSQL) tratam NULLs como distintos no índice acima: sem este,
+            # lançamentos sem data de referência poderiam ser gravados duas vezes
+            models.UniqueConstraint(
+                fields=['periodo', 'id_da_pessoa_entregadora', 'subpraca', 'tipo', 'descricao', 'sequencia'],
+                condition=models.Q(data_do_periodo_de_referencia__isnull=True),
+                name='financeiro_chave_sem_referencia',
+            ),
+        ]
+
+class EsbocoQuantis(models.Model):
+    """
+    Esboço de quantis de uma métrica num dia e sub-praça (ver fato.quantis). Mantido
+    junto com o cubo; refeito com `manage.py reconstruir_cubo`.
+    """
+    metrica = models.CharField(max_length=50)
+    data = models.DateField()
+    sub_praca = models.CharField(max_length=255)
+    contagem = models.IntegerField(default=0)  # Observações no esboço
+    esboco = models.JSONField(default=dict)  # {'zeros': n, 'baldes': {índice: contagem}}
+
+    def __str__(self):
+        return f"{self.metrica} - {self.data} - {self.sub_praca}"
+
+    class Meta:
+        verbose_name = "Esboço de quantis"
+        verbose_name_plural = "Esboços de quantis"
+        constraints = [
+            models.UniqueConstraint(fields=['metrica', 'data', 'sub_praca'], name='esboco_quantis_chave'),
+        ]
+        indexes = [
+            models.Index(fields=['data'], name='esboco_quantis_data_idx'),
+        ]
+
+
+class AtividadeCoorte(models.Model):
+    """
+    Entregadores de uma data de ingresso na franquia (Driver.dt_franquia) que rodaram
+    numa semana, e o tempo disponível deles (ver fato.coortes). Mantida junto com o
+    cubo; refeita com `manage.py reconstruir_coortes`.
+    """
+    entrada = models.DateField()  # dt_franquia
+    semana = models.DateField()  # Segunda-feira da semana de atividade
+    entregadores = models.IntegerField(default=0)
+    segundos = models.BigIntegerField(default=0)  # Tempo disponível absoluto somado
+
+    def __str__(self):
+        return f"{self.entrada} - {self.semana}"
+
+    class Meta:
+        verbose_name = "Atividade da coorte"
+        verbose_name_plural = "Coortes de entregadores"
+        constraints = [
+            models.UniqueConstraint(fields=['entrada', 'semana'], name='atividade_coorte_chave'),
+        ]
+        indexes = [
+            models.Index(fields=['semana'], name='atividade_coorte_semana_idx'),
+        ]
+
+
+class SaldoRepasse(models.Model):
+    """
+    Extrato do Financeiro por entregador e data do repasse, com o saldo acumulado.
+    Mantido pela importação e pela exclusão de origens (ver fato.saldos); refeito com
+    `manage.py reconstruir_saldos`.
+    """
+    id_da_pessoa_entregadora = models.CharField(max_length=255)
+    data_do_repasse = models.DateField()
+    lancamentos = models.IntegerField(default=0)  # Linhas do Financeiro somadas
+    creditos = models.BigIntegerField(default=0)  # Em centavos
+    debitos = models.BigIntegerField(default=0)  # Em centavos, positivo
+    liquido = models.BigIntegerField(default=0)  # creditos - debitos: o valor do repasse
+    saldo = models.BigIntegerField(default=0)  # Soma dos líquidos até esta data, inclusive
+
+    def __str__(self):
+        return f"{self.id_da_pessoa_entregadora} - {self.data_do_repasse}"
+
+    @property
+    def liquido_formatado(self):
+        return formatar_centavos(self.liquido)
+
+    @property
+    def saldo_formatado(self):
+        return formatar_centavos(self.saldo)
+
+    class Meta:
+        verbose_name = "Saldo de repasse"
+        verbose_name_plural = "Saldos de repasse"
+        constraints = [
+            # Também é o índice das consultas de extrato (entregador, intervalo de datas)
+            models.UniqueConstraint(fields=['id_da_pessoa_entregadora', 'data_do_repasse'], name='saldo_repasse_chave'),
+        ]
+        indexes = [
+            models.Index(fields=['data_do_repasse'], name='saldo_repasse_data_idx'),
+        ]
+
+class Divergencia(models.Model):
+    """
+    Diferença entre Performance e Financeiro num entregador-dia-período (ver
+    fato.conciliacao). Refeita a cada importação ou exclusão que toca a data.
+    """
+    FALTANDO = 'faltando'
+    SOBRANDO = 'sobrando'
+    VALOR = 'valor'
+    TIPOS = [
+        (FALTANDO, 'Sem crédito no Financeiro'),
+        (SOBRANDO, 'Crédito sem corridas na Performance'),
+        (VALOR, 'Valor divergente'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    id_da_pessoa_entregadora = models.CharField(max_length=255)
+    data = models.DateField()  # data_do_periodo / data_do_periodo_de_referencia
+    periodo = models.CharField(max_length=255)  # Vazio: crédito sem período, conciliado no nível do dia
+    corridas_completadas = models.IntegerField(default=0)
+    valor_performance = models.BigIntegerField(default=0)  # Soma das taxas das corridas, em centavos
+    valor_financeiro = models.BigIntegerField(default=0)  # Créditos, em centavos
+    diferenca = models.BigIntegerField(default=0)  # valor_financeiro - valor_performance
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} - {self.id_da_pessoa_entregadora} - {self.data} - {self.periodo}"
+
+    @property
+    def diferenca_formatada(self):
+        return formatar_centavos(self.diferenca)
+
+    class Meta:
+        verbose_name = "Divergência"
+        verbose_name_plural = "Divergências"
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'id_da_pessoa_entregadora', 'periodo'], name='divergencia_chave'),
+        ]
+        indexes = [
+            models.Index(fields=['id_da_pessoa_entregadora', 'data'], name='divergencia_pessoa_data_idx'),
+        ]
 
 #fato/Driver
 class Entregador(models.Model):
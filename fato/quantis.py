@@ -0,0 +1,107 @@
+#fato/quantis.py
+"""
+Medianas e percentis sem ler as linhas de fato: um esboço de quantis por dia ×
+sub-praça para cada métrica, guardado em EsbocoQuantis e somado na hora da consulta.
+
+O esboço é um histograma de baldes logarítmicos (no estilo do DDSketch): cada valor
+positivo cai no balde ceil(log(v) / log(GAMA)), e qualquer quantil estimado fica a no
+máximo PRECISAO (1%) do valor exato. Juntar dois esboços é somar as contagens dos
+baldes, então dias viram semanas e meses, e sub-praças viram praças, sem perda além
+desse 1%. Zeros são contados à parte.
+
+Os esboços das datas importadas ou excluídas são refeitos junto com o cubo (ver
+fato.cubo.atualizar_cubo); a consulta é fato.cubo.consultar_quantis.
+"""
+import math
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from .models import EsbocoQuantis, Performance, PerformanceDiaria
+
+LOTE_DATAS = 31  # Datas lidas por vez ao refazer os esboços
+
+PRECISAO = 0.01  # Erro relativo máximo de um quantil estimado
+GAMA = (1 + PRECISAO) / (1 - PRECISAO)
+LOG_GAMA = math.log(GAMA)
+
+# Métrica -> (modelo, coluna de valor). Uma observação por linha do modelo:
+# tempo disponível por período escalado, corridas completadas por entregador-dia
+METRICAS = {
+    'tempo_disponivel_absoluto': (Performance, 'tempo_disponivel_absoluto'),
+    'corridas_por_entregador': (PerformanceDiaria, 'numero_de_corridas_completadas'),
+}
+
+
+class Esboco:
+    """Histograma logarítmico mesclável; `baldes` é {índice: contagem}."""
+
+    def __init__(self, baldes=None, zeros=0):
+        self.baldes = defaultdict(int, baldes or {})
+        self.zeros = zeros
+
+    @property
+    def contagem(self):
+        return self.zeros + sum(self.baldes.values())
+
+    @classmethod
+    def de_valores(cls, valores):
+        valores = np.asarray(valores, dtype='float64')
+        positivos = valores[valores > 0]
+        indices, contagens = np.unique(np.ceil(np.log(positivos) / LOG_GAMA).astype('int64'), return_counts=True)
+        return cls(dict(zip(indices.tolist(), contagens.tolist())), zeros=int((valores <= 0).sum()))
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Inverso de como_dict (as chaves do JSON voltam como texto)."""
+        return cls({int(indice): contagem for indice, contagem in dados['baldes'].items()}, dados['zeros'])
+
+    def como_dict(self):
+        return {'zeros': self.zeros, 'baldes': {str(indice): contagem for indice, contagem in sorted(self.baldes.items())}}
+
+    def juntar(self, outro):
+        self.zeros += outro.zeros
+        for indice, contagem in outro.baldes.items():
+            self.baldes[indice] += contagem
+        return self
+
+    def quantil(self, q):
+        """Valor na posição q (0 a 1) dos dados, como no pandas com interpolation='lower'; None se vazio."""
+        contagem = self.contagem
+        if not contagem:
+            return None
+        posicao = math.floor(q * (contagem - 1))
+        if posicao < self.zeros:
+            return 0
+        acumulado = self.zeros
+        for indice in sorted(self.baldes):
+            acumulado += self.baldes[indice]
+            if acumulado > posicao:
+                # Ponto do balde com o mesmo erro relativo para os dois limites
+                return 2 * GAMA ** indice / (GAMA + 1)
+        return None
+
+
+def observacoes(metrica, datas):
+    """DataFrame (data, sub_praca, valor) da métrica nas datas."""
+    modelo, coluna = METRICAS[metrica]
+    linhas = modelo.objects.filter(data_do_periodo__in=datas).values_list('data_do_periodo', 'sub_praca', coluna)
+    return pd.DataFrame(list(linhas.order_by()), columns=['data', 'sub_praca', 'valor'])
+
+
+def atualizar_esbocos(datas):
+    """Refaz os esboços de todas as métricas nas datas. Chamado por fato.cubo.atualizar_cubo, na mesma transação."""
+    datas = sorted(set(datas))
+    for inicio in range(0, len(datas), LOTE_DATAS):
+        lote = datas[inicio:inicio + LOTE_DATAS]
+        EsbocoQuantis.objects.filter(data__in=lote).delete()
+        novos = []
+        for metrica in METRICAS:
+            for (data, sub_praca), grupo in observacoes(metrica, lote).groupby(['data', 'sub_praca']):
+                esboco = Esboco.de_valores(grupo['valor'].to_numpy())
+                novos.append(EsbocoQuantis(
+                    metrica=metrica, data=data, sub_praca=sub_praca, contagem=esboco.contagem,
+                    esboco=esboco.como_dict(),
+                ))
+        EsbocoQuantis.objects.bulk_create(novos, batch_size=500)
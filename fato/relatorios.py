@@ -0,0 +1,174 @@
+#fato/relatorios.py
+"""
+Consultas agregadas sobre as tabelas de fato, feitas direto no banco.
+"""
+from datetime import timedelta
+
+import pandas as pd
+from django.db.models import Case, Count, F, IntegerField, Max, Sum, Value, When, Window
+from django.db.models.functions import RowNumber
+
+from app.models import Driver
+
+from .cache import em_cache
+from .exportacao import abas_de_dataframes, escrever_xlsx
+from .models import Financeiro, Performance
+from .saldos import VALOR_COM_SINAL
+
+# Performance guarda segundos; o relatório sai em horas decimais, e o cabeçalho das colunas diz a unidade
+SEGUNDOS_POR_HORA = 3600
+
+# date.weekday(): 0 = segunda. Os nomes seguem o relatório antigo (dt.day_name())
+DIAS_DA_SEMANA = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Agrupamentos do relatório de horas: (rótulo da coluna, chave do período de uma data, sufixo das abas)
+AGRUPAMENTOS = [
+    ('Dia da Semana', lambda data: data.weekday(), 'Semana'),
+    ('Dia do Mês', lambda data: data.day, 'Mês'),
+]
+
+def totais_por_repasse(inicio=None, fim=None, id_da_pessoa_entregadora=None):
+    """
+    Total em centavos por entregador e data do repasse, num único GROUP BY
+    (coberto pelo índice financeiro_pessoa_repasse_idx).
+    """
+    financeiro = Financeiro.objects.all()
+    if inicio:
+        financeiro = financeiro.filter(data_do_repasse__gte=inicio)
+    if fim:
+        financeiro = financeiro.filter(data_do_repasse__lte=fim)
+    if id_da_pessoa_entregadora:
+        financeiro = financeiro.filter(id_da_pessoa_entregadora=id_da_pessoa_entregadora)
+
+    return (
+        financeiro.values('id_da_pessoa_entregadora', 'data_do_repasse')
+        .annotate(total=Sum(VALOR_COM_SINAL), lancamentos=Count('id'))
+        .order_by('id_da_pessoa_entregadora', 'data_do_repasse')
+    )
+
+
+def entregadores_ativos():
+    """Entregadores considerados no relatório de horas (substitui a planilha de drivers da franquia)."""
+    return Driver.objects.filter(is_active=True).exclude(uuid=None)
+
+
+def datas_por_periodo(inicio, fim, chave_da_data):
+    """{chave: [datas]} de todas as datas entre inicio e fim (ex.: dia da semana -> as segundas do mês)."""
+    periodos = {}
+    for dias in range((fim - inicio).days + 1):
+        data = inicio + timedelta(days=dias)
+        periodos.setdefault(chave_da_data(data), []).append(data)
+    return dict(sorted(periodos.items()))
+
+
+def chave_do_periodo(periodos):
+    """
+    Expressão SQL com a chave do período de cada linha. Um CASE sobre listas de datas,
+    em vez de extrair dia/semana da data: no SQLite a extração é uma função Python por linha.
+    """
+    return Case(
+        *[When(data_do_periodo__in=datas, then=Value(chave)) for chave, datas in periodos.items()],
+        output_field=IntegerField(),
+    )
+
+
+def medianas_por_periodo(performance, periodos):
+    """
+    {chave: mediana do tempo_disponivel_absoluto em segundos} das linhas de cada período,
+    calculada no banco: numera as linhas de cada período pelo tempo (ROW_NUMBER) e traz só
+    a do meio, ou as duas do meio quando a quantidade é par, como o median do pandas.
+    """
+    chave = chave_do_periodo(periodos)
+    ordenadas = performance.annotate(chave=chave).annotate(
+        posicao=Window(RowNumber(), partition_by=[F('chave')], order_by=F('tempo_disponivel_absoluto').asc()),
+        linhas=Window(Count('id'), partition_by=[F('chave')]),
+    )
+    meio = ordenadas.filter(posicao__gte=(F('linhas') + 1) / 2, posicao__lte=F('linhas') / 2 + 1)
+    medianas = {}
+    for chave, tempo in meio.values_list('chave', 'tempo_disponivel_absoluto'):
+        medianas.setdefault(chave, []).append(tempo)
+    return {chave: sum(tempos) / len(tempos) for chave, tempos in medianas.items()}
+
+
+def versao_dos_entregadores():
+    """Muda quando a lista de entregadores ativos muda (entra na chave do cache do relatório de horas)."""
+    ativos = entregadores_ativos().aggregate(quantidade=Count('pk'), ultimo=Max('pk'))
+    return f"{ativos['ultimo']}.{ativos['quantidade']}"
+
+
+def relatorio_horas(inicio, fim, filial=None, entregadores=None):
+    """
+    relatorio_horas_calculado, lido do cache (fato.cache) enquanto nenhuma importação
+    tocar o intervalo. Com uma lista própria de `entregadores`, sempre recalcula.
+    """
+    if entregadores is not None:
+        return relatorio_horas_calculado(inicio, fim, filial, entregadores)
+    return em_cache(
+        'relatorio_horas', lambda: relatorio_horas_calculado(inicio, fim, filial),
+        ['performance'], inicio, fim, filial, versao_extra=versao_dos_entregadores(),
+    )
+
+
+def relatorio_horas_calculado(inicio, fim, filial=None, entregadores=None):
+    """
+    Horas entregues e entregadores que rodaram/não rodaram por dia da semana e por dia
+    do mês, no formato das abas do relatório antigo (analise.py). Retorna {aba: DataFrame}.
+
+    Somas e contagens saem de um GROUP BY por agrupamento, e as medianas de uma consulta
+    com ROW_NUMBER por agrupamento (ver medianas_por_periodo); "não rodaram" é um anti-join
+    (NOT IN) da lista de entregadores com quem rodou no período, uma consulta por período.
+    Os tempos saem em horas (o analise.py somava o valor bruto da planilha), com a unidade
+    no cabeçalho das colunas.
+    """
+    entregadores = entregadores if entregadores is not None else entregadores_ativos()
+    performance = Performance.objects.filter(
+        data_do_periodo__range=(inicio, fim),
+        id_da_pessoa_entregadora__in=entregadores.values('uuid'),
+    )
+    if filial:
+        performance = performance.filter(origem_doc__filial=filial)
+
+    abas = {}
+    for rotulo, chave_da_data, sufixo in AGRUPAMENTOS:
+        periodos = datas_por_periodo(inicio, fim, chave_da_data)
+        totais = pd.DataFrame(list(
+            performance.annotate(chave=chave_do_periodo(periodos)).values('chave').annotate(
+                horas=Sum('tempo_disponivel_absoluto'),
+                linhas=Count('id'),
+                rodaram=Count('id_da_pessoa_entregadora', distinct=True),
+            ).order_by('chave')
+        ), columns=['chave', 'horas', 'linhas', 'rodaram'])
+        medianas = medianas_por_periodo(performance, periodos)
+
+        nao_rodaram = [
+            entregadores.exclude(
+                uuid__in=performance.filter(data_do_periodo__in=periodos[chave]).values('id_da_pessoa_entregadora')
+            ).count()
+            for chave in totais['chave']
+        ]
+
+        rotulos = totais['chave'].map(DIAS_DA_SEMANA.__getitem__) if sufixo == 'Semana' else totais['chave']
+        abas[f'Horas por {sufixo}'] = pd.DataFrame({
+            rotulo: rotulos,
+            'Total de Horas Entregues (horas)': totais['horas'] / SEGUNDOS_POR_HORA,
+        })
+        abas[f'Rodaram {sufixo}'] = pd.DataFrame({
+            rotulo: rotulos,
+            'Colaboradores Que Rodaram': totais['rodaram'],
+            'Média Rodaram (horas)': totais['horas'] / totais['linhas'] / SEGUNDOS_POR_HORA,
+            'Mediana Rodaram (horas)': totais['chave'].map(medianas) / SEGUNDOS_POR_HORA,
+        })
+        abas[f'Nao Rodaram {sufixo}'] = pd.DataFrame({
+            rotulo: rotulos,
+            'Colaboradores Que Não Rodaram': nao_rodaram,
+        })
+
+    # Mesma ordem de abas do relatório antigo
+    ordem = ['Horas por Semana', 'Horas por Mês', 'Rodaram Semana', 'Nao Rodaram Semana', 'Rodaram Mês',
+             'Nao Rodaram Mês']
+    return {aba: abas[aba] for aba in ordem}
+
+
+def salvar_planilha(abas, destino):
+    """Grava {aba: DataFrame} num .xlsx (caminho ou arquivo aberto), linha a linha (ver fato.exportacao)."""
+    escrever_xlsx(destino, abas_de_dataframes(abas))
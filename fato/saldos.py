@@ -0,0 +1,176 @@
+#fato/saldos.py
+"""
+Extrato do Financeiro por entregador: SaldoRepasse guarda, para cada entregador e data
+do repasse, os créditos, os débitos, o líquido e o saldo acumulado até aquela data.
+
+Como na PerformanceDiaria (fato.agregados), nada é somado aos poucos: cada bloco
+importado (ou faixa excluída) refaz, na mesma transação, as linhas dos entregadores
+tocados a partir da menor data de repasse do bloco; o saldo acumulado continua do
+saldo da linha anterior, que não muda. Importações novas costumam trazer só o último
+repasse, então só o fim de cada extrato é refeito. No modo 'atualizar' uma linha pode
+trocar de data de repasse, e o extrato do entregador é refeito inteiro.
+
+Lançamentos sem data do repasse não entram no extrato.
+"""
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Min, Q, Sum, When
+
+from .models import Financeiro, SaldoRepasse
+
+logger = logging.getLogger(__name__)
+
+LOTE_ENTREGADORES = 500  # Ids por consulta (limite de parâmetros do SQLite)
+
+DESDE_O_INICIO = None  # Data de corte que refaz o extrato inteiro
+
+# Débitos entram negativos nos totais; o export traz o valor sempre positivo
+DEBITO = Q(tipo__istartswith='deb')
+VALOR_COM_SINAL = Case(
+    When(DEBITO, then=-F('valor')),
+    default=F('valor'),
+)
+
+SOMAS = {
+    'lancamentos': Count('id'),
+    'creditos': Sum('valor', filter=~DEBITO, default=0),
+    'debitos': Sum('valor', filter=DEBITO, default=0),
+}
+
+
+def chaves_do_bloco(df, desde_o_inicio=False):
+    """{data de corte: {ids}} de um bloco de Financeiro já convertido: a menor data de repasse de cada entregador."""
+    linhas = df[['id_da_pessoa_entregadora', 'data_do_repasse']].dropna()
+    chaves = defaultdict(set)
+    if desde_o_inicio:
+        chaves[DESDE_O_INICIO].update(linhas['id_da_pessoa_entregadora'])
+        return chaves
+    for id_entregador, data in linhas.groupby('id_da_pessoa_entregadora')['data_do_repasse'].min().items():
+        chaves[data].add(id_entregador)
+    return chaves
+
+
+def chaves_das_linhas(linhas):
+    """{data de corte: {ids}} de um queryset de Financeiro."""
+    chaves = defaultdict(set)
+    menores = linhas.exclude(data_do_repasse=None).values('id_da_pessoa_entregadora').annotate(
+        corte=Min('data_do_repasse')
+    ).order_by()
+    for linha in menores:
+        chaves[linha['corte']].add(linha['id_da_pessoa_entregadora'])
+    return chaves
+
+
+def recalcular(corte, ids):
+    """Refaz o extrato dos entregadores `ids` a partir da data `corte` (None: inteiro). Retorna as linhas gravadas."""
+    saldos = SaldoRepasse.objects.filter(id_da_pessoa_entregadora__in=ids)
+    financeiro = Financeiro.objects.filter(id_da_pessoa_entregadora__in=ids).exclude(data_do_repasse=None)
+    anteriores = {}
+    if corte is not DESDE_O_INICIO:
+        anteriores = dict(
+            saldos.filter(data_do_repasse__lt=corte).values('id_da_pessoa_entregadora').annotate(
+                saldo=Sum('liquido')
+            ).values_list('id_da_pessoa_entregadora', 'saldo').order_by()
+        )
+        saldos = saldos.filter(data_do_repasse__gte=corte)
+        financeiro = financeiro.filter(data_do_repasse__gte=corte)
+    saldos.delete()
+
+    somas = financeiro.values('id_da_pessoa_entregadora', 'data_do_repasse').annotate(**SOMAS).order_by(
+        'id_da_pessoa_entregadora', 'data_do_repasse'
+    )
+    novos = []
+    for linha in somas:
+        liquido = linha['creditos'] - linha['debitos']
+        saldo = anteriores.get(linha['id_da_pessoa_entregadora'], 0) + liquido
+        anteriores[linha['id_da_pessoa_entregadora']] = saldo
+        novos.append(SaldoRepasse(liquido=liquido, saldo=saldo, **linha))
+    return len(SaldoRepasse.objects.bulk_create(novos, batch_size=LOTE_ENTREGADORES))
+
+
+def atualizar_saldos(chaves, lote=LOTE_ENTREGADORES):
+    """
+    Refaz os extratos das chaves {data de corte: {ids}}. Deve rodar na transação que
+    alterou o Financeiro, para que os saldos nunca fiquem defasados.
+    """
+    # Um entregador em mais de uma data de corte é refeito só a partir da menor
+    cortes = {}
+    for corte, ids in chaves.items():
+        for id_entregador in ids:
+            anterior = cortes.get(id_entregador, corte)
+            if corte is DESDE_O_INICIO or anterior is DESDE_O_INICIO:
+                cortes[id_entregador] = DESDE_O_INICIO
+            else:
+                cortes[id_entregador] = min(anterior, corte)
+    por_corte = defaultdict(list)
+    for id_entregador, corte in cortes.items():
+        por_corte[corte].append(id_entregador)
+
+    gravadas = 0
+    for corte, ids in por_corte.items():
+        ids.sort()
+        for inicio in range(0, len(ids), lote):
+            gravadas += recalcular(corte, ids[inicio:inicio + lote])
+    return gravadas
+
+
+def reconstruir_saldos(progresso=None, lote=LOTE_ENTREGADORES):
+    """
+    Refaz o SaldoRepasse inteiro, um lote de entregadores por transação.
+    `progresso(entregadores, gravadas)` é chamado depois de cada lote. Retorna o total gravado.
+    """
+    ids = sorted(
+        Financeiro.objects.exclude(data_do_repasse=None).values_list('id_da_pessoa_entregadora', flat=True)
+        .distinct().order_by()
+    )
+    with transaction.atomic():
+        # Entregadores que ficaram só nos saldos (o Financeiro deles foi removido por fora)
+        SaldoRepasse.objects.exclude(id_da_pessoa_entregadora__in=Financeiro.objects.exclude(
+            data_do_repasse=None
+        ).values('id_da_pessoa_entregadora')).delete()
+
+    total = 0
+    for inicio in range(0, len(ids), lote):
+        with transaction.atomic():
+            total += recalcular(DESDE_O_INICIO, ids[inicio:inicio + lote])
+        if progresso:
+            progresso(min(inicio + lote, len(ids)), total)
+    logger.info(f"SaldoRepasse reconstruído: {total} linhas de {len(ids)} entregadores.")
+    return total
+
+
+def saldo_do_repasse(id_da_pessoa_entregadora, data_do_repasse):
+    """
+    Linha do extrato do entregador no repasse da data (créditos, débitos, líquido a
+    repassar e saldo acumulado), ou None se não houve lançamento nesse repasse.
+    """
+    return SaldoRepasse.objects.filter(
+        id_da_pessoa_entregadora=id_da_pessoa_entregadora, data_do_repasse=data_do_repasse,
+    ).first()
+
+
+def saldo_em(id_da_pessoa_entregadora, data):
+    """Saldo acumulado do entregador até a data (inclusive), em centavos."""
+    ultima = SaldoRepasse.objects.filter(
+        id_da_pessoa_entregadora=id_da_pessoa_entregadora, data_do_repasse__lte=data,
+    ).order_by('-data_do_repasse').values_list('saldo', flat=True).first()
+    return ultima or 0
+
+
+def extrato(id_da_pessoa_entregadora, inicio=None, fim=None):
+    """Linhas do extrato do entregador (uma por repasse), em ordem de data."""
+    saldos = SaldoRepasse.objects.filter(id_da_pessoa_entregadora=id_da_pessoa_entregadora)
+    if inicio:
+        saldos = saldos.filter(data_do_repasse__gte=inicio)
+    if fim:
+        saldos = saldos.filter(data_do_repasse__lte=fim)
+    return saldos.order_by('data_do_repasse')
+
+
+def lancamentos_do_repasse(id_da_pessoa_entregadora, data_do_repasse):
+    """Lançamentos do Financeiro que compõem um repasse (índice financeiro_pessoa_repasse_idx)."""
+    return Financeiro.objects.filter(
+        id_da_pessoa_entregadora=id_da_pessoa_entregadora, data_do_repasse=data_do_repasse,
+    ).order_by('data_do_lancamento_financeiro', 'pk')
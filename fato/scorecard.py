@@ -0,0 +1,143 @@
+#fato/scorecard.py
+"""
+Scorecard dos entregadores: KPIs de cada entregador numa janela de datas, com posição e
+percentil dentro da sub-praça.
+
+Tudo sai da PerformanceDiaria (fato.agregados) em duas consultas agrupadas (somas por
+entregador × sub-praça e dias trabalhados por entregador) e de uma leitura dos cadastros
+(Driver.uuid -> sub-praça). As taxas, a posição e os percentis são calculados de uma vez
+sobre as colunas do DataFrame, sem consulta por entregador.
+
+A sub-praça do ranking é a do cadastro do entregador; sem cadastro (ou sem sub-praça no
+cadastro), vale a sub-praça onde ele teve mais tempo disponível na janela.
+"""
+import numpy as np
+import pandas as pd
+from django.db.models import Count, Max, Sum
+
+from app.models import Driver
+
+from .cache import em_cache
+from .models import PerformanceDiaria
+
+SEGUNDOS_POR_HORA = 3600
+
+SOMAS = {
+    'segundos': Sum('tempo_disponivel_absoluto'),
+    'ofertadas': Sum('numero_de_corridas_ofertadas'),
+    'aceitas': Sum('numero_de_corridas_aceitas'),
+    'completadas': Sum('numero_de_corridas_completadas'),
+    'canceladas': Sum('numero_de_corridas_canceladas_pela_pessoa_entregadora'),
+    'taxas': Sum('soma_das_taxas_das_corridas_aceitas'),  # Em centavos
+}
+
+# KPIs com percentil na sub-praça; nos de MENOR_E_MELHOR o percentil é invertido (1 = melhor)
+KPIS = ['horas', 'taxa_de_aceitacao', 'taxa_de_conclusao', 'taxa_de_cancelamento', 'taxas_por_hora']
+MENOR_E_MELHOR = {'taxa_de_cancelamento'}
+
+COLUNAS = [
+    'id_da_pessoa_entregadora', 'nome', 'subpraca', 'cadastrado', 'dias', 'horas', 'ofertadas', 'aceitas',
+    'completadas', 'canceladas', 'taxas', 'taxa_de_aceitacao', 'taxa_de_conclusao', 'taxa_de_cancelamento',
+    'taxas_por_hora', 'posicao', 'entregadores_na_subpraca',
+] + [f'{kpi}_percentil' for kpi in KPIS]
+
+
+def dividir(numerador, denominador):
+    """Divisão coluna a coluna; NaN onde o denominador é zero."""
+    numerador = np.asarray(numerador, dtype='float64')
+    denominador = np.asarray(denominador, dtype='float64')
+    return np.divide(numerador, denominador, out=np.full_like(numerador, np.nan), where=denominador > 0)
+
+
+def somas_por_subpraca(inicio, fim):
+    """Somas da janela por entregador e sub-praça, num GROUP BY."""
+    linhas = PerformanceDiaria.objects.filter(data_do_periodo__range=(inicio, fim)).values(
+        'id_da_pessoa_entregadora', 'sub_praca',
+    ).annotate(nome_no_arquivo=Max('pessoa_entregadora'), **SOMAS).order_by()
+    return pd.DataFrame(list(linhas), columns=['id_da_pessoa_entregadora', 'sub_praca', 'nome_no_arquivo', *SOMAS])
+
+
+def dias_por_entregador(inicio, fim):
+    """Dias com Performance na janela (um dia em duas sub-praças conta uma vez)."""
+    linhas = PerformanceDiaria.objects.filter(data_do_periodo__range=(inicio, fim)).values(
+        'id_da_pessoa_entregadora',
+    ).annotate(dias=Count('data_do_periodo', distinct=True)).order_by()
+    return pd.DataFrame(list(linhas), columns=['id_da_pessoa_entregadora', 'dias']).set_index('id_da_pessoa_entregadora')
+
+
+def cadastros():
+    """uuid -> (nome, sub-praça) dos entregadores cadastrados."""
+    linhas = Driver.objects.exclude(uuid=None).values_list('uuid', 'nome', 'subpraca__nome')
+    return pd.DataFrame(list(linhas), columns=['id_da_pessoa_entregadora', 'nome', 'subpraca_do_cadastro'])
+
+
+def versao_dos_cadastros():
+    """Muda quando um Driver é criado, alterado ou excluído (nome e sub-praça entram no scorecard)."""
+    drivers = Driver.objects.aggregate(quantidade=Count('pk'), atualizado=Max('atualizado_em'))
+    return f"{drivers['atualizado']}.{drivers['quantidade']}"
+
+
+def calcular_kpis(totais):
+    """Acrescenta as taxas ao DataFrame de somas (uma linha por entregador)."""
+    totais['horas'] = totais['segundos'] / SEGUNDOS_POR_HORA
+    totais['taxa_de_aceitacao'] = dividir(totais['aceitas'], totais['ofertadas'])
+    totais['taxa_de_conclusao'] = dividir(totais['completadas'], totais['aceitas'])
+    totais['taxa_de_cancelamento'] = dividir(totais['canceladas'], totais['aceitas'])
+    totais['taxas_por_hora'] = dividir(totais['taxas'] / 100, totais['horas'])  # R$ por hora disponível
+    return totais
+
+
+def classificar(scorecard, ordenar_por):
+    """Posição (pelo KPI `ordenar_por`) e percentil de cada KPI dentro da sub-praça."""
+    grupos = scorecard.groupby('subpraca', dropna=False)
+    scorecard['entregadores_na_subpraca'] = grupos['id_da_pessoa_entregadora'].transform('size')
+    for kpi in KPIS:
+        scorecard[f'{kpi}_percentil'] = grupos[kpi].rank(method='max', pct=True, ascending=kpi not in MENOR_E_MELHOR)
+    scorecard['posicao'] = grupos[ordenar_por].rank(
+        method='min', ascending=ordenar_por in MENOR_E_MELHOR, na_option='bottom',
+    ).astype('int64')
+    return scorecard
+
+
+def scorecard(inicio, fim, ordenar_por='horas'):
+    """
+    scorecard_calculado, lido do cache (fato.cache) enquanto nenhuma importação tocar a
+    janela e nenhum cadastro de entregador mudar.
+    """
+    return em_cache(
+        'scorecard', lambda: scorecard_calculado(inicio, fim, ordenar_por),
+        ['performance'], inicio, fim, parametros=(ordenar_por,), versao_extra=versao_dos_cadastros(),
+    )
+
+
+def scorecard_calculado(inicio, fim, ordenar_por='horas'):
+    """
+    Uma linha por entregador com Performance entre `inicio` e `fim`: horas disponíveis,
+    corridas, taxas de aceitação, conclusão e cancelamento, R$ por hora, e a posição e os
+    percentis (0-1, 1 = melhor) na sub-praça. Ordenado por sub-praça e posição.
+    """
+    if ordenar_por not in KPIS:
+        raise ValueError(f"KPI desconhecido: {ordenar_por}. Opções: {', '.join(KPIS)}")
+
+    por_subpraca = somas_por_subpraca(inicio, fim)
+    if por_subpraca.empty:
+        return pd.DataFrame(columns=COLUNAS)
+
+    # Sub-praça com mais tempo disponível, para quem não tem sub-praça no cadastro
+    principal = por_subpraca.sort_values(['segundos', 'sub_praca'], ascending=[False, True]).drop_duplicates(
+        'id_da_pessoa_entregadora'
+    ).set_index('id_da_pessoa_entregadora')
+
+    totais = por_subpraca.groupby('id_da_pessoa_entregadora')[list(SOMAS)].sum()
+    totais = calcular_kpis(totais.astype('int64'))
+    totais['dias'] = dias_por_entregador(inicio, fim)['dias']
+    totais['sub_praca'] = principal['sub_praca']
+    totais['nome_no_arquivo'] = principal['nome_no_arquivo']
+
+    scorecard = totais.reset_index().merge(cadastros(), on='id_da_pessoa_entregadora', how='left')
+    scorecard['cadastrado'] = scorecard['nome'].notna()
+    scorecard['nome'] = scorecard['nome'].fillna(scorecard['nome_no_arquivo'])
+    scorecard['subpraca'] = scorecard['subpraca_do_cadastro'].fillna(scorecard['sub_praca'])
+
+    scorecard = classificar(scorecard, ordenar_por)
+    return scorecard.sort_values(['subpraca', 'posicao', 'nome'], ignore_index=True)[COLUNAS]
@@ -0,0 +1,67 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from app.models import Driver
+
+from .agregados import atualizar_performance_diaria, chaves_das_linhas
+from .colunar import remover_arquivos_colunares
+from .conciliacao import conciliar_datas, datas_da_origem as datas_para_conciliar
+from .coortes import atualizar_coortes_dos_entregadores
+from .cubo import atualizar_cubo, datas_da_origem
+from .models import Financeiro, Origem, Performance
+from .saldos import atualizar_saldos, chaves_das_linhas as chaves_de_repasse
+
+
+@receiver(pre_delete, sender=Origem)
+def guardar_chaves_diarias(sender, instance, **kwargs):
+    """
+    Um delete() direto da origem apaga a Performance em CASCADE, sem passar por
+    fato.exclusao; as chaves e as datas são guardadas para refazer a PerformanceDiaria,
+    o SaldoRepasse, o cubo e a conciliação depois. (Pela exclusão em lotes, a origem já chega aqui sem linhas.)
+    """
+    instance._chaves_diarias = chaves_das_linhas(Performance.objects.filter(origem_doc=instance))
+    instance._chaves_de_repasse = chaves_de_repasse(Financeiro.objects.filter(origem_doc=instance))
+    instance._datas_do_cubo = datas_da_origem(instance)
+    instance._datas_conciliadas = datas_para_conciliar(instance)
+
+
+@receiver(post_delete, sender=Origem)
+def atualizar_agregados_da_origem(sender, instance, **kwargs):
+    chaves = getattr(instance, '_chaves_diarias', None)
+    if chaves:
+        atualizar_performance_diaria(chaves)
+    chaves = getattr(instance, '_chaves_de_repasse', None)
+    if chaves:
+        atualizar_saldos(chaves)
+    atualizar_cubo(getattr(instance, '_datas_do_cubo', ()))
+    conciliar_datas(getattr(instance, '_datas_conciliadas', ()))
+
+
+@receiver(post_delete, sender=Origem)
+def remover_copia_colunar(sender, instance, **kwargs):
+    """
+    A cópia colunar não é um FileField; sem isto os Parquets de uma origem removida
+    continuariam aparecendo nas leituras de fato.colunar.
+    """
+    transaction.on_commit(lambda: remover_arquivos_colunares(instance))
+
+
+@receiver(pre_save, sender=Driver)
+def guardar_ingresso_anterior(sender, instance, **kwargs):
+    """uuid e dt_franquia antes da edição, para saber se as coortes mudam (ver fato.coortes)."""
+    anterior = sender.objects.filter(pk=instance.pk).values('uuid', 'dt_franquia').first() if instance.pk else None
+    instance._ingresso_anterior = (anterior['uuid'], anterior['dt_franquia']) if anterior else (None, None)
+
+
+@receiver(post_save, sender=Driver)
+def atualizar_coortes_do_driver(sender, instance, **kwargs):
+    uuid_anterior, dt_franquia_anterior = getattr(instance, '_ingresso_anterior', (None, None))
+    if (uuid_anterior, dt_franquia_anterior) != (instance.uuid, instance.dt_franquia):
+        transaction.on_commit(lambda: atualizar_coortes_dos_entregadores([uuid_anterior, instance.uuid]))
+
+
+@receiver(post_delete, sender=Driver)
+def remover_driver_das_coortes(sender, instance, **kwargs):
+    if instance.uuid and instance.dt_franquia:
+        transaction.on_commit(lambda: atualizar_coortes_dos_entregadores([instance.uuid]))
@@ -1,3 +1,1662 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+import openpyxl
+import pandas as pd
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from app.models import Driver, Praca, Subpraca
+
+from . import colunar, importacao
+from .agregados import reconstruir_performance_diaria
+from .cache import cache_de_relatorios, estatisticas_do_cache, zerar_estatisticas
+from .carga import PRAGMAS_SQLITE, sessao_de_carga
+from .coortes import matriz_de_retencao, reconstruir_coortes
+from .conversores import (
+    converter_centavos, converter_centavos_inteiros, converter_datas, converter_datas_opcionais,
+    converter_decimais, converter_decimais_opcionais, converter_duracoes, converter_inteiros, formatar_centavos,
+    formatar_duracao,
+)
+from .conciliacao import divergencias_da_data, faixas_de_entregadores
+from .cubo import (
+    DIMENSOES as DIMENSOES_DO_CUBO, atualizar_cubo_da_origem, consultar_cubo, consultar_quantis, escolher_grao,
+    reconstruir_cubo,
+)
+from .deteccao import FormatoInvalido, detectar_formato
+from .exclusao import excluir_linhas, excluir_origem
+from .exportacao import gerar_csv
+from .importacao import MODELOS, MODO_ATUALIZAR, MOTIVO_JA_IMPORTADA, importar_arquivo
+from .jobs import agendar_exclusao, executar_exclusao, executar_processamento
+from .leitura import abrir_mapa, dividir_em_faixas, ler_faixa
+from .models import (
+    AtividadeCoorte, BlocoOrigem, CuboPerformance, Divergencia, Exclusao, Financeiro, Origem, Performance,
+    PerformanceDiaria, Processamento, SaldoRepasse,
+)
+from .quantis import PRECISAO as PRECISAO_DOS_QUANTIS, Esboco
+from .relatorios import relatorio_horas
+from .saldos import extrato, lancamentos_do_repasse, reconstruir_saldos, saldo_em
+from .scorecard import COLUNAS as COLUNAS_DO_SCORECARD, scorecard, scorecard_calculado
+from .utils import descobrir_csvs, importar_pasta
+from .validacao import validar_arquivo
+
+CAMPOS_FINANCEIRO = [
+    'data_do_lancamento_financeiro', 'data_do_periodo_de_referencia', 'data_do_repasse', 'periodo', 'praca',
+    'subpraca', 'origem', 'id_da_pessoa_entregadora', 'recebedor', 'tipo', 'valor', 'descricao', 'atingido',
+    'percentual_de_tempo_disponivel', 'percentual_de_aceitacao', 'percentual_de_conclusao',
+    'criterio_tempo_disponivel', 'criterio_rotas_aceitas', 'criterio_rotas_concluidas', 'margem_fee_porcentagem',
+]
+
+SUB_PRACA = 'SAO PAULO - PINHEIROS'
+PERIODO = 'ALMOCO 11H30-15H29'
+
+
+def performance(**campos):
+    """Linha de Performance como no export, com os campos informados trocados."""
+    linha = {
+        'data_do_periodo': '2025-01-06', 'periodo': PERIODO, 'duracao_do_periodo': '03:59:00',
+        'numero_minimo_de_entregadores_regulares_na_escala': '10', 'tag': 'REGULAR',
+        'id_da_pessoa_entregadora': 'e1', 'pessoa_entregadora': 'Entregador 1', 'praca': 'SAO PAULO',
+        'sub_praca': SUB_PRACA, 'origem': '', 'tempo_disponivel_escalado': '50.00',
+        'tempo_disponivel_absoluto': '02:00:00', 'numero_de_corridas_ofertadas': '10',
+        'numero_de_corridas_aceitas': '8', 'numero_de_corridas_rejeitadas': '2',
+        'numero_de_corridas_completadas': '7', 'numero_de_corridas_canceladas_pela_pessoa_entregadora': '1',
+        'numero_de_pedidos_aceitos_e_concluidos': '7', 'soma_das_taxas_das_corridas_aceitas': '5000',
+    }
+    linha.update(campos)
+    return linha
+
+
+def financeiro(**campos):
+    """Lançamento do Financeiro como no export, com os campos informados trocados."""
+    linha = dict.fromkeys(CAMPOS_FINANCEIRO, '')
+    linha.update({
+        'data_do_lancamento_financeiro': '2025-01-10', 'data_do_periodo_de_referencia': '2025-01-06',
+        'data_do_repasse': '2025-01-13', 'periodo': PERIODO, 'praca': 'SAO PAULO', 'subpraca': SUB_PRACA,
+        'id_da_pessoa_entregadora': 'e1', 'recebedor': 'Entregador 1', 'tipo': 'Crédito', 'valor': '50,00',
+        'descricao': 'Taxas das corridas',
+    })
+    linha.update(campos)
+    return linha
+
+
+def uuid_de(indice):
+    """UUID fixo para o entregador de número `indice`."""
+    return f'00000000-0000-4000-8000-{indice:012d}'
+
+
+def cadastrar_entregador(indice, **campos):
+    """Driver com o uuid_de(indice) e os campos únicos derivados do índice."""
+    return Driver.objects.create(
+        uuid=uuid_de(indice), nome=f'Entregador {indice}', nacionalidade='BRASILEIRA', cpf=f'{indice:011d}',
+        rg='1', orgao_emissor='SSP', email=f'entregador{indice}@exemplo.com', celular=f'119{indice:08d}',
+        data_nascimento_prestador=date(1990, 1, 1), ticket='1', origem='anuncio', motivo_contato='novo_cadastro',
+        **campos,
+    )
+
+
+def conteudo_da_tabela(modelo):
+    """Linhas da tabela sem o id, em ordem, para comparar com um recálculo."""
+    campos = [campo.attname for campo in modelo._meta.concrete_fields if not campo.primary_key]
+    return sorted(modelo.objects.values_list(*campos))
+
+
+def csv_de(linhas, campos=None, delimitador=';', encoding='utf-8'):
+    """Bytes de um CSV com as linhas (dicionários); as colunas são as da primeira linha."""
+    campos = campos or list(linhas[0])
+    texto = delimitador.join(campos) + '\n'
+    texto += ''.join(delimitador.join(str(linha.get(campo, '')) for campo in campos) + '\n' for linha in linhas)
+    return texto.encode(encoding)
+
+
+class ImportacaoTestCase(TestCase):
+    """Base dos testes que gravam arquivos: MEDIA_ROOT temporário, sem cópia em Parquet e cache limpo."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media = tempfile.mkdtemp()
+        cls.ajustes = override_settings(MEDIA_ROOT=cls.media, IMPORTACAO_ARQUIVO_COLUNAR=False)
+        cls.ajustes.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.ajustes.disable()
+        shutil.rmtree(cls.media, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        cache_de_relatorios().clear()
+
+    def criar_origem(self, conteudo, nome='arquivo.csv', tipo='performance', **campos):
+        return Origem.objects.create(
+            arquivo=ContentFile(conteudo, name=nome), nome=nome, filial='D&G SP', tipo=tipo, **campos,
+        )
+
+    def importar(self, conteudo, nome='arquivo.csv', **opcoes):
+        """Cria a origem e importa o conteúdo na hora (sem o pool de jobs.py). Retorna (origem, resultado)."""
+        arquivo = io.BytesIO(conteudo)
+        formato = detectar_formato(arquivo)
+        origem = self.criar_origem(conteudo, nome, formato.tipo)
+        resultado = importar_arquivo(arquivo, MODELOS[formato.tipo], origem, formato, **opcoes)
+        return origem, resultado
+
+    def processar(self, conteudo, nome='arquivo.csv', **campos):
+        """Cria a origem e roda o Processamento dela como o pool de jobs.py. Retorna o processamento atualizado."""
+        origem = self.criar_origem(conteudo, nome, detectar_formato(io.BytesIO(conteudo)).tipo)
+        processamento = Processamento.objects.create(origem=origem, nome_arquivo=nome, **campos)
+        executar_processamento(processamento.pk)
+        processamento.refresh_from_db()
+        return processamento
+
+    def rejeicoes(self, origem):
+        """Linhas do relatório de rejeições da origem, sem o cabeçalho."""
+        with origem.arquivo_rejeicoes.open('rb') as arquivo:
+            return list(csv.reader(io.StringIO(arquivo.read().decode('utf-8-sig')), delimiter=';'))[1:]
+
+
+class MotorDeImportacaoTests(ImportacaoTestCase):
+
+    def test_importa_o_arquivo_em_blocos(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(5)]
+        origem, resultado = self.importar(csv_de(linhas), chunksize=2)
+
+        self.assertEqual(resultado.linhas_lidas, 5)
+        self.assertEqual(resultado.linhas_importadas, 5)
+        self.assertEqual(Performance.objects.filter(origem_doc=origem).count(), 5)
+        self.assertEqual(BlocoOrigem.objects.filter(origem=origem).count(), 3)
+
+    def test_linha_invalida_e_rejeitada_sem_perder_o_bloco(self):
+        linhas = [performance(), performance(numero_de_corridas_ofertadas='dez'), performance()]
+        _origem, resultado = self.importar(csv_de(linhas))
+
+        self.assertEqual(resultado.linhas_importadas, 2)
+        self.assertEqual(resultado.linhas_com_erro, 1)
+        self.assertEqual(resultado.erros_por_tipo, {'valor inteiro inválido': 1})
+
+    def test_cabecalho_normalizado_e_colunas_extras_ignoradas(self):
+        linha = {' ' + campo.upper() + ' ': valor for campo, valor in performance().items()}
+        linha['COLUNA_NOVA'] = 'x'
+        _origem, resultado = self.importar(csv_de([linha]))
+
+        self.assertEqual(resultado.linhas_importadas, 1)
+        self.assertEqual(Performance.objects.get().sub_praca, SUB_PRACA)
+
+
+class ProcessamentoTests(ImportacaoTestCase):
+
+    def test_importa_e_registra_o_progresso(self):
+        processamento = self.processar(csv_de([performance(), performance(numero_de_corridas_aceitas='x')]))
+
+        self.assertEqual(processamento.status, 'concluido')
+        self.assertEqual(processamento.linhas_lidas, 2)
+        self.assertEqual(processamento.linhas_importadas, 1)
+        self.assertEqual(processamento.linhas_com_erro, 1)
+        self.assertIsNotNone(processamento.finalizado_em)
+        self.assertEqual(processamento.origem.linhas_importadas, 1)
+
+    def test_processamento_so_roda_uma_vez(self):
+        processamento = self.processar(csv_de([performance()]))
+        executar_processamento(processamento.pk)
+
+        self.assertEqual(Performance.objects.count(), 1)
+
+    def test_arquivo_sem_linhas_validas_termina_com_erro(self):
+        processamento = self.processar(csv_de([performance(data_do_periodo='ontem')]))
+
+        self.assertEqual(processamento.status, 'erro')
+        self.assertIn('Nenhuma linha válida', processamento.mensagem)
+
+    def test_envio_e_progresso_exigem_staff(self):
+        processamento = self.processar(csv_de([performance()]))
+        url = reverse('progresso_importacao', args=[processamento.pk])
+
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.assertEqual(self.client.get(reverse('importar_csv')).status_code, 302)
+        resposta = self.client.post(reverse('importar_csv'), {
+            'arquivos': [SimpleUploadedFile('semana.csv', csv_de([performance()]))], 'filial': 'sao_paulo',
+        })
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(Processamento.objects.count(), 1)
+
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['status'], 'concluido')
+
+
+class EnvioTestCase(ImportacaoTestCase):
+    """Base dos testes que enviam arquivos pela página de importação."""
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+
+    def enviar_arquivos(self, arquivos, **campos):
+        """Envia os (nome, conteúdo) num POST só; retorna a resposta depois do redirect."""
+        dados = {
+            'arquivos': [SimpleUploadedFile(nome, conteudo) for nome, conteudo in arquivos],
+            'filial': 'sao_paulo', 'modo': 'inserir', **campos,
+        }
+        return self.client.post(reverse('importar_csv'), dados, follow=True)
+
+    def enviar(self, conteudo, nome='arquivo.csv', **campos):
+        return self.enviar_arquivos([(nome, conteudo)], **campos)
+
+    def mensagens(self, resposta):
+        return ' '.join(str(mensagem) for mensagem in resposta.context['messages'])
+
+
+class DeduplicacaoTests(EnvioTestCase):
+
+    def arquivos_no_storage(self):
+        return sum(len(arquivos) for _pasta, _pastas, arquivos in os.walk(self.media))
+
+    def test_mesmo_conteudo_com_outro_nome_e_recusado(self):
+        conteudo = csv_de([performance()])
+        self.enviar(conteudo, 'semana.csv')
+        resposta = self.enviar(conteudo, 'semana (1).csv')
+
+        self.assertEqual(Origem.objects.count(), 1)
+        self.assertEqual(Processamento.objects.count(), 1)
+        self.assertIn('já foi importado', self.mensagens(resposta))
+
+    def test_envio_simultaneo_nao_deixa_arquivo_orfao(self):
+        conteudo = csv_de([performance()])
+        self.enviar(conteudo)
+        arquivos = self.arquivos_no_storage()
+
+        # A outra requisição grava a origem entre a consulta pelo hash e o INSERT desta
+        with mock.patch.object(Origem.objects, 'filter') as filtro:
+            filtro.return_value.first.return_value = None
+            self.enviar(conteudo, 'copia.csv')
+
+        self.assertEqual(Origem.objects.count(), 1)
+        self.assertEqual(self.arquivos_no_storage(), arquivos)
+
+    def test_reenvio_importa_apenas_os_blocos_novos(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(5)]
+        self.importar(csv_de(linhas[:3]), 'diario.csv', chunksize=2)
+        origem, resultado = self.importar(csv_de(linhas), 'diario.csv', chunksize=2, apenas_blocos_novos=True)
+
+        # O último bloco da versão anterior estava incompleto: o começo dele também é ignorado
+        self.assertEqual(resultado.linhas_ignoradas, 3)
+        self.assertEqual(resultado.linhas_importadas, 2)
+        self.assertEqual(Performance.objects.count(), 5)
+        self.assertEqual(
+            sorted(Performance.objects.filter(origem_doc=origem).values_list('id_da_pessoa_entregadora', flat=True)),
+            ['e3', 'e4'],
+        )
+
+    def test_bloco_alterado_e_importado_de_novo(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(4)]
+        self.importar(csv_de(linhas), 'diario.csv', chunksize=2)
+        linhas[:2] = [performance(id_da_pessoa_entregadora='e8'), performance(id_da_pessoa_entregadora='e9')]
+        _origem, resultado = self.importar(csv_de(linhas), 'diario.csv', chunksize=2, apenas_blocos_novos=True)
+
+        self.assertEqual(resultado.linhas_ignoradas, 2)
+        self.assertEqual(resultado.linhas_importadas, 2)
+
+
+class ConversoresTestCase(SimpleTestCase):
+
+    def converter(self, conversor, *valores):
+        """(valores convertidos, máscara de inválidos) como listas."""
+        convertidos, invalidos = conversor(pd.Series(valores, dtype=object))
+        return convertidos.tolist(), invalidos.tolist()
+
+
+class ConversoresPerformanceTests(ConversoresTestCase):
+
+    def test_duracoes_pelo_caminho_rapido(self):
+        self.assertEqual(self.converter(converter_duracoes, '00:00:00', '01:13:48', '99:59:59'),
+                         ([0, 4428, 359999], [False, False, False]))
+
+    def test_duracoes_fora_do_formato_fixo(self):
+        segundos, invalidos = self.converter(converter_duracoes, '1:02:03', '', ' 100:00:00 ', '01:60:00', 'abc')
+        self.assertEqual(segundos[:3], [3723, 0, 360000])
+        self.assertEqual(invalidos, [False, False, False, True, True])
+
+    def test_decimais_com_ponto_ou_virgula(self):
+        self.assertEqual(self.converter(converter_decimais, '54.07', '0.00'), ([54.07, 0.0], [False, False]))
+        self.assertEqual(self.converter(converter_decimais, '54,07', '', 'x'), ([54.07, 0.0, 0.0], [False, False, True]))
+
+    def test_inteiros(self):
+        self.assertEqual(self.converter(converter_inteiros, '10', '0'), ([10, 0], [False, False]))
+        self.assertEqual(self.converter(converter_inteiros, '10', '', '1.5', 'dez'),
+                         ([10, 0, 0, 0], [False, False, True, True]))
+
+    def test_taxas_inteiras_ja_estao_em_centavos(self):
+        self.assertEqual(self.converter(converter_centavos_inteiros, '5000', '0'), ([5000, 0], [False, False]))
+        self.assertEqual(self.converter(converter_centavos_inteiros, '5000', '12,34', '12.34'),
+                         ([5000, 1234, 1234], [False, False, False]))
+
+    def test_formatar_duracao(self):
+        self.assertEqual(formatar_duracao(359999), '99:59:59')
+        self.assertEqual(formatar_duracao(None), '')
+
+class PerformanceTipadaTests(ImportacaoTestCase):
+
+    def test_performance_gravada_em_segundos_e_centavos(self):
+        self.importar(csv_de([performance(
+            tempo_disponivel_absoluto='25:30:00', tempo_disponivel_escalado='54,07',
+            soma_das_taxas_das_corridas_aceitas='1234',
+        )]))
+        linha = Performance.objects.get()
+
+        self.assertEqual(linha.tempo_disponivel_absoluto, 91800)
+        self.assertEqual(linha.duracao_do_periodo, 14340)
+        self.assertEqual(linha.soma_das_taxas_das_corridas_aceitas, 1234)
+        self.assertEqual(str(linha.tempo_disponivel_escalado), '54.07')
+        self.assertEqual(linha.tempo_disponivel_formatado, '25:30:00')
+
+
+class ConversoresFinanceiroTests(ConversoresTestCase):
+
+    def test_valores_em_reais_viram_centavos(self):
+        self.assertEqual(self.converter(converter_centavos, '177,11', '1.234,56', '99.50', '10', '', '-3,5', 'R$'),
+                         ([17711, 123456, 9950, 1000, 0, -350, 0], [False] * 6 + [True]))
+
+    def test_datas_nos_dois_formatos(self):
+        datas, invalidos = self.converter(converter_datas, '2025-01-06', '06/01/2025', '2025-13-01')
+        self.assertEqual(datas[:2], [date(2025, 1, 6), date(2025, 1, 6)])
+        self.assertEqual(invalidos, [False, False, True])
+
+    def test_data_opcional_vazia_vira_nulo(self):
+        self.assertEqual(self.converter(converter_datas_opcionais, '', '2025-01-06', 'x'),
+                         ([None, date(2025, 1, 6), None], [False, False, True]))
+
+    def test_percentual_opcional(self):
+        self.assertEqual(self.converter(converter_decimais_opcionais, '95,5', '', '87.25'),
+                         ([95.5, None, 87.25], [False, False, False]))
+
+    def test_formatar_centavos(self):
+        self.assertEqual(formatar_centavos(123456), 'R$ 1.234,56')
+        self.assertEqual(formatar_centavos(None), '')
+
+
+class FinanceiroTipadoTests(ImportacaoTestCase):
+
+    def test_financeiro_gravado_com_datas_e_centavos(self):
+        self.importar(csv_de([financeiro(
+            valor='1.234,56', data_do_repasse='13/01/2025', data_do_periodo_de_referencia='',
+            percentual_de_aceitacao='95,5',
+        )]))
+        linha = Financeiro.objects.get()
+
+        self.assertEqual(linha.valor, 123456)
+        self.assertEqual(linha.valor_formatado, 'R$ 1.234,56')
+        self.assertEqual(linha.data_do_repasse, date(2025, 1, 13))
+        self.assertIsNone(linha.data_do_periodo_de_referencia)
+        self.assertEqual(str(linha.percentual_de_aceitacao), '95.50')
+        self.assertIsNone(linha.percentual_de_conclusao)
+
+
+class ArvoreTestCase(ImportacaoTestCase):
+    """Base dos testes com uma árvore GERAL/<TIPO>/<FILIAL>/*.csv numa pasta temporária."""
+
+    def setUp(self):
+        super().setUp()
+        self.raiz = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.raiz, ignore_errors=True)
+
+    def gravar_csv(self, tipo, filial, nome, conteudo):
+        pasta = os.path.join(self.raiz, tipo, filial)
+        os.makedirs(pasta, exist_ok=True)
+        caminho = os.path.join(pasta, nome)
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        return caminho
+
+
+class ImportTreeTests(ArvoreTestCase):
+
+    def importar_pasta(self, **opcoes):
+        saida = []
+        resumo = importar_pasta(self.raiz, workers=2, saida=saida.append, **opcoes)
+        return resumo, saida
+
+    def test_importa_a_arvore_com_a_filial_da_pasta(self):
+        self.gravar_csv('PERFORMANCE', 'SAO PAULO', 'p.csv', csv_de([performance(), performance()]))
+        self.gravar_csv('FINANCEIRO', 'CAMPINAS', 'f.csv', csv_de([financeiro()]))
+
+        self.assertEqual([filial for _caminho, filial in descobrir_csvs(self.raiz)], ['D&G CA', 'D&G SP'])
+        resumo, _saida = self.importar_pasta()
+
+        self.assertEqual((resumo['importados'], resumo['linhas'], resumo['com_erro']), (2, 3, 0))
+        self.assertEqual(Origem.objects.get(tipo='performance').filial, 'D&G SP')
+        self.assertEqual(Financeiro.objects.get().origem_doc.filial, 'D&G CA')
+
+    def test_arquivos_ja_importados_sao_ignorados(self):
+        self.gravar_csv('PERFORMANCE', 'SAO PAULO', 'p.csv', csv_de([performance()]))
+        self.importar_pasta()
+        resumo, saida = self.importar_pasta()
+
+        self.assertEqual((resumo['importados'], resumo['ignorados']), (0, 1))
+        self.assertTrue(saida[0].startswith('Já importado'))
+        self.assertEqual(Performance.objects.count(), 1)
+
+    def test_arquivo_invalido_nao_interrompe_os_outros(self):
+        self.gravar_csv('PERFORMANCE', 'SAO PAULO', 'a.csv', b'coluna;outra\n1;2\n')
+        self.gravar_csv('PERFORMANCE', 'SAO PAULO', 'b.csv', csv_de([performance()]))
+        resumo, _saida = self.importar_pasta()
+
+        self.assertEqual((resumo['importados'], resumo['com_erro']), (1, 1))
+        self.assertEqual(Performance.objects.count(), 1)
+
+    def test_falha_na_gravacao_apaga_a_copia_do_arquivo(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(20)]
+        self.gravar_csv('PERFORMANCE', 'SAO PAULO', 'falha.csv', csv_de(linhas))
+
+        # Arquivo inteiro e arquivo dividido em faixas
+        for tamanho_faixa in (10 ** 9, 1500):
+            with self.subTest(tamanho_faixa=tamanho_faixa), \
+                    mock.patch('fato.utils.gravar_bloco', side_effect=RuntimeError('falha')):
+                resumo, _saida = self.importar_pasta(chunksize=4, tamanho_faixa=tamanho_faixa)
+
+                self.assertEqual(resumo['com_erro'], 1)
+                self.assertFalse(Origem.objects.exists())
+                salvos = [nome for _pasta, _pastas, nomes in os.walk(self.media) for nome in nomes]
+                self.assertFalse([nome for nome in salvos if nome.startswith('falha')])
+
+
+class UpsertTests(ImportacaoTestCase):
+
+    def test_atualizar_regrava_so_as_linhas_alteradas(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(3)]
+        self.importar(csv_de(linhas), modo=MODO_ATUALIZAR)
+        linhas[1] = performance(id_da_pessoa_entregadora='e1', numero_de_corridas_completadas='3')
+        origem, resultado = self.importar(csv_de(linhas), 'revisado.csv', modo=MODO_ATUALIZAR)
+
+        self.assertEqual((resultado.linhas_importadas, resultado.linhas_atualizadas, resultado.linhas_ignoradas), (1, 1, 2))
+        self.assertEqual(Performance.objects.count(), 3)
+        alterada = Performance.objects.get(id_da_pessoa_entregadora='e1')
+        self.assertEqual((alterada.numero_de_corridas_completadas, alterada.origem_doc), (3, origem))
+
+    def test_chave_repetida_no_arquivo_e_numerada(self):
+        self.importar(csv_de([performance(), performance()]), modo=MODO_ATUALIZAR)
+        _origem, resultado = self.importar(csv_de([performance(), performance(), performance()]), 'revisado.csv',
+                                           modo=MODO_ATUALIZAR)
+
+        self.assertEqual((resultado.linhas_importadas, resultado.linhas_ignoradas), (1, 2))
+        self.assertEqual(sorted(Performance.objects.values_list('sequencia', flat=True)), [0, 1, 2])
+
+    def test_atualizar_sem_data_de_referencia_nao_duplica(self):
+        linhas = [financeiro(data_do_periodo_de_referencia='', descricao=f'Ajuste {indice}') for indice in range(3)]
+        self.importar(csv_de(linhas), modo=MODO_ATUALIZAR)
+        _origem, resultado = self.importar(csv_de(linhas), 'reenviado.csv', modo=MODO_ATUALIZAR)
+
+        self.assertEqual((resultado.linhas_importadas, resultado.linhas_ignoradas), (0, 3))
+        self.assertEqual(Financeiro.objects.count(), 3)
+
+    def test_atualizar_corrige_lancamento_sem_data_de_referencia(self):
+        linhas = [financeiro(data_do_periodo_de_referencia='', descricao=f'Ajuste {indice}') for indice in range(3)]
+        self.importar(csv_de(linhas), modo=MODO_ATUALIZAR)
+        linhas[2]['valor'] = '75,00'
+        origem, resultado = self.importar(csv_de(linhas), 'revisado.csv', modo=MODO_ATUALIZAR)
+
+        self.assertEqual((resultado.linhas_atualizadas, resultado.linhas_ignoradas), (1, 2))
+        self.assertEqual(Financeiro.objects.count(), 3)
+        self.assertEqual(Financeiro.objects.get(descricao='Ajuste 2').valor, 7500)
+        self.assertEqual(Financeiro.objects.filter(origem_doc=origem).count(), 1)
+
+    def test_indice_unico_vale_para_data_de_referencia_vazia(self):
+        origem, _resultado = self.importar(csv_de([financeiro(data_do_periodo_de_referencia='')]))
+        linha = Financeiro.objects.get()
+        linha.pk = None
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            linha.save()
+
+
+    def test_falha_no_meio_do_arquivo_mantem_os_blocos_gravados_e_pode_ser_retomada(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(3)]
+        anterior = self.processar(csv_de(linhas), modo=MODO_ATUALIZAR).origem
+        linhas[0] = performance(id_da_pessoa_entregadora='e0', numero_de_corridas_completadas='3')
+        gravar_bloco = importacao.gravar_bloco
+
+        def gravar_e_falhar(*args):
+            gravar_bloco(*args)
+            raise RuntimeError("disco cheio")
+
+        with mock.patch.object(importacao, 'gravar_bloco', gravar_e_falhar), self.assertLogs('fato.jobs', 'ERROR'):
+            processamento = self.processar(csv_de(linhas), 'revisado.csv', modo=MODO_ATUALIZAR)
+
+        # O bloco confirmado fica na origem nova, que não é excluída (levaria a linha atualizada junto)
+        self.assertEqual(processamento.status, 'erro')
+        self.assertIn('--retomar', processamento.mensagem)
+        self.assertEqual(processamento.origem.linhas_importadas, 1)
+        self.assertEqual(Performance.objects.get(id_da_pessoa_entregadora='e0').origem_doc, processamento.origem)
+        self.assertEqual(Performance.objects.filter(origem_doc=anterior).count(), 2)
+
+        with mock.patch.object(importacao, 'gravar_bloco') as gravar:
+            call_command('processar_importacoes', '--retomar', stdout=io.StringIO())
+        processamento.refresh_from_db()
+
+        gravar.assert_not_called()
+        self.assertEqual(processamento.status, 'concluido')
+        self.assertEqual((processamento.linhas_importadas, processamento.linhas_atualizadas,
+                          processamento.linhas_ignoradas, processamento.linhas_com_erro), (1, 1, 2, 0))
+        self.assertEqual(Performance.objects.get(id_da_pessoa_entregadora='e0').numero_de_corridas_completadas, 3)
+        self.assertEqual(Performance.objects.count(), 3)
+
+    def test_retomada_recusa_arquivo_diferente_do_gravado(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(3)]
+        origem, _resultado = self.importar(csv_de(linhas), modo=MODO_ATUALIZAR)
+        linhas[1] = performance(id_da_pessoa_entregadora='e1', numero_de_corridas_completadas='3')
+        arquivo = io.BytesIO(csv_de(linhas))
+
+        with self.assertRaisesMessage(ValueError, 'não é o mesmo'):
+            importar_arquivo(arquivo, Performance, origem, detectar_formato(arquivo), modo=MODO_ATUALIZAR)
+
+
+class ReimportacaoNoModoInserirTests(ImportacaoTestCase):
+
+    def test_linhas_ja_importadas_sao_rejeitadas_e_o_resto_gravado(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(3)]
+        self.processar(csv_de(linhas))
+        linhas[1] = performance(id_da_pessoa_entregadora='e1', numero_de_corridas_completadas='3')
+        linhas.append(performance(id_da_pessoa_entregadora='e3'))
+        processamento = self.processar(csv_de(linhas), 'revisado.csv')
+
+        self.assertEqual(processamento.status, 'concluido')
+        self.assertEqual((processamento.linhas_importadas, processamento.linhas_com_erro), (1, 3))
+        self.assertIn(MOTIVO_JA_IMPORTADA, processamento.mensagem)
+        self.assertEqual(Performance.objects.count(), 4)
+        self.assertEqual(Performance.objects.get(id_da_pessoa_entregadora='e1').numero_de_corridas_completadas, 7)
+        self.assertEqual([linha[:3] for linha in self.rejeicoes(processamento.origem)],
+                         [[str(numero), 'chave natural', MOTIVO_JA_IMPORTADA] for numero in (2, 3, 4)])
+
+    def test_arquivo_todo_ja_importado_nao_apaga_as_linhas_anteriores(self):
+        linhas = [financeiro(descricao=f'Taxa {indice}') for indice in range(3)]
+        self.processar(csv_de(linhas))
+        linhas[0]['valor'] = '99,00'
+        processamento = self.processar(csv_de(linhas), 'revisado.csv')
+
+        self.assertEqual(processamento.status, 'erro')
+        self.assertNotIn('UNIQUE', processamento.mensagem)
+        self.assertIn(MOTIVO_JA_IMPORTADA, processamento.mensagem)
+        self.assertEqual(Financeiro.objects.count(), 3)
+        self.assertEqual(Financeiro.objects.get(descricao='Taxa 0').valor, 5000)
+
+    def test_lancamento_sem_data_de_referencia_ja_importado_e_rejeitado(self):
+        linhas = [financeiro(data_do_periodo_de_referencia='')]
+        self.importar(csv_de(linhas))
+        _origem, resultado = self.importar(csv_de(linhas + [financeiro(descricao='Outro')]), 'revisado.csv')
+
+        self.assertEqual((resultado.linhas_importadas, resultado.linhas_com_erro), (1, 1))
+        self.assertEqual(Financeiro.objects.count(), 2)
+
+    def test_carga_direta_tambem_rejeita(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(2)]
+        self.importar(csv_de(linhas), carga_direta=True)
+        _origem, resultado = self.importar(csv_de(linhas + [performance(id_da_pessoa_entregadora='e2')]),
+                                           'revisado.csv', carga_direta=True)
+
+        self.assertEqual((resultado.linhas_importadas, resultado.linhas_com_erro), (1, 2))
+        self.assertEqual(Performance.objects.count(), 3)
+
+
+class CargaDiretaTests(ImportacaoTestCase):
+
+    def valores(self, modelo, origem):
+        ignorados = {'id', 'origem_doc', 'id_da_pessoa_entregadora'}
+        campos = [campo.attname for campo in modelo._meta.concrete_fields if campo.name not in ignorados]
+        return list(modelo.objects.filter(origem_doc=origem).order_by('pk').values_list(*campos))
+
+    def comparar_com_o_orm(self, gerar_linha):
+        pelo_orm = [gerar_linha(indice, 'orm') for indice in range(3)]
+        direto = [gerar_linha(indice, 'direto') for indice in range(3)]
+        origem_orm, _resultado = self.importar(csv_de(pelo_orm), carga_direta=False)
+        origem_direta, resultado = self.importar(csv_de(direto), 'direto.csv', carga_direta=True)
+
+        self.assertEqual(resultado.linhas_importadas, 3)
+        modelo = MODELOS[origem_direta.tipo]
+        self.assertEqual(self.valores(modelo, origem_direta), self.valores(modelo, origem_orm))
+
+    def test_performance_gravada_pelo_driver_igual_ao_orm(self):
+        self.comparar_com_o_orm(lambda indice, prefixo: performance(
+            id_da_pessoa_entregadora=f'{prefixo}{indice}', tempo_disponivel_escalado=['50.00', '', '99.99'][indice],
+            soma_das_taxas_das_corridas_aceitas=['5000', '0', ''][indice],
+        ))
+
+    def test_financeiro_gravado_pelo_driver_igual_ao_orm(self):
+        self.comparar_com_o_orm(lambda indice, prefixo: financeiro(
+            id_da_pessoa_entregadora=f'{prefixo}{indice}', data_do_periodo_de_referencia=['2025-01-06', ''][indice % 2],
+            valor=['50,00', '-1.234,56', '0,01'][indice], percentual_de_aceitacao=['', '87,5', '100'][indice],
+        ))
+
+    def test_dentro_de_uma_transacao_nao_mexe_nos_pragmas(self):
+        with connection.cursor() as cursor, sessao_de_carga():
+            cursor.execute('PRAGMA cache_size')
+            self.assertNotEqual(str(cursor.fetchone()[0]), PRAGMAS_SQLITE['cache_size'])
+
+
+class SessaoDeCargaTests(TransactionTestCase):
+
+    def pragmas(self):
+        with connection.cursor() as cursor:
+            valores = {}
+            for pragma in PRAGMAS_SQLITE:
+                cursor.execute(f'PRAGMA {pragma}')
+                valores[pragma] = cursor.fetchone()[0]
+            return valores
+
+    def test_pragmas_valem_so_durante_a_carga(self):
+        antes = self.pragmas()
+        with sessao_de_carga():
+            self.assertEqual(self.pragmas()['cache_size'], int(PRAGMAS_SQLITE['cache_size']))
+            self.assertEqual(self.pragmas()['synchronous'], 0)
+
+        self.assertEqual(self.pragmas(), antes)
+
+
+class RelatorioDeRejeicoesTests(ImportacaoTestCase):
+
+    def test_relatorio_tem_linha_coluna_motivo_e_valor(self):
+        linhas = [
+            performance(), performance(numero_de_corridas_aceitas='oito'), performance(),
+            performance(data_do_periodo='06/13/2025'), performance(data_do_periodo='ontem'),
+        ]
+        processamento = self.processar(csv_de(linhas), 'semana.csv')
+        origem = processamento.origem
+
+        # Uma linha por coluna inválida, na ordem das colunas de cada bloco
+        self.assertEqual(sorted(self.rejeicoes(origem), key=lambda rejeicao: int(rejeicao[0])), [
+            ['3', 'numero_de_corridas_aceitas', 'valor inteiro inválido', 'oito'],
+            ['5', 'data_do_periodo', 'data inválida', '06/13/2025'],
+            ['6', 'data_do_periodo', 'data inválida', 'ontem'],
+        ])
+        self.assertTrue(origem.arquivo_rejeicoes.name.endswith('semana_rejeicoes.csv'))
+        self.assertEqual(origem.erros_por_tipo, {'valor inteiro inválido': 1, 'data inválida': 2})
+        self.assertEqual(processamento.mensagem, "3 linhas rejeitadas - data inválida: 2, valor inteiro inválido: 1.")
+        self.assertEqual(processamento.como_dict()['url_rejeicoes'], origem.arquivo_rejeicoes.url)
+
+    def test_sem_rejeicoes_nao_grava_relatorio(self):
+        processamento = self.processar(csv_de([performance()]))
+
+        self.assertFalse(processamento.origem.arquivo_rejeicoes)
+        self.assertEqual(processamento.origem.erros_por_tipo, {})
+        self.assertEqual(processamento.como_dict()['url_rejeicoes'], '')
+
+    def test_arquivo_todo_rejeitado_guarda_o_relatorio_e_aceita_reenvio(self):
+        conteudo = csv_de([performance(tempo_disponivel_absoluto='duas horas')])
+        processamento = self.processar(conteudo)
+        origem = processamento.origem
+
+        self.assertEqual(processamento.status, 'erro')
+        self.assertIsNone(origem.hash_sha256)
+        self.assertEqual(origem.linhas_com_erro, 1)
+        self.assertEqual(len(self.rejeicoes(origem)), 1)
+        self.assertEqual(self.processar(conteudo, 'corrigido.csv').status, 'erro')
+
+
+class EnvioDeVariosArquivosTests(EnvioTestCase):
+
+    def test_cada_arquivo_vira_uma_origem_com_o_seu_processamento(self):
+        arquivos = [
+            ('segunda.csv', csv_de([performance(data_do_periodo='2025-01-06')])),
+            ('terca.csv', csv_de([performance(data_do_periodo='2025-01-07')])),
+            ('repasse.csv', csv_de([financeiro()])),
+        ]
+        with self.captureOnCommitCallbacks() as enfileirados:
+            resposta = self.enviar_arquivos(arquivos, modo='atualizar')
+
+        processamentos = list(Processamento.objects.order_by('pk'))
+        self.assertEqual(len(enfileirados), 3)
+        self.assertEqual([processamento.nome_arquivo for processamento in processamentos],
+                         [nome for nome, _conteudo in arquivos])
+        self.assertEqual([processamento.origem.tipo for processamento in processamentos],
+                         ['performance', 'performance', 'financeiro'])
+        self.assertEqual({processamento.modo for processamento in processamentos}, {'atualizar'})
+        # Os mais recentes primeiro, para a página acompanhar o progresso
+        self.assertEqual(self.client.session['processamentos'],
+                         [processamento.pk for processamento in reversed(processamentos)])
+        self.assertIn('Importação de 3 arquivos iniciada', self.mensagens(resposta))
+        self.assertEqual(list(resposta.context['processamentos']), list(Processamento.objects.all()))
+
+    def test_arquivo_recusado_nao_impede_os_outros(self):
+        arquivos = [('bom.csv', csv_de([performance()])), ('ruim.csv', b'coluna_a;coluna_b\n1;2\n')]
+        resposta = self.enviar_arquivos(arquivos)
+
+        self.assertEqual(list(Origem.objects.values_list('nome', flat=True)), ['bom.csv'])
+        self.assertIn('Formato do arquivo ruim.csv não reconhecido', self.mensagens(resposta))
+
+    def test_extensao_diferente_de_csv_recusa_o_envio(self):
+        resposta = self.enviar_arquivos([('bom.csv', csv_de([performance()])), ('planilha.xlsx', b'PK')])
+
+        self.assertFalse(Origem.objects.exists())
+        self.assertIn('Apenas arquivos CSV', resposta.content.decode())
+
+
+class DeteccaoDeFormatoTests(ImportacaoTestCase):
+
+    def detectar(self, conteudo, **opcoes):
+        return detectar_formato(io.BytesIO(conteudo), **opcoes)
+
+    def test_utf8_com_ponto_e_virgula(self):
+        formato = self.detectar(csv_de([performance()]))
+
+        self.assertEqual((formato.tipo, formato.encoding, formato.delimitador), ('performance', 'utf-8-sig', ';'))
+
+    def test_planilha_em_windows_1252_com_virgula(self):
+        conteudo = csv_de([performance(pessoa_entregadora='João Conceição')], delimitador=',', encoding='cp1252')
+        formato = self.detectar(conteudo)
+
+        self.assertEqual(formato.delimitador, ',')
+        self.assertEqual(conteudo.decode(formato.encoding), conteudo.decode('cp1252'))
+        self.importar(conteudo)
+        self.assertEqual(Performance.objects.get().pessoa_entregadora, 'João Conceição')
+
+    def test_utf16_do_excel_com_tabulacao(self):
+        conteudo = csv_de([financeiro(descricao='Promoção')], delimitador='\t', encoding='utf-16')
+        formato = self.detectar(conteudo)
+
+        self.assertEqual((formato.tipo, formato.encoding, formato.delimitador), ('financeiro', 'utf-16', '\t'))
+        self.importar(conteudo)
+        self.assertEqual(Financeiro.objects.get().descricao, 'Promoção')
+
+    def test_delimitador_dentro_de_aspas(self):
+        linha = performance(pessoa_entregadora='"Silva; João"')
+        _origem, resultado = self.importar(csv_de([linha, performance(id_da_pessoa_entregadora='e2')]))
+
+        self.assertEqual(resultado.linhas_importadas, 2)
+        self.assertEqual(Performance.objects.get(id_da_pessoa_entregadora='e1').pessoa_entregadora, 'Silva; João')
+
+    def test_le_so_o_comeco_do_arquivo(self):
+        conteudo = csv_de([performance() for _indice in range(50)]) + b'\xff\xfe lixo binario'
+        arquivo = io.BytesIO(conteudo)
+        formato = detectar_formato(arquivo, tamanho_amostra=2048)
+
+        self.assertEqual((formato.tipo, formato.encoding), ('performance', 'utf-8-sig'))
+        self.assertEqual(arquivo.tell(), 0)
+
+    def test_linha_em_outro_encoding_depois_da_amostra_e_rejeitada(self):
+        # A amostra de 64KB é toda UTF-8; a última linha veio de uma planilha em Windows-1252
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(500)]
+        conteudo = csv_de(linhas) + csv_de([performance(pessoa_entregadora='João', id_da_pessoa_entregadora='e500')],
+                                           encoding='cp1252').split(b'\n', 1)[1]
+        self.assertGreater(len(conteudo), 64 * 1024)
+
+        # Leitura pelo pandas (arquivo em memória) e pelo mmap (arquivo da origem em disco)
+        _origem, resultado = self.importar(conteudo, chunksize=150)
+        processamento = self.processar(conteudo, 'disco.csv')
+
+        self.assertEqual((resultado.linhas_importadas, resultado.linhas_com_erro), (500, 1))
+        self.assertEqual(resultado.erros_por_tipo, {importacao.MOTIVO_ENCODING: 1})
+        self.assertEqual((processamento.linhas_importadas, processamento.linhas_com_erro), (0, 501))
+        self.assertIn(['502', 'pessoa_entregadora', importacao.MOTIVO_ENCODING],
+                      [rejeicao[:3] for rejeicao in self.rejeicoes(processamento.origem)])
+        relatorio = validar_arquivo(io.BytesIO(conteudo), detectar_formato(io.BytesIO(conteudo)))
+        self.assertEqual(relatorio.histograma['pessoa_entregadora'], {importacao.MOTIVO_ENCODING: 1})
+
+    def test_arquivo_vazio_ou_de_outro_tipo_e_recusado(self):
+        for conteudo in (b'', b'  \n', b'nome;cpf\nFulano;123\n'):
+            with self.subTest(conteudo=conteudo), self.assertRaises(FormatoInvalido):
+                self.detectar(conteudo)
+
+
+class LeituraPorFaixasTests(ArvoreTestCase):
+
+    def test_faixas_comecam_em_fronteiras_de_registro(self):
+        # Quebras de linha e aspas escapadas dentro de campos entre aspas não encerram o registro
+        linhas = [
+            performance(pessoa_entregadora=f'"Entregador\n""{indice}""\nSilva"', id_da_pessoa_entregadora=f'e{indice}')
+            for indice in range(40)
+        ]
+        conteudo = csv_de(linhas)
+        caminho = self.gravar_csv('PERFORMANCE', 'SAO PAULO', 'p.csv', conteudo)
+        formato = detectar_formato(io.BytesIO(conteudo))
+
+        with open(caminho, 'rb') as arquivo, abrir_mapa(arquivo) as mapa:
+            faixas = dividir_em_faixas(mapa, tamanho_faixa=700)
+            lidas = pd.concat([df for inicio, fim in faixas for df in ler_faixa(mapa, inicio, fim, formato, 7)])
+
+        self.assertGreater(len(faixas), 5)
+        self.assertEqual(faixas[-1][1], len(conteudo))
+        self.assertTrue(all(fim == proximo for (_inicio, fim), (proximo, _fim) in zip(faixas, faixas[1:])))
+        self.assertEqual(list(lidas['id_da_pessoa_entregadora']), [f'e{indice}' for indice in range(40)])
+        self.assertEqual(lidas['pessoa_entregadora'].iloc[3], 'Entregador\n"3"\nSilva')
+
+    def test_arquivo_dividido_importa_como_o_arquivo_inteiro(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice % 7}') for indice in range(60)]
+        linhas[25]['numero_de_corridas_aceitas'] = 'oito'
+        linhas[51]['data_do_periodo'] = 'ontem'
+        self.gravar_csv('PERFORMANCE', 'SAO PAULO', 'p.csv', csv_de(linhas))
+        resumo = importar_pasta(self.raiz, workers=2, saida=lambda texto: None, chunksize=4, tamanho_faixa=1500)
+
+        origem = Origem.objects.get()
+        self.assertEqual((resumo['linhas'], resumo['linhas_com_erro']), (58, 2))
+        # A sequência da chave continua entre as faixas: e0..e6 repetidos sem colidir
+        self.assertEqual(Performance.objects.filter(id_da_pessoa_entregadora='e0').count(), 9)
+        self.assertEqual(sorted(Performance.objects.filter(id_da_pessoa_entregadora='e0').values_list(
+            'sequencia', flat=True)), list(range(9)))
+        self.assertEqual(sorted(int(rejeicao[0]) for rejeicao in self.rejeicoes(origem)), [27, 53])
+        self.assertEqual(sorted(origem.blocos.values_list('indice', flat=True)), list(range(origem.blocos.count())))
+
+
+class ValidacaoTests(EnvioTestCase):
+
+    def validar(self, linhas, **opcoes):
+        conteudo = csv_de(linhas)
+        arquivo = io.BytesIO(conteudo)
+        return validar_arquivo(arquivo, detectar_formato(arquivo), nome='semana.csv', **opcoes)
+
+    def test_histograma_por_coluna_e_motivo_com_as_linhas(self):
+        cadastrar_entregador(1)
+        linhas = [performance(id_da_pessoa_entregadora=uuid_de(1)) for _indice in range(6)]
+        linhas[1]['numero_de_corridas_aceitas'] = '12'  # Mais que as 10 ofertadas
+        linhas[2]['id_da_pessoa_entregadora'] = 'e2'
+        linhas[3]['data_do_periodo'] = 'ontem'
+        linhas[4]['id_da_pessoa_entregadora'] = uuid_de(2)  # Sem cadastro: só aviso
+        relatorio = self.validar(linhas, chunksize=4)
+
+        self.assertEqual((relatorio.linhas_lidas, relatorio.linhas_com_erro, relatorio.linhas_validas), (6, 1, 5))
+        self.assertEqual(relatorio.histograma, {'data_do_periodo': {'data inválida': 1}})
+        # As regras de consistência são avisos: a importação grava essas linhas
+        self.assertEqual(relatorio.histograma_avisos, {
+            'numero_de_corridas_aceitas': {'maior que as ofertadas': 1},
+            'id_da_pessoa_entregadora': {'UUID inválido': 1},
+        })
+        self.assertEqual(relatorio.exemplos[('data_do_periodo', 'data inválida')], [5])
+        self.assertEqual(relatorio.exemplos[('numero_de_corridas_aceitas', 'maior que as ofertadas')], [3])
+        self.assertEqual(relatorio.avisos, {'entregador não cadastrado': 2})
+        self.assertFalse(Performance.objects.exists())
+
+    def test_linhas_com_erro_sao_as_mesmas_que_a_importacao_rejeita(self):
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(5)]
+        linhas[0]['numero_de_corridas_completadas'] = '-1'
+        linhas[1]['numero_de_corridas_completadas'] = '9'  # Mais que as 8 aceitas
+        linhas[2]['tempo_disponivel_absoluto'] = 'duas horas'
+        relatorio = self.validar(linhas)
+        _origem, resultado = self.importar(csv_de(linhas))
+
+        self.assertEqual((relatorio.linhas_com_erro, resultado.linhas_com_erro), (1, 1))
+        self.assertEqual(relatorio.linhas_validas, resultado.linhas_importadas)
+        self.assertEqual(relatorio.histograma_avisos['numero_de_corridas_completadas'],
+                         {'negativo': 1, 'maior que as aceitas': 1})
+
+    def test_financeiro_aceita_lancamento_sem_entregador(self):
+        relatorio = self.validar([
+            financeiro(id_da_pessoa_entregadora=''),
+            financeiro(id_da_pessoa_entregadora=uuid_de(1), percentual_de_aceitacao='-5'),
+        ])
+
+        self.assertEqual(relatorio.histograma, {})
+        self.assertEqual(relatorio.histograma_avisos, {'percentual_de_aceitacao': {'negativo': 1}})
+
+    def test_somente_validar_mostra_o_relatorio_sem_importar(self):
+        resposta = self.enviar(csv_de([performance(), performance(data_do_periodo='ontem')]), somente_validar='on')
+
+        self.assertFalse(Origem.objects.exists())
+        self.assertFalse(Processamento.objects.exists())
+        relatorio, = resposta.context['validacoes']
+        self.assertEqual((relatorio.linhas_lidas, relatorio.linhas_com_erro), (2, 1))
+        self.assertContains(resposta, 'Nada foi importado')
+        self.assertContains(resposta, 'Avisos de consistência')  # ids fora do formato UUID
+
+
+class ExclusaoTests(ImportacaoTestCase):
+
+    def importar_intercalado(self):
+        """Origem cujas linhas têm ids intercalados com os de outra: o upsert leva linhas alternadas."""
+        linhas = [performance(id_da_pessoa_entregadora=f'e{indice}') for indice in range(6)]
+        anterior, _resultado = self.importar(csv_de(linhas), modo=MODO_ATUALIZAR)
+        for indice in (1, 3, 5):
+            linhas[indice] = performance(id_da_pessoa_entregadora=f'e{indice}', numero_de_corridas_completadas='3')
+        revisada, _resultado = self.importar(csv_de(linhas), 'revisado.csv', modo=MODO_ATUALIZAR)
+        return anterior, revisada
+
+    def test_lotes_seguem_os_ids_da_origem(self):
+        anterior, revisada = self.importar_intercalado()
+        progresso = []
+        with CaptureQueriesContext(connection) as consultas:
+            excluidas = excluir_linhas(Performance, revisada, lote=1, progresso=progresso.append)
+
+        tabela = connection.ops.quote_name(Performance._meta.db_table)
+        deletes = [consulta for consulta in consultas if consulta['sql'].startswith(f'DELETE FROM {tabela}')]
+        self.assertEqual((excluidas, progresso, len(deletes)), (3, [1, 2, 3], 3))
+        self.assertEqual(Performance.objects.filter(origem_doc=anterior).count(), 3)
+
+        self.assertEqual(excluir_origem(revisada), 0)
+        self.assertFalse(Origem.objects.filter(pk=revisada.pk).exists())
+        self.assertFalse(os.path.exists(revisada.arquivo.path))
+
+    def test_performance_diaria_acompanha_a_exclusao(self):
+        self.importar(csv_de([performance(periodo='JANTAR 19H00-22H59')]))
+        _anterior, revisada = self.importar_intercalado()
+        excluir_origem(revisada, lote=2)
+        diaria = conteudo_da_tabela(PerformanceDiaria)
+        reconstruir_performance_diaria()
+
+        self.assertEqual(diaria, conteudo_da_tabela(PerformanceDiaria))
+        # O período do e1 que estava na origem excluída sai da soma; o da outra origem fica
+        self.assertEqual(PerformanceDiaria.objects.get(id_da_pessoa_entregadora='e1').periodos, 1)
+
+    def test_exclusao_em_segundo_plano(self):
+        origem, _resultado = self.importar(csv_de([performance(id_da_pessoa_entregadora=f'e{indice}')
+                                                   for indice in range(5)]))
+        with self.captureOnCommitCallbacks() as enfileiradas:
+            exclusao = agendar_exclusao(origem)
+            self.assertEqual(agendar_exclusao(origem), exclusao)  # Uma exclusão em andamento por origem
+        self.assertEqual(len(enfileiradas), 1)
+
+        executar_exclusao(exclusao.pk, lote=2)
+        exclusao.refresh_from_db()
+        self.assertEqual((exclusao.status, exclusao.linhas_total, exclusao.linhas_excluidas), ('concluido', 5, 5))
+        self.assertIsNone(exclusao.origem)
+        self.assertFalse(Performance.objects.exists())
+
+
+@skipUnless(colunar.pa, "a cópia colunar precisa do pyarrow")
+class ArquivoColunarTests(ImportacaoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        ajustes = override_settings(IMPORTACAO_ARQUIVO_COLUNAR=True)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_particoes_por_data_e_leitura_com_os_tipos_do_modelo(self):
+        linhas = [performance(data_do_periodo='2025-01-06'), performance(data_do_periodo='2025-01-07'),
+                  performance(data_do_periodo='2025-01-07', id_da_pessoa_entregadora='e2')]
+        origem = self.processar(csv_de(linhas)).origem
+
+        self.assertEqual(origem.arquivos_colunares, [
+            f'filial=d&g_sp/tipo_origem=performance/data={data}/origem_{origem.pk}.parquet'
+            for data in ('2025-01-06', '2025-01-07')
+        ])
+        df = colunar.ler_colunar('performance', date(2025, 1, 7), date(2025, 1, 31),
+                                 colunas=['id_da_pessoa_entregadora', 'tempo_disponivel_absoluto'], filial='D&G SP')
+        self.assertEqual(sorted(df['id_da_pessoa_entregadora']), ['e1', 'e2'])
+        self.assertEqual(df['tempo_disponivel_absoluto'].tolist(), [7200, 7200])
+
+    def test_linha_atualizada_vale_a_da_origem_mais_nova(self):
+        self.processar(csv_de([performance()]), modo=MODO_ATUALIZAR)
+        self.processar(csv_de([performance(numero_de_corridas_completadas='3')]), 'revisado.csv',
+                       modo=MODO_ATUALIZAR)
+
+        df = colunar.ler_colunar('performance', date(2025, 1, 6), date(2025, 1, 6))
+        self.assertEqual(df['numero_de_corridas_completadas'].tolist(), [3])
+
+    def test_origem_excluida_leva_os_parquets(self):
+        origem = self.processar(csv_de([financeiro(), financeiro(data_do_lancamento_financeiro='')])).origem
+        caminhos = [os.path.join(colunar.diretorio_colunar(), relativo) for relativo in origem.arquivos_colunares]
+        self.assertTrue(any(f'data={colunar.SEM_DATA}' in caminho for caminho in caminhos))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            excluir_origem(origem)
+        self.assertFalse(any(os.path.exists(caminho) for caminho in caminhos))
+
+    def test_sem_pyarrow_a_importacao_segue_sem_a_copia(self):
+        with mock.patch.object(colunar, 'pa', None):
+            processamento = self.processar(csv_de([performance()]))
+
+        self.assertEqual(processamento.status, 'concluido')
+        self.assertEqual(processamento.origem.arquivos_colunares, [])
+
+
+class RelatorioHorasTests(ImportacaoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for indice in (1, 2, 3):
+            cadastrar_entregador(indice)
+        cadastrar_entregador(4, is_active=False)
+        # Segunda: 1 roda 2h e 2 roda 4h; terça: 1 roda 1h; o 3 não roda e o 4 está inativo
+        self.processar(csv_de([
+            performance(id_da_pessoa_entregadora=uuid_de(1)),
+            performance(id_da_pessoa_entregadora=uuid_de(2), tempo_disponivel_absoluto='04:00:00'),
+            performance(id_da_pessoa_entregadora=uuid_de(1), data_do_periodo='2025-01-07',
+                        tempo_disponivel_absoluto='01:00:00'),
+            performance(id_da_pessoa_entregadora=uuid_de(4), tempo_disponivel_absoluto='08:00:00'),
+        ]))
+
+    def test_abas_do_relatorio_antigo(self):
+        abas = relatorio_horas(date(2025, 1, 6), date(2025, 1, 7))
+
+        self.assertEqual(list(abas), ['Horas por Semana', 'Horas por Mês', 'Rodaram Semana', 'Nao Rodaram Semana',
+                                      'Rodaram Mês', 'Nao Rodaram Mês'])
+        self.assertEqual(abas['Horas por Semana'].values.tolist(), [['Monday', 6.0], ['Tuesday', 1.0]])
+        self.assertEqual(abas['Horas por Mês'].values.tolist(), [[6, 6.0], [7, 1.0]])
+        self.assertEqual(abas['Rodaram Semana'].values.tolist(), [['Monday', 2, 3.0, 3.0], ['Tuesday', 1, 1.0, 1.0]])
+        self.assertEqual(abas['Nao Rodaram Mês'].values.tolist(), [[6, 1], [7, 2]])
+
+    def test_filial_filtra_pela_origem(self):
+        sao_paulo = relatorio_horas(date(2025, 1, 6), date(2025, 1, 7), filial='D&G SP')
+        campinas = relatorio_horas(date(2025, 1, 6), date(2025, 1, 7), filial='D&G CA')
+
+        self.assertEqual(sao_paulo['Horas por Semana']['Total de Horas Entregues (horas)'].tolist(), [6.0, 1.0])
+        self.assertTrue(campinas['Horas por Semana'].empty)
+
+    def test_mediana_no_banco_igual_a_do_pandas(self):
+        tempos = ['00:30:00', '05:00:00', '01:15:00', '03:00:00', '00:45:00', '02:30:00', '04:10:00']
+        self.processar(csv_de([
+            performance(id_da_pessoa_entregadora=uuid_de(3), data_do_periodo=f'2025-01-{8 + indice % 3:02d}',
+                        periodo=f'PERIODO {indice}', tempo_disponivel_absoluto=tempo)
+            for indice, tempo in enumerate(tempos)
+        ]), 'quarta.csv')
+        rodaram = relatorio_horas(date(2025, 1, 6), date(2025, 1, 10))['Rodaram Mês']
+
+        linhas = Performance.objects.filter(id_da_pessoa_entregadora__in=[uuid_de(1), uuid_de(2), uuid_de(3)])
+        tempos = pd.DataFrame(list(linhas.values_list('data_do_periodo', 'tempo_disponivel_absoluto')))
+        esperadas = (tempos[1].groupby(tempos[0].map(lambda data: data.day)).median() / 3600).tolist()
+        self.assertEqual(len(esperadas), 5)
+        self.assertEqual(rodaram['Mediana Rodaram (horas)'].tolist(), esperadas)
+
+    def test_comando_e_view_geram_a_planilha(self):
+        destino = os.path.join(self.media, 'horas.xlsx')
+        call_command('relatorio_horas', '2025-01-06', '2025-01-07', '--saida', destino, stdout=io.StringIO())
+        abas = relatorio_horas(date(2025, 1, 6), date(2025, 1, 7))
+        self.assertEqual(openpyxl.load_workbook(destino).sheetnames, list(abas))
+
+        self.client.force_login(User.objects.create_user('staff', password='x', is_staff=True))
+        resposta = self.client.get(reverse('exportar_relatorio_horas'), {'inicio': '2025-01-06', 'fim': '2025-01-07'})
+        planilha = openpyxl.load_workbook(io.BytesIO(b''.join(resposta.streaming_content)))
+        self.assertEqual([linha for linha in planilha['Horas por Semana'].values],
+                         [('Dia da Semana', 'Total de Horas Entregues (horas)'), ('Monday', 6), ('Tuesday', 1)])
+        resposta = self.client.get(reverse('exportar_relatorio_horas'), {'inicio': '2025-01-07', 'fim': '2025-01-06'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class PerformanceDiariaTests(ImportacaoTestCase):
+
+    def assertDiariaIgualAoRecalculo(self):
+        diaria = conteudo_da_tabela(PerformanceDiaria)
+        reconstruir_performance_diaria()
+        self.assertEqual(diaria, conteudo_da_tabela(PerformanceDiaria))
+
+    def importar_semana(self):
+        linhas = [
+            performance(id_da_pessoa_entregadora=f'e{indice % 3}', data_do_periodo=f'2025-01-0{6 + indice % 2}',
+                        periodo=[PERIODO, 'JANTAR 19H00-22H59'][indice % 4 // 2],
+                        sub_praca=[SUB_PRACA, 'SAO PAULO - MOEMA'][indice % 5 == 0])
+            for indice in range(12)
+        ]
+        return self.importar(csv_de(linhas), chunksize=5, modo=MODO_ATUALIZAR)
+
+    def test_importacao_em_blocos_soma_por_entregador_dia_e_sub_praca(self):
+        self.importar_semana()
+        self.importar(csv_de([performance(id_da_pessoa_entregadora='e1', periodo='MADRUGADA 00H00-05H59',
+                                          tempo_disponivel_absoluto='01:30:00')]), 'madrugada.csv')
+
+        self.assertDiariaIgualAoRecalculo()
+        linha = PerformanceDiaria.objects.get(id_da_pessoa_entregadora='e1', data_do_periodo=date(2025, 1, 6),
+                                              sub_praca=SUB_PRACA)
+        self.assertEqual((linha.periodos, linha.tempo_disponivel_absoluto, linha.soma_das_taxas_das_corridas_aceitas),
+                         (2, 3 * 3600 + 30 * 60, 10000))
+
+    def test_upsert_e_exclusao_direta_da_origem(self):
+        semana, _resultado = self.importar_semana()
+        revisado = [performance(id_da_pessoa_entregadora='e0', numero_de_corridas_completadas='1')]
+        self.importar(csv_de(revisado), 'revisado.csv', modo=MODO_ATUALIZAR)
+        self.assertDiariaIgualAoRecalculo()
+
+        semana.delete()  # Sem fato.exclusao: os sinais refazem a tabela
+        self.assertDiariaIgualAoRecalculo()
+        self.assertEqual(list(PerformanceDiaria.objects.values_list('id_da_pessoa_entregadora', flat=True)), ['e0'])
+
+    def test_comando_refaz_a_tabela_alterada_por_fora(self):
+        self.importar_semana()
+        esperado = conteudo_da_tabela(PerformanceDiaria)
+        PerformanceDiaria.objects.filter(data_do_periodo=date(2025, 1, 6)).update(periodos=99)
+        PerformanceDiaria.objects.create(id_da_pessoa_entregadora='e9', data_do_periodo=date(2024, 12, 31),
+                                         sub_praca=SUB_PRACA, pessoa_entregadora='Órfã')
+
+        call_command('reconstruir_performance_diaria', stdout=io.StringIO())
+        self.assertEqual(conteudo_da_tabela(PerformanceDiaria), esperado)
+
+
+class CuboTests(ImportacaoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Duas semanas atravessando a virada de janeiro para fevereiro, duas sub-praças e dois períodos
+        linhas = [
+            performance(
+                data_do_periodo=str(date(2025, 1, 27) + timedelta(days=indice % 14)),
+                id_da_pessoa_entregadora=f'e{indice % 5}', periodo=[PERIODO, 'JANTAR 19H00-22H59'][indice % 2],
+                sub_praca=[SUB_PRACA, 'SAO PAULO - MOEMA', 'SAO PAULO - MOEMA'][indice % 3],
+                tempo_disponivel_absoluto=f'0{indice % 4 + 1}:00:00', numero_de_corridas_aceitas=str(indice % 9),
+            )
+            for indice in range(70)
+        ]
+        self.processar(csv_de(linhas))
+
+    def esperado(self, dimensoes, chave_do_tempo=None, inicio=None, fim=None):
+        """Mesma consulta somada direto da Performance, no pandas."""
+        df = pd.DataFrame(list(Performance.objects.values(
+            'data_do_periodo', *DIMENSOES_DO_CUBO, 'tempo_disponivel_absoluto', 'numero_de_corridas_aceitas',
+            'numero_de_corridas_ofertadas',
+        )))
+        if inicio:
+            df = df[df['data_do_periodo'] >= inicio]
+        if fim:
+            df = df[df['data_do_periodo'] <= fim]
+        chaves = list(dimensoes)
+        if chave_do_tempo:
+            df['tempo'] = df['data_do_periodo'].map(chave_do_tempo)
+            chaves = ['tempo'] + chaves
+        somas = df.groupby(chaves).agg(
+            linhas=('data_do_periodo', 'size'), tempo_disponivel_absoluto=('tempo_disponivel_absoluto', 'sum'),
+            aceitas=('numero_de_corridas_aceitas', 'sum'), ofertadas=('numero_de_corridas_ofertadas', 'sum'),
+        ).reset_index()
+        somas['taxa_de_aceitacao'] = somas['aceitas'] / somas['ofertadas']
+        return somas[chaves + ['linhas', 'tempo_disponivel_absoluto', 'taxa_de_aceitacao']].to_dict('records')
+
+    def consultar(self, dimensoes, tempo=None, inicio=None, fim=None):
+        return consultar_cubo(dimensoes, tempo, inicio, fim,
+                              medidas=['linhas', 'tempo_disponivel_absoluto', 'taxa_de_aceitacao'])
+
+    def test_consultas_batem_com_a_performance(self):
+        casos = [
+            (['sub_praca', 'periodo'], 'dia_da_semana', date(2025, 1, 29), date(2025, 2, 5)),
+            (['praca'], 'mes', date(2025, 1, 1), date(2025, 2, 28)),
+            (['sub_praca'], 'semana', date(2025, 1, 27), date(2025, 2, 9)),
+            (['sub_praca'], 'semana', date(2025, 1, 29), date(2025, 2, 9)),  # Semana incompleta: vem do grão diário
+            (['periodo'], None, None, None),
+        ]
+        for dimensoes, tempo, inicio, fim in casos:
+            with self.subTest(dimensoes=dimensoes, tempo=tempo, inicio=inicio):
+                chave_do_tempo = {None: None, 'dia_da_semana': date.weekday, 'mes': lambda data: data.replace(day=1),
+                                  'semana': lambda data: data - timedelta(days=data.weekday())}[tempo]
+                self.assertEqual(self.consultar(dimensoes, tempo, inicio, fim),
+                                 self.esperado(dimensoes, chave_do_tempo, inicio, fim))
+
+    def test_grao_mais_grosso_que_responde(self):
+        self.assertEqual(escolher_grao(['praca'], 'mes', date(2025, 1, 1), date(2025, 2, 28)), 'mes_praca')
+        self.assertEqual(escolher_grao(['sub_praca'], 'mes', date(2025, 1, 1), date(2025, 1, 15)), 'dia_sub_praca')
+        self.assertEqual(escolher_grao(['periodo'], 'semana', date(2025, 1, 27), date(2025, 2, 2)),
+                         'semana_sub_praca_periodo')
+        with self.assertRaises(ValueError):
+            consultar_cubo(['entregador'])
+
+    def test_exclusao_e_reconstrucao(self):
+        outra, _resultado = self.importar(csv_de([performance(data_do_periodo='2025-02-03', sub_praca='SANTO AMARO')]))
+        atualizar_cubo_da_origem(outra)
+        excluir_origem(Origem.objects.exclude(pk=outra.pk).get())
+
+        self.assertEqual(self.consultar(['sub_praca']), self.esperado(['sub_praca']))
+        cubo = conteudo_da_tabela(CuboPerformance)
+        CuboPerformance.objects.all().delete()
+        reconstruir_cubo()
+        self.assertEqual(conteudo_da_tabela(CuboPerformance), cubo)
+
+
+class CacheDeRelatoriosTests(ImportacaoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.processar(csv_de([performance(data_do_periodo='2025-01-06')]))
+        zerar_estatisticas()
+
+    def horas(self):
+        return consultar_cubo([], None, date(2025, 1, 6), date(2025, 1, 12), medidas=['tempo_disponivel_absoluto'])
+
+    def contadores(self, nome='consultar_cubo'):
+        estatisticas = estatisticas_do_cache([nome])[nome]
+        return estatisticas['acertos'], estatisticas['falhas']
+
+    def test_resultado_reaproveitado_ate_uma_importacao_tocar_o_intervalo(self):
+        self.assertEqual(self.horas(), self.horas())
+        self.assertEqual(self.contadores(), (1, 1))
+
+        # Fora do intervalo: a versão dos dados da semana não muda
+        self.processar(csv_de([performance(data_do_periodo='2025-03-03')]), 'marco.csv')
+        self.horas()
+        self.assertEqual(self.contadores(), (2, 1))
+
+        self.processar(csv_de([performance(data_do_periodo='2025-01-08')]), 'quarta.csv')
+        self.assertEqual(self.horas(), [{'tempo_disponivel_absoluto': 2 * 7200}])
+        self.assertEqual(self.contadores(), (2, 2))
+
+    def test_exclusao_invalida_o_resultado(self):
+        quarta = self.processar(csv_de([performance(data_do_periodo='2025-01-08')]), 'quarta.csv').origem
+        self.assertEqual(self.horas(), [{'tempo_disponivel_absoluto': 2 * 7200}])
+
+        excluir_origem(quarta)
+        self.assertEqual(self.horas(), [{'tempo_disponivel_absoluto': 7200}])
+        self.assertEqual(self.contadores(), (0, 2))
+
+    def test_relatorio_de_horas_acompanha_o_cadastro_de_entregadores(self):
+        cadastrar_entregador(1)
+        Performance.objects.update(id_da_pessoa_entregadora=uuid_de(1))
+        relatorio_horas(date(2025, 1, 6), date(2025, 1, 6))
+        relatorio_horas(date(2025, 1, 6), date(2025, 1, 6))
+        cadastrar_entregador(2)
+        abas = relatorio_horas(date(2025, 1, 6), date(2025, 1, 6))
+
+        self.assertEqual(self.contadores('relatorio_horas'), (1, 2))
+        self.assertEqual(abas['Nao Rodaram Semana']['Colaboradores Que Não Rodaram'].tolist(), [1])
+
+
+class ExportacaoTests(EnvioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.processar(csv_de([
+            performance(data_do_periodo='2025-01-06', id_da_pessoa_entregadora='e1'),
+            performance(data_do_periodo='2025-01-07', id_da_pessoa_entregadora='e2'),
+            performance(data_do_periodo='2025-01-20', id_da_pessoa_entregadora='e3'),
+        ]))
+
+    def exportar(self, tipo='performance', **parametros):
+        return self.client.get(reverse('exportar_fatos', args=[tipo]),
+                               {'inicio': '2025-01-06', 'fim': '2025-01-12', **parametros})
+
+    def linhas_do_csv(self, resposta):
+        texto = b''.join(resposta.streaming_content).decode('utf-8')
+        self.assertTrue(texto.startswith('\ufeff'))
+        return list(csv.reader(io.StringIO(texto[1:]), delimiter=';'))
+
+    def test_csv_do_intervalo_em_streaming(self):
+        resposta = self.exportar()
+
+        self.assertTrue(resposta.streaming)
+        self.assertIn('performance_2025-01-06_2025-01-12.csv', resposta['Content-Disposition'])
+        cabecalho, *linhas = self.linhas_do_csv(resposta)
+        self.assertEqual(cabecalho[:2], ['filial', 'data_do_periodo'])
+        coluna = cabecalho.index('id_da_pessoa_entregadora')
+        self.assertEqual([(linha[0], linha[coluna]) for linha in linhas], [('D&G SP', 'e1'), ('D&G SP', 'e2')])
+
+        self.assertEqual(self.linhas_do_csv(self.exportar(filial='D&G CA')), [cabecalho])
+
+    def test_xlsx_tem_as_mesmas_linhas_do_csv(self):
+        planilha = openpyxl.load_workbook(io.BytesIO(b''.join(self.exportar(formato='xlsx').streaming_content)))
+        linhas = list(planilha.active.values)
+
+        self.assertEqual(list(linhas[0]), self.linhas_do_csv(self.exportar())[0])
+        self.assertEqual([linha[0] for linha in linhas[1:]], ['D&G SP', 'D&G SP'])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.exportar(formato='pdf').status_code, 400)
+        self.assertEqual(self.exportar(fim='2025-01-01').status_code, 400)
+        self.assertEqual(self.exportar(inicio='06/01/2025').status_code, 400)
+        self.assertEqual(self.exportar('outro').status_code, 404)
+
+    def test_csv_sai_em_pedacos(self):
+        linhas = [[indice, 'x' * 10] for indice in range(10)]
+        with mock.patch('fato.exportacao.TAMANHO_PEDACO', 30):
+            pedacos = list(gerar_csv(['indice', 'texto'], iter(linhas)))
+
+        self.assertGreater(len(pedacos), 3)
+        self.assertEqual(list(csv.reader(io.StringIO(''.join(pedacos)[1:]), delimiter=';'))[1:],
+                         [[str(indice), texto] for indice, texto in linhas])
+
+    def test_acao_do_admin_exporta_os_selecionados(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        selecionados = Performance.objects.filter(id_da_pessoa_entregadora__in=['e1', 'e3'])
+        resposta = self.client.post(reverse('admin:fato_performance_changelist'), {
+            'action': 'exportar_csv', '_selected_action': [linha.pk for linha in selecionados],
+        })
+
+        cabecalho, *linhas = self.linhas_do_csv(resposta)
+        self.assertIn(str(Performance._meta.get_field('id_da_pessoa_entregadora').verbose_name), cabecalho)
+        self.assertEqual(len(linhas), 2)
+
+
+class ScorecardTests(EnvioTestCase):
+
+    def setUp(self):
+        super().setUp()
+        moema = Subpraca.objects.create(nome='SAO PAULO - MOEMA', praca=Praca.objects.create(nome='SAO PAULO', uf='SP'))
+        # O 1 é cadastrado em Moema e roda em Pinheiros; o 2 e o 3 só aparecem no arquivo
+        cadastrar_entregador(1, subpraca=moema)
+        self.processar(csv_de([
+            performance(id_da_pessoa_entregadora=uuid_de(1)),
+            performance(id_da_pessoa_entregadora='e2', tempo_disponivel_absoluto='01:00:00'),
+            performance(id_da_pessoa_entregadora='e2', data_do_periodo='2025-01-07',
+                        tempo_disponivel_absoluto='03:00:00'),
+            performance(id_da_pessoa_entregadora='e3', tempo_disponivel_absoluto='01:00:00',
+                        numero_de_corridas_aceitas='4', numero_de_corridas_completadas='4',
+                        numero_de_corridas_canceladas_pela_pessoa_entregadora='0',
+                        soma_das_taxas_das_corridas_aceitas='2000'),
+        ]))
+
+    def test_kpis_e_posicao_na_subpraca(self):
+        with self.assertNumQueries(3):
+            tabela = scorecard_calculado(date(2025, 1, 6), date(2025, 1, 12)).set_index('id_da_pessoa_entregadora')
+
+        self.assertEqual(tabela.loc[uuid_de(1), ['nome', 'subpraca', 'cadastrado', 'posicao']].tolist(),
+                         ['ENTREGADOR 1', 'SAO PAULO - MOEMA', True, 1])
+        colunas = ['subpraca', 'dias', 'horas', 'taxa_de_aceitacao', 'taxas_por_hora']
+        self.assertEqual(tabela.loc['e2', colunas].tolist(), [SUB_PRACA, 2, 4.0, 0.8, 25.0])
+        self.assertEqual(tabela.loc['e3', ['taxa_de_aceitacao', 'taxa_de_conclusao', 'taxa_de_cancelamento']].tolist(),
+                         [0.4, 1.0, 0.0])
+        self.assertEqual(tabela.loc[['e2', 'e3'], 'posicao'].tolist(), [1, 2])
+        self.assertEqual(tabela.loc[['e2', 'e3'], 'horas_percentil'].tolist(), [1.0, 0.5])
+        # Cancelamento: menor é melhor
+        self.assertEqual(tabela.loc[['e2', 'e3'], 'taxa_de_cancelamento_percentil'].tolist(), [0.5, 1.0])
+
+    def test_ordenacao_por_outro_kpi(self):
+        tabela = scorecard(date(2025, 1, 6), date(2025, 1, 12), ordenar_por='taxa_de_cancelamento')
+
+        self.assertEqual(tabela['id_da_pessoa_entregadora'].tolist(), [uuid_de(1), 'e3', 'e2'])
+        with self.assertRaises(ValueError):
+            scorecard(date(2025, 1, 6), date(2025, 1, 12), ordenar_por='corridas')
+        self.assertTrue(scorecard(date(2025, 2, 1), date(2025, 2, 28)).empty)
+
+    def test_view_exporta_o_scorecard(self):
+        resposta = self.client.get(reverse('exportar_scorecard'),
+                                   {'inicio': '2025-01-06', 'fim': '2025-01-12', 'formato': 'csv'})
+        texto = b''.join(resposta.streaming_content).decode('utf-8-sig')
+        cabecalho, *linhas = csv.reader(io.StringIO(texto), delimiter=';')
+
+        self.assertEqual(cabecalho, COLUNAS_DO_SCORECARD)
+        self.assertEqual([linha[0] for linha in linhas], [uuid_de(1), 'e2', 'e3'])
+        resposta = self.client.get(reverse('exportar_scorecard'),
+                                   {'inicio': '2025-01-06', 'fim': '2025-01-12', 'ordenar_por': 'corridas'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class SaldosTests(ImportacaoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.semana, _resultado = self.importar(csv_de([
+            financeiro(valor='50,00'),
+            financeiro(valor='30,00', descricao='Gorjetas'),
+            financeiro(valor='10,00', tipo='DEBITO', descricao='Aluguel da bag'),
+            financeiro(valor='20,00', data_do_repasse='2025-01-20', data_do_periodo_de_referencia='2025-01-13'),
+            financeiro(valor='99,00', data_do_repasse='', descricao='Sem repasse'),
+            financeiro(id_da_pessoa_entregadora='e2', valor='5,00'),
+        ], CAMPOS_FINANCEIRO))
+
+    def assertSaldosIgualAoRecalculo(self):
+        saldos = conteudo_da_tabela(SaldoRepasse)
+        reconstruir_saldos()
+        self.assertEqual(saldos, conteudo_da_tabela(SaldoRepasse))
+
+    def linhas_do_extrato(self, id_entregador='e1'):
+        return list(extrato(id_entregador).values_list(
+            'data_do_repasse', 'lancamentos', 'creditos', 'debitos', 'liquido', 'saldo',
+        ))
+
+    def test_extrato_com_saldo_acumulado(self):
+        self.assertEqual(self.linhas_do_extrato(), [
+            (date(2025, 1, 13), 3, 8000, 1000, 7000, 7000),
+            (date(2025, 1, 20), 1, 2000, 0, 2000, 9000),
+        ])
+        self.assertEqual(self.linhas_do_extrato('e2'), [(date(2025, 1, 13), 1, 500, 0, 500, 500)])
+        self.assertEqual(saldo_em('e1', date(2025, 1, 12)), 0)
+        self.assertEqual(saldo_em('e1', date(2025, 1, 19)), 7000)
+        self.assertEqual(lancamentos_do_repasse('e1', date(2025, 1, 13)).count(), 3)
+        self.assertSaldosIgualAoRecalculo()
+
+    def test_importacao_exclusao_e_troca_de_data_do_repasse(self):
+        extra, _resultado = self.importar(csv_de([
+            financeiro(valor='15,00', data_do_repasse='2025-01-20', descricao='Bônus'),
+        ], CAMPOS_FINANCEIRO), 'bonus.csv')
+        self.assertEqual(saldo_em('e1', date(2025, 1, 20)), 10500)
+        self.assertSaldosIgualAoRecalculo()
+
+        # No modo 'atualizar' o lançamento de 50,00 passa para o repasse seguinte
+        self.importar(csv_de([financeiro(valor='50,00', data_do_repasse='2025-01-27')], CAMPOS_FINANCEIRO),
+                      'revisado.csv', modo=MODO_ATUALIZAR)
+        self.assertEqual(self.linhas_do_extrato()[0][:2], (date(2025, 1, 13), 2))
+        self.assertEqual(saldo_em('e1', date(2025, 1, 27)), 10500)
+        self.assertSaldosIgualAoRecalculo()
+
+        excluir_origem(extra)
+        self.assertEqual(saldo_em('e1', date(2025, 1, 27)), 9000)
+        self.assertSaldosIgualAoRecalculo()
+
+    def test_comando_refaz_o_extrato_alterado_por_fora(self):
+        esperado = conteudo_da_tabela(SaldoRepasse)
+        SaldoRepasse.objects.filter(id_da_pessoa_entregadora='e1').update(saldo=0)
+        SaldoRepasse.objects.create(id_da_pessoa_entregadora='e9', data_do_repasse=date(2025, 1, 13), liquido=100)
+
+        call_command('reconstruir_saldos', stdout=io.StringIO())
+        self.assertEqual(conteudo_da_tabela(SaldoRepasse), esperado)
+
+
+class ConciliacaoTests(ImportacaoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # O 3 não completou corrida; o 5 completou e não tem crédito
+        self.performance = self.processar(csv_de([
+            performance(id_da_pessoa_entregadora=indice, numero_de_corridas_completadas=completadas)
+            for indice, completadas in [('e1', '7'), ('e2', '7'), ('e3', '0'), ('e5', '3')]
+        ])).origem
+
+    def divergencias(self):
+        return sorted(Divergencia.objects.values_list('tipo', 'id_da_pessoa_entregadora', 'diferenca'))
+
+    def importar_creditos(self):
+        return self.processar(csv_de([
+            financeiro(valor='50,01'),  # Dentro da tolerância
+            financeiro(valor='3,00', tipo='DEBITO', descricao='Aluguel da bag'),
+            financeiro(id_da_pessoa_entregadora='e2', valor='40,00'),
+            financeiro(id_da_pessoa_entregadora='e4', valor='10,00'),
+        ], CAMPOS_FINANCEIRO), 'financeiro.csv').origem
+
+    def test_importacao_concilia_as_datas_que_trouxe(self):
+        self.assertEqual(self.divergencias(), [
+            (Divergencia.FALTANDO, 'e1', -5000), (Divergencia.FALTANDO, 'e2', -5000),
+            (Divergencia.FALTANDO, 'e5', -5000),
+        ])
+
+        creditos = self.importar_creditos()
+        self.assertIsNotNone(creditos.conciliada_em)
+        self.assertEqual(self.divergencias(), [
+            (Divergencia.FALTANDO, 'e5', -5000), (Divergencia.SOBRANDO, 'e4', 1000), (Divergencia.VALOR, 'e2', -1000),
+        ])
+
+        excluir_origem(creditos)
+        self.assertEqual([tipo for tipo, _id, _diferenca in self.divergencias()], [Divergencia.FALTANDO] * 3)
+
+    def test_so_os_creditos_de_corridas_entram(self):
+        self.processar(csv_de([
+            financeiro(valor='50,00', descricao='Corridas concluidas'),
+            financeiro(valor='30,00', descricao='Valor por Hora Online'),
+            financeiro(id_da_pessoa_entregadora='e2', valor='8,00', descricao='Promocao entregador'),
+            financeiro(id_da_pessoa_entregadora='e4', valor='5,00', descricao='Gorjeta', periodo=''),
+        ], CAMPOS_FINANCEIRO), 'financeiro.csv')
+
+        self.assertEqual(self.divergencias(), [
+            (Divergencia.FALTANDO, 'e2', -5000), (Divergencia.FALTANDO, 'e5', -5000),
+        ])
+
+    def test_credito_sem_periodo_e_conciliado_no_dia(self):
+        self.processar(csv_de([
+            performance(id_da_pessoa_entregadora='e1', periodo='JANTAR 19H00-22H59'),
+            performance(id_da_pessoa_entregadora='e2', periodo='JANTAR 19H00-22H59'),
+        ]), 'jantar.csv')
+        self.processar(csv_de([
+            financeiro(periodo='', valor='100,00'),  # Os dois períodos do e1
+            financeiro(id_da_pessoa_entregadora='e2', valor='50,00'),  # Almoço do e2, com período
+            financeiro(id_da_pessoa_entregadora='e2', periodo='', valor='20,00'),  # Menos que o jantar do e2
+            financeiro(id_da_pessoa_entregadora='e4', periodo='', valor='10,00'),  # Sem corrida no dia
+        ], CAMPOS_FINANCEIRO), 'financeiro.csv')
+
+        self.assertEqual(self.divergencias(), [
+            (Divergencia.FALTANDO, 'e5', -5000), (Divergencia.SOBRANDO, 'e4', 1000), (Divergencia.VALOR, 'e2', -3000),
+        ])
+        dia = Divergencia.objects.exclude(id_da_pessoa_entregadora='e5')
+        self.assertEqual(set(dia.values_list('periodo', flat=True)), {''})
+
+    def test_faixas_de_entregadores_dao_o_mesmo_resultado(self):
+        self.importar_creditos()
+        data = date(2025, 1, 6)
+
+        def resumo(divergencias):
+            return sorted((divergencia.tipo, divergencia.id_da_pessoa_entregadora, divergencia.diferenca)
+                          for divergencia in divergencias)
+
+        self.assertEqual(faixas_de_entregadores(data, lote=2), [('e1', 'e2'), ('e3', 'e4'), ('e5', 'e5')])
+        self.assertEqual(resumo(divergencias_da_data(data, lote=2)), resumo(divergencias_da_data(data)))
+
+    def test_comando_concilia_as_origens_pendentes(self):
+        self.importar_creditos()
+        esperado = self.divergencias()
+        Divergencia.objects.all().delete()
+        Origem.objects.update(conciliada_em=None)
+
+        call_command('conciliar', stdout=io.StringIO())
+        self.assertEqual(self.divergencias(), esperado)
+        self.assertFalse(Origem.objects.filter(conciliada_em=None).exists())
+
+        Divergencia.objects.all().delete()
+        call_command('conciliar', '--inicio', '2025-01-06', '--fim', '2025-01-07', stdout=io.StringIO())
+        self.assertEqual(self.divergencias(), esperado)
+        with self.assertRaises(CommandError):
+            call_command('conciliar', '--inicio', '2025-01-06', stdout=io.StringIO())
+
+
+class EsbocoTests(SimpleTestCase):
+
+    def setUp(self):
+        gerador = np.random.default_rng(0)
+        self.valores = np.concatenate([gerador.lognormal(8, 1, 5000), np.zeros(200)])
+        gerador.shuffle(self.valores)
+
+    def assertProximo(self, estimado, exato):
+        self.assertLessEqual(abs(estimado - exato), PRECISAO_DOS_QUANTIS * exato)
+
+    def test_quantis_dentro_da_precisao(self):
+        esboco = Esboco.de_valores(self.valores)
+
+        self.assertEqual(esboco.contagem, len(self.valores))
+        for q in (0.01, 0.1, 0.5, 0.9, 0.99, 1):
+            with self.subTest(q=q):
+                self.assertProximo(esboco.quantil(q), np.quantile(self.valores, q, method='lower'))
+        self.assertIsNone(Esboco().quantil(0.5))
+
+    def test_juntar_e_o_mesmo_que_esbocar_tudo(self):
+        metade = len(self.valores) // 2
+        juntos = Esboco.de_valores(self.valores[:metade]).juntar(Esboco.de_dict(
+            Esboco.de_valores(self.valores[metade:]).como_dict()
+        ))
+
+        self.assertEqual(juntos.como_dict(), Esboco.de_valores(self.valores).como_dict())
+
+
+class QuantisTests(ImportacaoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # Duas semanas, duas sub-praças e tempos de 10 minutos a quase 4 horas
+        self.semanas, _resultado = self.importar_e_atualizar([
+            performance(
+                data_do_periodo=str(date(2025, 1, 6) + timedelta(days=indice % 14)),
+                id_da_pessoa_entregadora=f'e{indice}', sub_praca=[SUB_PRACA, 'SAO PAULO - MOEMA'][indice % 2],
+                tempo_disponivel_absoluto=str(timedelta(minutes=10 + indice * 37 % 230)),
+            )
+            for indice in range(120)
+        ])
+
+    def importar_e_atualizar(self, linhas, nome='arquivo.csv'):
+        origem, resultado = self.importar(csv_de(linhas), nome)
+        atualizar_cubo_da_origem(origem)
+        return origem, resultado
+
+    def exato(self, chave, q):
+        df = pd.DataFrame(list(Performance.objects.values('data_do_periodo', 'sub_praca', 'tempo_disponivel_absoluto')))
+        df['semana'] = df['data_do_periodo'].map(lambda data: data - timedelta(days=data.weekday()))
+        return df.groupby(chave)['tempo_disponivel_absoluto'].quantile(q, interpolation='lower').to_dict()
+
+    def test_quantis_por_semana_e_sub_praca(self):
+        linhas = consultar_quantis('tempo_disponivel_absoluto', date(2025, 1, 6), date(2025, 1, 19), 'semana',
+                                   por_sub_praca=True)
+
+        self.assertEqual(len(linhas), 4)
+        self.assertEqual(sum(linha['contagem'] for linha in linhas), 120)
+        for q, coluna in ((0.5, 'p50'), (0.9, 'p90')):
+            exatos = self.exato(['semana', 'sub_praca'], q)
+            for linha in linhas:
+                exato = exatos[linha['tempo'], linha['sub_praca']]
+                self.assertLessEqual(abs(linha[coluna] - exato), PRECISAO_DOS_QUANTIS * exato)
+
+    def test_importacao_e_exclusao_refazem_os_esbocos(self):
+        outra, _resultado = self.importar_e_atualizar(
+            [performance(sub_praca='SANTO AMARO', tempo_disponivel_absoluto='00:00:00')], 'santo_amaro.csv',
+        )
+        linhas = consultar_quantis('tempo_disponivel_absoluto', sub_pracas=['SANTO AMARO'], quantis=[0.5])
+        self.assertEqual(linhas, [{'contagem': 1, 'p50': 0}])
+
+        excluir_origem(self.semanas)
+        self.assertEqual(consultar_quantis('tempo_disponivel_absoluto'), [{'contagem': 1, 'p50': 0, 'p90': 0}])
+        with self.assertRaises(ValueError):
+            consultar_quantis('corridas')
+
+
+class CoortesTests(ImportacaoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # 1 e 2 entram na semana de 06/01, 3 na de 13/01; o 4 não tem data de ingresso
+        self.entregadores = {
+            indice: cadastrar_entregador(indice, dt_franquia=dt_franquia)
+            for indice, dt_franquia in [(1, date(2025, 1, 6)), (2, date(2025, 1, 8)), (3, date(2025, 1, 13)), (4, None)]
+        }
+        self.processar(csv_de([
+            performance(id_da_pessoa_entregadora=uuid_de(indice), data_do_periodo=data)
+            for indice, data in [(1, '2025-01-06'), (1, '2025-01-14'), (2, '2025-01-08'), (2, '2025-01-01'),
+                                 (3, '2025-01-14'), (4, '2025-01-06')]
+        ]))
+
+    def assertCoortesIguaisAoRecalculo(self):
+        coortes = conteudo_da_tabela(AtividadeCoorte)
+        reconstruir_coortes()
+        self.assertEqual(coortes, conteudo_da_tabela(AtividadeCoorte))
+
+    def resumo(self, agrupar_por='semana', semanas=None):
+        """[(coorte, tamanho, [(ativos, horas) por semana])]"""
+        return [
+            (linha['coorte'], linha['tamanho'], [(coluna['ativos'], coluna['horas']) for coluna in linha['semanas']])
+            for linha in matriz_de_retencao(date(2025, 1, 1), date(2025, 1, 31), agrupar_por, semanas)
+        ]
+
+    def test_matriz_por_semana_e_por_mes(self):
+        # A atividade do 2 antes do ingresso fica de fora
+        self.assertEqual(self.resumo(), [
+            (date(2025, 1, 6), 2, [(2, 4.0), (1, 2.0)]),
+            (date(2025, 1, 13), 1, [(1, 2.0)]),
+        ])
+        self.assertEqual(matriz_de_retencao(date(2025, 1, 1), date(2025, 1, 31))[0]['semanas'][1]['retencao'], 0.5)
+        self.assertEqual(self.resumo('mes'), [(date(2025, 1, 1), 3, [(0, 0.0), (2, 4.0), (2, 4.0)])])
+        self.assertEqual(self.resumo('mes', semanas=2), [(date(2025, 1, 1), 3, [(0, 0.0), (2, 4.0)])])
+        with self.assertRaises(ValueError):
+            matriz_de_retencao(date(2025, 1, 1), date(2025, 1, 31), 'ano')
+        self.assertCoortesIguaisAoRecalculo()
+
+    def test_edicao_e_exclusao_de_entregadores(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entregadores[3].dt_franquia = date(2025, 1, 7)
+            self.entregadores[3].save()
+        self.assertEqual(self.resumo(), [(date(2025, 1, 6), 3, [(2, 4.0), (2, 4.0)])])
+        self.assertCoortesIguaisAoRecalculo()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entregadores[1].delete()
+        self.assertEqual(self.resumo(), [(date(2025, 1, 6), 2, [(1, 2.0), (1, 2.0)])])
+        self.assertCoortesIguaisAoRecalculo()
+
+    def test_comando_e_pagina_do_admin(self):
+        esperado = conteudo_da_tabela(AtividadeCoorte)
+        AtividadeCoorte.objects.update(entregadores=99)
+        AtividadeCoorte.objects.create(entrada=date(2024, 6, 3), semana=date(2024, 6, 3), entregadores=1, segundos=1)
+
+        call_command('reconstruir_coortes', stdout=io.StringIO())
+        self.assertEqual(conteudo_da_tabela(AtividadeCoorte), esperado)
+
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        resposta = self.client.get(reverse('admin:fato_atividadecoorte_changelist'),
+                                   {'inicio': '2025-01-01', 'fim': '2025-01-31'})
+        self.assertEqual([(linha['tamanho'], [celula['texto'] for celula in linha['celulas']])
+                          for linha in resposta.context['linhas']], [(2, ['100%', '50%']), (1, ['100%'])])
@@ -1,103 +1,375 @@
+#fato/utils.py
+"""
+Importação em lote de uma árvore de CSVs no formato GERAL/<TIPO>/<FILIAL>/*.csv.
+
+A leitura e a conversão dos arquivos rodam em paralelo num pool de processos; cada
+arquivo é gravado pelo processo principal na sua própria transação, com uma Origem.
+Arquivos maiores que a faixa (ver fato.leitura) são divididos por bytes entre os
+processos do pool e gravados faixa a faixa, na ordem do arquivo.
+"""
+import logging
 import os
-import csv
-from django.db import transaction
-from .models import Performance, Financeiro
-
-
-def importar_csv_performance(caminho_arquivo, filial, batch_size=1000):
-    with open(caminho_arquivo, mode='r', encoding='utf-8') as file:
-        leitor_csv = csv.DictReader(file, delimiter=';')
-        performances = []
-        for linha in leitor_csv:
-            performance = Performance(
-                data_do_periodo=linha['data_do_periodo'],
-                periodo=linha['periodo'],
-                duracao_do_periodo=linha['duracao_do_periodo'],
-                numero_minimo_de_entregadores_regulares_na_escala=linha[
-                    'numero_minimo_de_entregadores_regulares_na_escala'],
-                tag=linha['tag'],
-                id_da_pessoa_entregadora=linha['id_da_pessoa_entregadora'],
-                pessoa_entregadora=linha['pessoa_entregadora'],
-                praca=linha['praca'],
-                sub_praca=linha['sub_praca'],
-                origem=linha['origem'],
-                tempo_online_escalado=linha['tempo_online_escalado'],
-                tempo_online_absoluto=linha['tempo_online_absoluto'],
-                numero_de_corridas_ofertadas=linha['numero_de_corridas_ofertadas'],
-                numero_de_corridas_aceitas=linha['numero_de_corridas_aceitas'],
-                numero_de_corridas_rejeitadas=linha['numero_de_corridas_rejeitadas'],
-                numero_de_corridas_completadas=linha['numero_de_corridas_completadas'],
-                numero_de_corridas_canceladas_pela_pessoa_entregadora=linha[
-                    'numero_de_corridas_canceladas_pela_pessoa_entregadora'],
-                numero_de_pedidos_aceitos_e_concluidos=linha['numero_de_pedidos_aceitos_e_concluidos'],
-                soma_das_taxas_das_corridas_aceitas=linha['soma_das_taxas_das_corridas_aceitas'],
-                filial=filial  # Aqui associamos a filial com base na subpasta
-            )
-            performances.append(performance)
-
-            if len(performances) >= batch_size:
-                # Salvar em batch e limpar a lista
-                with transaction.atomic():
-                    Performance.objects.bulk_create(performances)
-                performances = []  # Limpar para o próximo lote
-
-        # Salvar o que restou após o loop
-        if performances:
-            with transaction.atomic():
-                Performance.objects.bulk_create(performances)
-
-
-def importar_csv_financeiro(caminho_arquivo, filial, batch_size=1000):
-    with open(caminho_arquivo, mode='r', encoding='utf-8') as file:
-        leitor_csv = csv.DictReader(file, delimiter=';')
-        financeiros = []
-        for linha in leitor_csv:
-            financeiro = Financeiro(
-                data_do_lancamento_financeiro=linha['data_do_lancamento_financeiro'],
-                data_do_periodo_de_referencia=linha['data_do_periodo_de_referencia'],
-                data_do_repasse=linha['data_do_repasse'],
-                periodo=linha['periodo'],
-                praca=linha['praca'],
-                subpraca=linha['subpraca'],
-                origem=linha['origem'],
-                id_da_pessoa_entregadora=linha['id_da_pessoa_entregadora'],
-                recebedor=linha['recebedor'],
-                tipo=linha['tipo'],
-                valor=linha['valor'],
-                descricao=linha['descricao'],
-                atingido=linha['atingido'],
-                percentual_de_tempo_online=linha['percentual_de_tempo_online'],
-                percentual_de_aceitacao=linha['percentual_de_aceitacao'],
-                percentual_de_conclusao=linha['percentual_de_conclusao'],
-                criterio_tempo_online=linha['criterio_tempo_online'],
-                criterio_rotas_aceitas=linha['criterio_rotas_aceitas'],
-                criterio_rotas_concluidas=linha['criterio_rotas_concluidas'],
-                margem_fee_porcentagem=linha['margem_fee_porcentagem'],
-                filial=filial  # Aqui associamos a filial com base na subpasta
+import time
+from contextlib import nullcontext
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.files import File
+from django.db import connections, transaction
+
+from .forms import FILIAL_CHOICE
+from .carga import carga_direta_habilitada, sessao_de_carga
+from .cache import registrar_intervalo
+from .colunar import arquivar_origem
+from .conciliacao import conciliar_origem
+from .cubo import atualizar_cubo_da_origem
+from .deteccao import detectar_formato
+from .importacao import (
+    MODELOS, MODO_INSERIR, ResultadoImportacao, TAMANHO_CHUNK, BATCH_SIZE, calcular_sha256, gravar_bloco,
+    normalizar_colunas, preparar_blocos, preparar_dataframes, resumo_dos_erros, salvar_rejeicoes,
+)
+from .leitura import TAMANHO_FAIXA, abrir_mapa, dividir_em_faixas, ler_faixa, pode_mapear
+from .models import Origem
+from .validacao import validar_arquivo
+
+logger = logging.getLogger(__name__)
+
+# Hashes já importados, carregados uma vez em cada processo do pool (ver inicializar_processo)
+HASHES_IMPORTADOS = set()
+
+
+class ArquivoPreparado:
+    """Resultado da leitura de um CSV num processo do pool, pronto para ser gravado."""
+
+    def __init__(self, caminho, filial):
+        self.caminho = caminho
+        self.filial = filial
+        self.tipo = None
+        self.hash_sha256 = None
+        self.blocos = []  # [(BlocoOrigem, DataFrame)]
+        self.resultado = ResultadoImportacao()
+        self.erro = None
+        self.ja_importado = False
+        self.segundos_leitura = 0.0
+
+
+class FaixaPreparada:
+    """Blocos convertidos de uma faixa de bytes de um arquivo dividido entre os processos do pool."""
+
+    def __init__(self):
+        self.blocos = []  # [(BlocoOrigem, DataFrame, chaves)]
+        self.resultado = ResultadoImportacao()
+        self.contagem = {}  # Ocorrências de cada chave natural na faixa (ver numerar_sequencia)
+
+
+def nome_da_filial(pasta):
+    """'SAO PAULO' -> 'D&G SP' quando a pasta corresponde a uma filial do FILIAL_CHOICE."""
+    chave = pasta.strip().lower().replace(' ', '_')
+    return dict(FILIAL_CHOICE).get(chave, pasta.strip())
+
+
+def descobrir_csvs(raiz):
+    """Lista (caminho, filial) de todos os CSVs em <raiz>/<TIPO>/<FILIAL>/."""
+    encontrados = []
+    for pasta_atual, pastas, arquivos in os.walk(raiz):
+        pastas.sort()
+        for arquivo in sorted(arquivos):
+            if arquivo.lower().endswith('.csv'):
+                filial = os.path.basename(pasta_atual)
+                encontrados.append((os.path.join(pasta_atual, arquivo), nome_da_filial(filial)))
+    return encontrados
+
+
+def preparar_arquivo(caminho, filial, chunksize=TAMANHO_CHUNK):
+    """Executado no pool: identifica o tipo, calcula o hash e converte todos os blocos."""
+    inicio = time.perf_counter()
+    preparado = ArquivoPreparado(caminho, filial)
+    try:
+        with open(caminho, 'rb') as arquivo:
+            preparado.hash_sha256 = calcular_sha256(arquivo)
+            if preparado.hash_sha256 in HASHES_IMPORTADOS:
+                preparado.ja_importado = True
+                return preparado
+            formato = detectar_formato(arquivo)
+            preparado.tipo = formato.tipo
+            preparado.blocos = list(preparar_blocos(
+                arquivo, MODELOS[preparado.tipo], formato, preparado.resultado, chunksize
+            ))
+    except Exception as e:
+        preparado.erro = str(e)
+    finally:
+        preparado.segundos_leitura = time.perf_counter() - inicio
+    return preparado
+
+
+def remover_arquivos_salvos(origem):
+    """
+    Apaga do storage o arquivo e o relatório de rejeições de uma Origem cuja transação
+    foi desfeita: o storage não participa do rollback.
+    """
+    for arquivo in (origem.arquivo, origem.arquivo_rejeicoes):
+        if arquivo.name:
+            arquivo.storage.delete(arquivo.name)
+
+
+def criar_origem(caminho, filial, tipo, hash_sha256):
+    """Cria a Origem copiando o arquivo para o storage. Deve rodar dentro da transação da importação."""
+    nome = os.path.basename(caminho)
+    origem = Origem(nome=nome, filial=filial, tipo=tipo, hash_sha256=hash_sha256)
+    with open(caminho, 'rb') as arquivo:
+        origem.arquivo = File(arquivo, name=nome)
+        origem.save()
+    return origem
+
+
+def gravar_arquivo(preparado, batch_size=BATCH_SIZE, modo=MODO_INSERIR, carga_direta=None):
+    """
+    Cria a Origem e grava todos os blocos do arquivo numa única transação. Se ela for
+    desfeita, a cópia do arquivo no storage também é apagada.
+    """
+    modelo = MODELOS[preparado.tipo]
+    origem = None
+    try:
+        with transaction.atomic():
+            origem = criar_origem(preparado.caminho, preparado.filial, preparado.tipo, preparado.hash_sha256)
+            for bloco, validos in preparado.blocos:
+                gravar_bloco(modelo, origem, bloco, validos, preparado.resultado, batch_size, modo, carga_direta)
+            origem.linhas_importadas = preparado.resultado.linhas_importadas
+            origem.linhas_com_erro = preparado.resultado.linhas_com_erro
+            salvar_rejeicoes(origem, preparado.resultado)
+            registrar_intervalo(origem)
+            origem.save()
+            atualizar_cubo_da_origem(origem)
+            conciliar_origem(origem)
+    except Exception:
+        if origem is not None:
+            remover_arquivos_salvos(origem)
+        raise
+    arquivar_origem(origem)
+    return origem
+
+
+def preparar_faixa(caminho, formato, inicio, fim, chunksize=TAMANHO_CHUNK):
+    """Executado no pool: converte os registros de arquivo[inicio:fim]; as linhas são numeradas a partir da faixa."""
+    faixa = FaixaPreparada()
+    with open(caminho, 'rb') as arquivo, abrir_mapa(arquivo) as mapa:
+        dfs = (normalizar_colunas(df) for df in ler_faixa(mapa, inicio, fim, formato, chunksize))
+        faixa.blocos = list(preparar_dataframes(
+            dfs, MODELOS[formato.tipo], faixa.resultado, chunksize, contagem=faixa.contagem
+        ))
+    return faixa
+
+
+def gravar_faixa(modelo, origem, faixa, resultado, contagem, proximo_indice, batch_size, modo, carga_direta):
+    """
+    Grava uma faixa continuando a numeração do arquivo: a sequência da chave natural soma
+    as ocorrências das faixas anteriores (`contagem`) e os blocos seguem `proximo_indice`.
+    Retorna o índice do próximo bloco.
+    """
+    linhas_antes = resultado.linhas_lidas
+    resultado.incorporar(faixa.resultado, linhas_antes)
+    for bloco, validos, chaves in faixa.blocos:
+        if contagem:
+            validos['sequencia'] += chaves.map(contagem).fillna(0).astype('int64').to_numpy()
+        validos.index += linhas_antes  # Linhas numeradas a partir do início do arquivo
+        bloco.indice = proximo_indice
+        proximo_indice += 1
+        gravar_bloco(modelo, origem, bloco, validos, resultado, batch_size, modo, carga_direta)
+    for chave, quantidade in faixa.contagem.items():
+        contagem[chave] = contagem.get(chave, 0) + quantidade
+    return proximo_indice
+
+
+def importar_arquivo_dividido(caminho, filial, pool, janela, batch_size=BATCH_SIZE, chunksize=TAMANHO_CHUNK,
+                              modo=MODO_INSERIR, carga_direta=None, tamanho_faixa=TAMANHO_FAIXA):
+    """
+    Importa um arquivo grande dividindo-o em faixas de bytes convertidas em paralelo no
+    `pool`; no máximo `janela` faixas ficam prontas na memória esperando gravação.
+    Retorna o ArquivoPreparado (sem blocos) e a Origem criada, ou None se não gravou.
+    """
+    inicio = time.perf_counter()
+    preparado = ArquivoPreparado(caminho, filial)
+    with open(caminho, 'rb') as arquivo:
+        preparado.hash_sha256 = calcular_sha256(arquivo)
+        if Origem.objects.filter(hash_sha256=preparado.hash_sha256).exists():
+            preparado.ja_importado = True
+            return preparado, None
+        formato = detectar_formato(arquivo)
+        preparado.tipo = formato.tipo
+        with abrir_mapa(arquivo) as mapa:
+            faixas = dividir_em_faixas(mapa, tamanho_faixa, formato.aspas.encode())
+
+    modelo = MODELOS[preparado.tipo]
+    resultado = preparado.resultado
+    contagem, proximo_indice = {}, 0
+    pendentes, restantes = deque(), deque(faixas)
+
+    origem = None
+    try:
+        with transaction.atomic():
+            origem = criar_origem(caminho, filial, preparado.tipo, preparado.hash_sha256)
+            # As faixas são lidas em paralelo, mas gravadas na ordem do arquivo
+            while restantes or pendentes:
+                while restantes and len(pendentes) < janela:
+                    pendentes.append(pool.submit(preparar_faixa, caminho, formato, *restantes.popleft(), chunksize))
+                faixa = pendentes.popleft().result()
+                proximo_indice = gravar_faixa(
+                    modelo, origem, faixa, resultado, contagem, proximo_indice, batch_size, modo, carga_direta
+                )
+            origem.linhas_importadas = resultado.linhas_importadas
+            origem.linhas_com_erro = resultado.linhas_com_erro
+            salvar_rejeicoes(origem, resultado)
+            registrar_intervalo(origem)
+            origem.save()
+            atualizar_cubo_da_origem(origem)
+            conciliar_origem(origem)
+    except Exception:
+        if origem is not None:
+            remover_arquivos_salvos(origem)
+        raise
+    arquivar_origem(origem)
+
+    preparado.segundos_leitura = time.perf_counter() - inicio
+    return preparado, origem
+
+
+def inicializar_processo(hashes_importados):
+    """Garante o Django configurado nos processos do pool (necessário no modo 'spawn')."""
+    django.setup()
+    HASHES_IMPORTADOS.update(hashes_importados)
+
+
+def pode_dividir(caminho, tamanho_faixa=TAMANHO_FAIXA):
+    """Arquivo maior que uma faixa e num encoding que pode ser fatiado por bytes."""
+    if os.path.getsize(caminho) <= tamanho_faixa:
+        return False
+    try:
+        with open(caminho, 'rb') as arquivo:
+            return pode_mapear(arquivo, detectar_formato(arquivo))
+    except ValueError:
+        return False  # Formato inválido: o erro é relatado pelo caminho normal
+
+
+def importar_pasta(csv_dir, workers=None, batch_size=BATCH_SIZE, chunksize=TAMANHO_CHUNK, saida=print,
+                   modo=MODO_INSERIR, carga_direta=None, tamanho_faixa=TAMANHO_FAIXA):
+    """
+    Importa todos os CSVs da árvore. Arquivos cujo conteúdo já foi importado são ignorados;
+    os maiores que `tamanho_faixa` bytes são divididos entre os processos do pool.
+    Retorna um dicionário com o resumo (arquivos, linhas e vazão).
+    """
+    inicio = time.perf_counter()
+    resumo = {'arquivos': 0, 'importados': 0, 'ignorados': 0, 'com_erro': 0, 'linhas': 0, 'linhas_com_erro': 0}
+    csvs = descobrir_csvs(csv_dir)
+    resumo['arquivos'] = len(csvs)
+
+    workers = workers or os.cpu_count() or 1
+    if carga_direta is None:
+        carga_direta = carga_direta_habilitada()
+    pendentes = set()
+
+    def gravar(preparado):
+        if preparado.erro:
+            resumo['com_erro'] += 1
+            saida(f"ERRO {preparado.caminho}: {preparado.erro}")
+            return
+        if preparado.ja_importado or Origem.objects.filter(hash_sha256=preparado.hash_sha256).exists():
+            resumo['ignorados'] += 1
+            saida(f"Já importado: {preparado.caminho}")
+            return
+
+        try:
+            origem = gravar_arquivo(preparado, batch_size, modo, carga_direta)
+        except Exception as e:
+            logger.exception(f"Erro ao gravar {preparado.caminho}")
+            resumo['com_erro'] += 1
+            saida(f"ERRO {preparado.caminho}: {e}")
+            return
+        relatar(preparado, origem)
+
+    def dividir(caminho, filial, pool):
+        try:
+            preparado, origem = importar_arquivo_dividido(
+                caminho, filial, pool, workers * 2, batch_size, chunksize, modo, carga_direta, tamanho_faixa
             )
-            financeiros.append(financeiro)
-
-            if len(financeiros) >= batch_size:
-                # Salvar em batch e limpar a lista
-                with transaction.atomic():
-                    Financeiro.objects.bulk_create(financeiros)
-                financeiros = []  # Limpar para o próximo lote
-
-        # Salvar o que restou após o loop
-        if financeiros:
-            with transaction.atomic():
-                Financeiro.objects.bulk_create(financeiros)
-
-
-def importar_pasta(csv_dir, batch_size=1000):
-    for root, dirs, files in os.walk(csv_dir):
-        for dir_name in dirs:
-            # Aqui você obtém o nome da filial da subpasta
-            filial = dir_name
-            for file in os.listdir(os.path.join(root, dir_name)):
-                if file.endswith(".csv"):
-                    caminho_arquivo = os.path.join(root, dir_name, file)
-                    if "performance" in file.lower():
-                        importar_csv_performance(caminho_arquivo, filial, batch_size)
-                    elif "financeiro" in file.lower():
-                        importar_csv_financeiro(caminho_arquivo, filial, batch_size)
+        except Exception as e:
+            logger.exception(f"Erro ao importar {caminho}")
+            resumo['com_erro'] += 1
+            saida(f"ERRO {caminho}: {e}")
+            return
+        if preparado.ja_importado:
+            resumo['ignorados'] += 1
+            saida(f"Já importado: {caminho}")
+            return
+        relatar(preparado, origem)
+
+    def relatar(preparado, origem):
+        resultado = preparado.resultado
+        resumo['importados'] += 1
+        resumo['linhas'] += resultado.linhas_importadas
+        resumo['linhas_com_erro'] += resultado.linhas_com_erro
+        saida(f"{preparado.caminho} ({preparado.tipo}, {preparado.filial}): "
+              f"{resultado.linhas_importadas} linhas ({resultado.linhas_atualizadas} atualizadas), "
+              f"{resultado.linhas_com_erro} com erro, "
+              f"leitura em {preparado.segundos_leitura:.2f}s")
+        if resultado.erros_por_tipo:
+            saida(f"  Rejeições ({resumo_dos_erros(resultado.erros_por_tipo)}): {origem.arquivo_rejeicoes.name}")
+
+    hashes_importados = set(Origem.objects.exclude(hash_sha256=None).values_list('hash_sha256', flat=True))
+    # Os processos do pool não usam o banco; fecha as conexões para não serem herdadas no fork
+    connections.close_all()
+
+    with sessao_de_carga() if carga_direta else nullcontext(), \
+            ProcessPoolExecutor(max_workers=workers, initializer=inicializar_processo,
+                                initargs=(hashes_importados,)) as pool:
+        # Limita os arquivos já lidos esperando gravação para a memória não crescer com o tamanho da árvore
+        for caminho, filial in csvs:
+            if pode_dividir(caminho, tamanho_faixa):
+                dividir(caminho, filial, pool)
+                continue
+            pendentes.add(pool.submit(preparar_arquivo, caminho, filial, chunksize))
+            if len(pendentes) >= workers * 2:
+                prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in prontos:
+                    gravar(futuro.result())
+        for futuro in wait(pendentes).done:
+            gravar(futuro.result())
+
+    resumo['segundos'] = time.perf_counter() - inicio
+    resumo['linhas_por_segundo'] = resumo['linhas'] / resumo['segundos'] if resumo['segundos'] else 0
+    return resumo
+
+
+def validar_pasta(csv_dir, chunksize=TAMANHO_CHUNK, saida=print):
+    """
+    Valida todos os CSVs da árvore sem gravar nada, mostrando os erros por coluna e motivo.
+    Retorna um dicionário com o resumo (arquivos, linhas e linhas com erro).
+    """
+    inicio = time.perf_counter()
+    resumo = {'arquivos': 0, 'com_erro': 0, 'linhas': 0, 'linhas_com_erro': 0}
+    for caminho, _filial in descobrir_csvs(csv_dir):
+        resumo['arquivos'] += 1
+        try:
+            with open(caminho, 'rb') as arquivo:
+                relatorio = validar_arquivo(arquivo, detectar_formato(arquivo), nome=caminho, chunksize=chunksize)
+        except Exception as e:
+            resumo['com_erro'] += 1
+            saida(f"ERRO {caminho}: {e}")
+            continue
+
+        resumo['linhas'] += relatorio.linhas_lidas
+        resumo['linhas_com_erro'] += relatorio.linhas_com_erro
+        if relatorio.linhas_com_erro:
+            resumo['com_erro'] += 1
+        saida(f"{caminho} ({relatorio.tipo}): {relatorio.linhas_lidas} linhas, "
+              f"{relatorio.linhas_com_erro} com erro, em {relatorio.segundos:.2f}s")
+        for coluna, motivo, quantidade, exemplos in relatorio.erros():
+            saida(f"  {coluna}: {motivo} - {quantidade} (linhas {', '.join(map(str, exemplos))})")
+        for coluna, motivo, quantidade, exemplos in relatorio.inconsistencias():
+            saida(f"  Aviso (importada assim mesmo) {coluna}: {motivo} - {quantidade} "
+                  f"(linhas {', '.join(map(str, exemplos))})")
+        for motivo, quantidade in relatorio.avisos.items():
+            saida(f"  Aviso: {quantidade} linhas com {motivo}")
+
+    resumo['segundos'] = time.perf_counter() - inicio
+    return resumo
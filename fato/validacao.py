@@ -0,0 +1,200 @@
+#fato/validacao.py
+"""
+Validação de um CSV de fato sem gravar nada (modo "somente validar").
+
+Cada bloco passa pelas mesmas conversões da importação (CONVERSOES) e depois pelas
+REGRAS de faixa e de consistência, todas como operações sobre colunas inteiras. O
+resultado é um histograma por coluna e motivo. Só as conversões são erros: a
+importação (importacao.preparar_chunk) grava as linhas que violam as REGRAS, então
+elas aparecem num histograma de avisos, separado, e não contam como linhas com erro.
+"""
+import time
+
+import pandas as pd
+
+from app.models import Driver
+
+from .conversores import MOTIVOS
+from .importacao import (
+    CONVERSOES, MODELOS, MOTIVO_ENCODING, TAMANHO_CHUNK, campos_do_modelo, ler_em_chunks, mal_decodificados,
+)
+from .models import Performance, Financeiro
+
+EXEMPLOS_POR_ERRO = 5  # Números de linha guardados para cada (coluna, motivo)
+LOTE_CADASTRO = 500  # Ids por consulta ao conferir os entregadores cadastrados
+
+PADRAO_UUID = r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
+
+CORRIDAS = [
+    'numero_de_corridas_ofertadas',
+    'numero_de_corridas_aceitas',
+    'numero_de_corridas_rejeitadas',
+    'numero_de_corridas_completadas',
+    'numero_de_corridas_canceladas_pela_pessoa_entregadora',
+    'numero_de_pedidos_aceitos_e_concluidos',
+]
+# Os percentuais podem passar de 100 no export (tempo disponível acima do escalado); só negativo é erro
+PERCENTUAIS_FINANCEIRO = ['percentual_de_tempo_disponivel', 'percentual_de_aceitacao', 'percentual_de_conclusao']
+
+
+def uuid_invalido(df):
+    return ~df['id_da_pessoa_entregadora'].str.strip().str.match(PADRAO_UUID)
+
+
+def uuid_invalido_ou_vazio_permitido(df):
+    """No Financeiro há lançamentos sem entregador (ex.: ajustes da praça); só o id preenchido é conferido."""
+    ids = df['id_da_pessoa_entregadora'].str.strip()
+    return ids.ne('') & ~ids.str.match(PADRAO_UUID)
+
+
+def vazio(coluna):
+    return lambda df: df[coluna].str.strip().eq('')
+
+
+def negativo(coluna):
+    return lambda df: df[coluna] < 0
+
+
+def negativo_opcional(coluna):
+    # Os percentuais opcionais chegam como object (None quando vazios)
+    return lambda df: pd.to_numeric(df[coluna]) < 0
+
+
+# (coluna, motivo, função que recebe o bloco já convertido e devolve a máscara das linhas fora da regra).
+# Violações são avisos: a importação grava essas linhas como vieram no export.
+REGRAS = {
+    Performance: [
+        ('periodo', 'vazio', vazio('periodo')),
+        ('id_da_pessoa_entregadora', 'UUID inválido', uuid_invalido),
+        ('tempo_disponivel_escalado', 'negativo', negativo('tempo_disponivel_escalado')),
+        ('numero_minimo_de_entregadores_regulares_na_escala', 'negativo',
+         negativo('numero_minimo_de_entregadores_regulares_na_escala')),
+        *[(coluna, 'negativo', negativo(coluna)) for coluna in CORRIDAS],
+        ('numero_de_corridas_aceitas', 'maior que as ofertadas',
+         lambda df: df['numero_de_corridas_aceitas'] > df['numero_de_corridas_ofertadas']),
+        ('numero_de_corridas_completadas', 'maior que as aceitas',
+         lambda df: df['numero_de_corridas_completadas'] > df['numero_de_corridas_aceitas']),
+        ('soma_das_taxas_das_corridas_aceitas', 'negativo', negativo('soma_das_taxas_das_corridas_aceitas')),
+    ],
+    Financeiro: [
+        ('id_da_pessoa_entregadora', 'UUID inválido', uuid_invalido_ou_vazio_permitido),
+        *[(coluna, 'negativo', negativo_opcional(coluna)) for coluna in PERCENTUAIS_FINANCEIRO],
+    ],
+}
+
+
+class RelatorioValidacao:
+    """Histogramas de erros e de avisos de um arquivo validado, por coluna e motivo."""
+
+    def __init__(self, nome, tipo):
+        self.nome = nome
+        self.tipo = tipo
+        self.linhas_lidas = 0
+        self.linhas_com_erro = 0
+        self.histograma = {}  # coluna -> {motivo: quantidade}; linhas que a importação rejeita
+        self.histograma_avisos = {}  # coluna -> {motivo: quantidade}; linhas fora das REGRAS, importadas assim mesmo
+        self.exemplos = {}  # (coluna, motivo) -> primeiras linhas com o erro ou aviso
+        self.avisos = {}  # motivo -> quantidade (não impedem a importação)
+        self.segundos = 0.0
+
+    @property
+    def linhas_validas(self):
+        return self.linhas_lidas - self.linhas_com_erro
+
+    def registrar(self, coluna, motivo, mascara, linhas, histograma=None):
+        """Soma as linhas da máscara no histograma (o de erros, se nenhum for informado)."""
+        quantidade = int(mascara.sum())
+        if not quantidade:
+            return
+        histograma = self.histograma if histograma is None else histograma
+        por_motivo = histograma.setdefault(coluna, {})
+        por_motivo[motivo] = por_motivo.get(motivo, 0) + quantidade
+        exemplos = self.exemplos.setdefault((coluna, motivo), [])
+        if len(exemplos) < EXEMPLOS_POR_ERRO:
+            exemplos.extend(linhas[mascara][:EXEMPLOS_POR_ERRO - len(exemplos)].tolist())
+
+    def listar(self, histograma):
+        """Lista (coluna, motivo, quantidade, exemplos), da maior quantidade para a menor."""
+        itens = [
+            (coluna, motivo, quantidade, self.exemplos.get((coluna, motivo), []))
+            for coluna, por_motivo in histograma.items()
+            for motivo, quantidade in por_motivo.items()
+        ]
+        return sorted(itens, key=lambda item: -item[2])
+
+    def erros(self):
+        return self.listar(self.histograma)
+
+    def inconsistencias(self):
+        """Avisos das REGRAS, no formato de erros()."""
+        return self.listar(self.histograma_avisos)
+
+    def como_dict(self):
+        return {
+            'arquivo': self.nome,
+            'tipo': self.tipo,
+            'linhas_lidas': self.linhas_lidas,
+            'linhas_validas': self.linhas_validas,
+            'linhas_com_erro': self.linhas_com_erro,
+            'histograma': self.histograma,
+            'histograma_avisos': self.histograma_avisos,
+            'avisos': self.avisos,
+            'segundos': round(self.segundos, 3),
+        }
+
+
+def entregadores_nao_cadastrados(ids, conhecidos):
+    """Ids que não existem em Driver.uuid; `conhecidos` guarda os já consultados ({id: cadastrado})."""
+    novos = [id_ for id_ in ids if id_ not in conhecidos]
+    for inicio in range(0, len(novos), LOTE_CADASTRO):
+        lote = novos[inicio:inicio + LOTE_CADASTRO]
+        cadastrados = set(Driver.objects.filter(uuid__in=lote).values_list('uuid', flat=True))
+        conhecidos.update({id_: id_ in cadastrados for id_ in lote})
+    return {id_ for id_ in ids if not conhecidos[id_]}
+
+
+def validar_bloco(modelo, df, relatorio, primeira_linha, conhecidos):
+    """Aplica as conversões (erros) e as regras (avisos) ao bloco inteiro, acumulando no relatório."""
+    df = df.reindex(columns=campos_do_modelo(modelo), fill_value='')
+    linhas = pd.RangeIndex(primeira_linha, primeira_linha + len(df)).to_numpy()
+    com_erro = pd.Series(False, index=df.index)
+
+    for coluna, invalidos in mal_decodificados(df):
+        relatorio.registrar(coluna, MOTIVO_ENCODING, invalidos, linhas)
+        com_erro |= invalidos
+
+    for coluna, conversor in CONVERSOES[modelo].items():
+        df[coluna], invalidos = conversor(df[coluna])
+        invalidos = invalidos.to_numpy()
+        relatorio.registrar(coluna, MOTIVOS[conversor], invalidos, linhas)
+        com_erro |= invalidos
+
+    # Só nas linhas que a importação gravaria
+    validas = ~com_erro.to_numpy()
+    for coluna, motivo, regra in REGRAS[modelo]:
+        mascara = regra(df).fillna(False).to_numpy(dtype=bool) & validas
+        relatorio.registrar(coluna, motivo, mascara, linhas, relatorio.histograma_avisos)
+
+    relatorio.linhas_lidas += len(df)
+    relatorio.linhas_com_erro += int(com_erro.sum())
+
+    # Referência: entregador sem cadastro não impede a importação, só é avisado
+    ids = df['id_da_pessoa_entregadora'].str.strip()
+    sem_cadastro = entregadores_nao_cadastrados(ids.unique().tolist(), conhecidos)
+    if sem_cadastro:
+        quantidade = int(ids.isin(sem_cadastro).sum())
+        relatorio.avisos['entregador não cadastrado'] = relatorio.avisos.get('entregador não cadastrado', 0) + quantidade
+
+
+def validar_arquivo(arquivo, formato, nome='', chunksize=TAMANHO_CHUNK):
+    """Valida o arquivo inteiro (lido conforme o `formato` detectado) sem gravar nada."""
+    inicio = time.perf_counter()
+    modelo = MODELOS[formato.tipo]
+    relatorio = RelatorioValidacao(nome, formato.tipo)
+    conhecidos = {}
+    primeira_linha = 2
+    for df in ler_em_chunks(arquivo, formato, chunksize):
+        validar_bloco(modelo, df, relatorio, primeira_linha, conhecidos)
+        primeira_linha += len(df)
+    relatorio.segundos = time.perf_counter() - inicio
+    return relatorio
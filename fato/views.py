@@ -1,152 +1,206 @@
-import io
-import pandas as pd
-from django.shortcuts import render, redirect
+from datetime import date
+
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db import transaction
-from .models import Performance, Financeiro, Origem
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.db import IntegrityError, transaction
+from .models import Origem, Processamento
 from .forms import ImportacaoForm, FILIAL_CHOICE
-
-# Conjunto mínimo de colunas obrigatórias para cada modelo
-OBRIGATORIOS_FINANCEIRO = {"data_do_lancamento_financeiro", "valor", "periodo"}
-OBRIGATORIOS_PERFORMANCE = {"data_do_periodo", "periodo", "id_da_pessoa_entregadora"}
-
-def detectar_delimitador(arquivo):
-    """Detecta se o delimitador do CSV é ';' ou ','."""
-    primeira_linha = arquivo.readline().decode('utf-8-sig')
-    if ';' in primeira_linha:
-        delimitador = ';'
-    elif ',' in primeira_linha:
-        delimitador = ','
-    else:
-        delimitador = ';'  # Default para ponto e vírgula se não encontrar nenhum delimitador específico
-    arquivo.seek(0)  # Retorna ao início do arquivo
-    return delimitador
-
+from .colunar import COLUNA_DATA
+from .deteccao import FormatoInvalido, detectar_formato
+from .exportacao import (
+    FORMATOS, abas_de_dataframes, cabecalho_das_colunas, linhas_do_queryset, resposta_de_exportacao, resposta_xlsx,
+)
+from .importacao import MODELOS, calcular_sha256
+from .jobs import enfileirar
+from .relatorios import relatorio_horas
+from .scorecard import KPIS, scorecard
+from .validacao import validar_arquivo
+
+PROCESSAMENTOS_NA_SESSAO = 50  # Quantos processamentos recentes a página acompanha (uma semana de várias filiais)
+
+
+def registrar_arquivo(request, arquivo, filial_display, form):
+    """
+    Valida o cabeçalho de um arquivo enviado e cria a Origem e o Processamento dele.
+    Retorna o processamento, ou None se o arquivo foi recusado (o motivo vai para messages).
+    """
+    nome_arquivo = arquivo.name.strip()  # Remover espaços extras do nome do arquivo
+
+    # Verificar formato e tipo do arquivo antes de tudo (lê só o começo do arquivo)
+    try:
+        tipo_arquivo = detectar_formato(arquivo).tipo
+    except FormatoInvalido as e:
+        messages.error(request, f"Formato do arquivo {nome_arquivo} não reconhecido: {e}.")
+        return None
+
+    # Mesmo conteúdo já importado (mesmo que com outro nome): rejeita antes de ler qualquer linha
+    hash_sha256 = calcular_sha256(arquivo)
+    existente = Origem.objects.filter(hash_sha256=hash_sha256).first()
+    if existente:
+        messages.warning(request, f'O conteúdo de "{nome_arquivo}" já foi importado como "{existente.nome}" '
+                                  f'({existente.filial}).')
+        return None
+
+    # Criando a origem com tipo já definido; a leitura das linhas fica para o processamento
+    origem = Origem(arquivo=arquivo, nome=nome_arquivo, filial=filial_display, tipo=tipo_arquivo,
+                    hash_sha256=hash_sha256)
+    try:
+        with transaction.atomic():
+            origem.save()
+    except IntegrityError:  # Mesmo arquivo enviado ao mesmo tempo (nesta ou em outra requisição)
+        # O arquivo já foi gravado no storage antes do INSERT falhar
+        if origem.arquivo.name:
+            origem.arquivo.storage.delete(origem.arquivo.name)
+        messages.warning(request, f'O conteúdo de "{nome_arquivo}" já foi importado.')
+        return None
+
+    processamento = Processamento.objects.create(
+        origem=origem, nome_arquivo=nome_arquivo,
+        apenas_blocos_novos=form.cleaned_data['apenas_blocos_novos'],
+        modo=form.cleaned_data['modo'] or 'inserir',
+    )
+    enfileirar(processamento)
+    return processamento
+
+
+def validar_arquivos(request, arquivos):
+    """Relatórios de validação dos arquivos enviados; nada é gravado no banco."""
+    relatorios = []
+    for arquivo in arquivos:
+        nome_arquivo = arquivo.name.strip()
+        try:
+            formato = detectar_formato(arquivo)
+        except FormatoInvalido as e:
+            messages.error(request, f"Formato do arquivo {nome_arquivo} não reconhecido: {e}.")
+            continue
+        relatorios.append(validar_arquivo(arquivo, formato, nome=nome_arquivo))
+    return relatorios
+
+
+@staff_member_required
 def importar_csv(request):
     if request.method == 'POST':
         form = ImportacaoForm(request.POST, request.FILES)
         if form.is_valid():
-            arquivo = request.FILES.get('arquivos')
+            arquivos = form.cleaned_data['arquivos']
             filial = form.cleaned_data['filial'].strip()  # Remover espaços extras da filial
-           
-            if not arquivo:
+
+            if not arquivos:
                 messages.error(request, "Nenhum arquivo foi enviado.")
                 return redirect('importar_csv')
 
-            nome_arquivo = arquivo.name.strip()  # Remover espaços extras do nome do arquivo
-
             # Mapeia a chave da filial para o display (nome amigável)
             filial_map = dict(FILIAL_CHOICE)
             filial_display = filial_map.get(filial, filial)  # Pega o nome amigável da filial
 
-            # Verificar se já existe uma origem com o nome do arquivo e a filial
-            if Origem.objects.filter(nome=nome_arquivo,tipo=tipo_arquivo, filial=filial_display).exists():
-                messages.warning(request, f'O arquivo "{nome_arquivo}" já foi importado para a filial {filial_display}.')
-                return redirect('importar_csv')
-
-            # Verificar tipo do arquivo antes de criar a origem
-            delimitador = detectar_delimitador(arquivo)
-            arquivo.seek(0)  # Retorna ao início do arquivo após a detecção do delimitador
-            df = pd.read_csv(arquivo, delimiter=delimitador, encoding='utf-8-sig')
-
-            # Corrigir os cabeçalhos para remover espaços extras e garantir que as colunas sejam interpretadas corretamente
-            df.columns = [col.strip().lower() for col in df.columns]
-
-            colunas = set(df.columns)
-            print("Cabeçalhos detectados:", colunas)  # Depuração
-
-            if OBRIGATORIOS_PERFORMANCE.issubset(colunas):
-                modelo = Performance
-                tipo_arquivo = "performance"
-            elif OBRIGATORIOS_FINANCEIRO.issubset(colunas):
-                modelo = Financeiro
-                tipo_arquivo = "financeiro"
-            else:
-                messages.error(request, f"Formato do arquivo {nome_arquivo} não reconhecido.")
-                return redirect('importar_csv')
-
-            # Criando a origem com tipo já definido
-            origem = Origem.objects.create(arquivo=arquivo, nome=nome_arquivo, filial=filial_display, tipo=tipo_arquivo)
-
-            try:
-                def criar_objetos(modelo, df, origem):
-                    dados_importados = []
-                    print(modelo)
-                    for index, row in df.iterrows():
-                        try:
-                            if modelo == Performance:
-                                dados_importados.append(Performance(
-                                    origem_doc=origem,
-                                    data_do_periodo=row.get('data_do_periodo', ''),
-                                    periodo=row.get('periodo', ''),
-                                    duracao_do_periodo=row.get('duracao_do_periodo', ''),
-                                    numero_minimo_de_entregadores_regulares_na_escala=int(row.get('numero_minimo_de_entregadores_regulares_na_escala', 0) or 0),
-                                    tag=row.get('tag', ''),
-                                    id_da_pessoa_entregadora=row.get('id_da_pessoa_entregadora', ''),
-                                    pessoa_entregadora=row.get('pessoa_entregadora', ''),
-                                    praca=row.get('praca', ''),
-                                    sub_praca=row.get('sub_praca', ''),
-                                    origem=row.get('origem', ''),
-                                    tempo_disponivel_escalado=row.get('tempo_disponivel_escalado', ''),
-                                    tempo_disponivel_absoluto=row.get('tempo_disponivel_absoluto', ''),
-                                    numero_de_corridas_ofertadas=int(row.get('numero_de_corridas_ofertadas', 0) or 0),
-                                    numero_de_corridas_aceitas=int(row.get('numero_de_corridas_aceitas', 0) or 0),
-                                    numero_de_corridas_rejeitadas=int(row.get('numero_de_corridas_rejeitadas', 0) or 0),
-                                    numero_de_corridas_completadas=int(row.get('numero_de_corridas_completadas', 0) or 0),
-                                    numero_de_corridas_canceladas_pela_pessoa_entregadora=int(row.get('numero_de_corridas_canceladas_pela_pessoa_entregadora', 0) or 0),
-                                    numero_de_pedidos_aceitos_e_concluidos=int(row.get('numero_de_pedidos_aceitos_e_concluidos', 0) or 0),
-                                    soma_das_taxas_das_corridas_aceitas=row.get('soma_das_taxas_das_corridas_aceitas', '')
-                                ))
-                            else:  # Financeiro
-                                dados_importados.append(Financeiro(
-                                    origem_doc=origem,
-                                    data_do_lancamento_financeiro=row.get('data_do_lancamento_financeiro', ''),
-                                    data_do_periodo_de_referencia=row.get('data_do_periodo_de_referencia', ''),
-                                    data_do_repasse=row.get('data_do_repasse', ''),
-                                    periodo=row.get('periodo', ''),
-                                    praca=row.get('praca', ''),
-                                    subpraca=row.get('subpraca', ''),
-                                    origem=row.get('origem', ''),
-                                    id_da_pessoa_entregadora=row.get('id_da_pessoa_entregadora', ''),
-                                    recebedor=row.get('recebedor', ''),
-                                    tipo=row.get('tipo', ''),
-                                    valor=row.get('valor', ''),
-                                    descricao=row.get('descricao', ''),
-                                    atingido=row.get('atingido', ''),
-                                    percentual_de_tempo_disponivel=row.get('percentual_de_tempo_disponivel', ''),
-                                    percentual_de_aceitacao=row.get('percentual_de_aceitacao', ''),
-                                    percentual_de_conclusao=row.get('percentual_de_conclusao', ''),
-                                    criterio_tempo_disponivel=row.get('criterio_tempo_disponivel', ''),
-                                    criterio_rotas_aceitas=row.get('criterio_rotas_aceitas', ''),
-                                    criterio_rotas_concluidas=row.get('criterio_rotas_concluidas', ''),
-                                    margem_fee_porcentagem=row.get('margem_fee_porcentagem', '')
-                                ))
-                        except (ValueError, KeyError) as e:
-                            mensagens_erro = f"Erro na linha {index + 2} do arquivo {nome_arquivo}: {e}"
-                            messages.error(request, mensagens_erro)  # Exibe erro mais específico
-                    return dados_importados
-
-                dados_importados = criar_objetos(modelo, df, origem)
-
-                if dados_importados:
-                    with transaction.atomic():
-                        modelo.objects.bulk_create(dados_importados)
-
-                    origem.linhas_importadas = len(dados_importados)
-                    origem.linhas_com_erro = len(df) - len(dados_importados)  # Linhas com erro são as restantes
-                    origem.save()
-
-                    messages.success(request, f'Arquivo "{nome_arquivo}" importado com sucesso!')
-                else:
-                    origem.delete()
-
-            except Exception as e:
-                origem.delete()
-                messages.error(request, f"Erro ao processar o arquivo {nome_arquivo}: {e}")
-
+            # Só validação: roda na própria requisição (é rápida) e mostra o resultado na página
+            if form.cleaned_data['somente_validar']:
+                validacoes = validar_arquivos(request, arquivos)
+                return render(request, 'importar_csv.html', {
+                    'form': ImportacaoForm(initial={'filial': filial, 'modo': form.cleaned_data['modo']}),
+                    'validacoes': validacoes,
+                })
+
+            # Cada arquivo vira uma Origem com o seu Processamento; o pool de jobs.py lê os arquivos em paralelo
+            iniciados = []
+            for arquivo in arquivos:
+                processamento = registrar_arquivo(request, arquivo, filial_display, form)
+                if processamento:
+                    iniciados.append(processamento)
+
+            # Guarda os processamentos recentes na sessão para a página acompanhar o progresso
+            recentes = [processamento.id for processamento in reversed(iniciados)]
+            recentes += request.session.get('processamentos', [])
+            request.session['processamentos'] = recentes[:PROCESSAMENTOS_NA_SESSAO]
+
+            if len(iniciados) == 1:
+                messages.info(request, f'Importação do arquivo "{iniciados[0].nome_arquivo}" iniciada.')
+            elif iniciados:
+                messages.info(request, f'Importação de {len(iniciados)} arquivos iniciada.')
             return redirect('importar_csv')
 
     else:
         form = ImportacaoForm()
 
-    return render(request, 'importar_csv.html', {'form': form})
+    processamentos = Processamento.objects.filter(
+        id__in=request.session.get('processamentos', [])
+    ).select_related('origem')
+    return render(request, 'importar_csv.html', {'form': form, 'processamentos': processamentos})
+
+
+@staff_member_required
+def progresso_importacao(request, pk):
+    """Endpoint JSON consultado pela página de importação enquanto o arquivo é processado."""
+    processamento = get_object_or_404(Processamento, pk=pk)
+    return JsonResponse(processamento.como_dict())
+
+
+def datas_do_pedido(request):
+    """inicio e fim (AAAA-MM-DD) da querystring; ValueError se faltarem ou forem inválidas."""
+    inicio = date.fromisoformat(request.GET.get('inicio', ''))
+    fim = date.fromisoformat(request.GET.get('fim', ''))
+    if fim < inicio:
+        raise ValueError("A data final é anterior à inicial.")
+    return inicio, fim
+
+
+@staff_member_required
+def exportar_fatos(request, tipo):
+    """
+    Linhas de Performance ou Financeiro entre ?inicio= e ?fim= (e ?filial=), em CSV
+    (padrão) ou ?formato=xlsx, sem carregar o período inteiro na memória.
+    """
+    if tipo not in MODELOS:
+        raise Http404(f"Tipo desconhecido: {tipo}")
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        return HttpResponseBadRequest(f"Formato desconhecido: {formato}")
+    try:
+        inicio, fim = datas_do_pedido(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(f"Informe inicio e fim no formato AAAA-MM-DD. {e}")
+
+    modelo = MODELOS[tipo]
+    linhas = modelo.objects.filter(**{f'{COLUNA_DATA[modelo]}__range': (inicio, fim)}).order_by(COLUNA_DATA[modelo], 'pk')
+    filial = request.GET.get('filial')
+    if filial:
+        linhas = linhas.filter(origem_doc__filial=filial)
+    # Nomes dos campos como cabeçalho, como nos arquivos importados; a filial vem da origem
+    colunas = [('filial', 'origem_doc__filial')] + [
+        (campo.attname, campo.attname) for campo in modelo._meta.concrete_fields
+        if not campo.primary_key and campo.name != 'origem_doc'
+    ]
+    nome = f"{tipo}_{inicio}_{fim}"
+    return resposta_de_exportacao(formato, nome, cabecalho_das_colunas(colunas), linhas_do_queryset(linhas, colunas))
+
+
+@staff_member_required
+def exportar_relatorio_horas(request):
+    """Planilha do relatório de horas (?inicio=, ?fim=, ?filial=), a mesma do comando relatorio_horas."""
+    try:
+        inicio, fim = datas_do_pedido(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(f"Informe inicio e fim no formato AAAA-MM-DD. {e}")
+    abas = relatorio_horas(inicio, fim, filial=request.GET.get('filial') or None)
+    return resposta_xlsx(f"relatorio_horas_{inicio}_{fim}.xlsx", abas_de_dataframes(abas))
+
+
+@staff_member_required
+def exportar_scorecard(request):
+    """Scorecard dos entregadores (?inicio=, ?fim=, ?ordenar_por=) em XLSX (padrão) ou ?formato=csv."""
+    formato = request.GET.get('formato', 'xlsx')
+    if formato not in FORMATOS:
+        return HttpResponseBadRequest(f"Formato desconhecido: {formato}")
+    ordenar_por = request.GET.get('ordenar_por', 'horas')
+    if ordenar_por not in KPIS:
+        return HttpResponseBadRequest(f"KPI desconhecido: {ordenar_por}")
+    try:
+        inicio, fim = datas_do_pedido(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(f"Informe inicio e fim no formato AAAA-MM-DD. {e}")
+    tabela = scorecard(inicio, fim, ordenar_por=ordenar_por)
+    return resposta_de_exportacao(
+        formato, f"scorecard_{inicio}_{fim}", list(tabela.columns), tabela.itertuples(index=False, name=None),
+    )